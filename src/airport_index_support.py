@@ -0,0 +1,193 @@
+# data processing
+import pandas as pd
+import numpy as np
+
+# immutable mappings
+from types import MappingProxyType
+
+# function typing
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+SORT_BY_DICT = {
+    "best": "best",
+    "cheapest": "price_high",
+    "fastest": "fastest",
+    "outbound_take_off": "outbound_take_off_time",
+    "outbound_landing": "outbound_landing_time",
+    "return_take_off": "return_take_off_time",
+    "return_landing": "return_landing_time"
+}
+
+
+class AirportEntry(NamedTuple):
+    airport_entity_id: str
+    airport_sky_id: str
+    airport_name: str
+
+
+class CityEntry(NamedTuple):
+    city_entity_id: Optional[str]
+    airports: Tuple[AirportEntry, ...]
+
+
+def normalize_city_name(city: str) -> str:
+    return city.strip().lower()
+
+
+def _entity_id_to_str(entity_id) -> Optional[str]:
+    if pd.isna(entity_id):
+        return None
+    return str(int(entity_id))
+
+
+class AirportIndex:
+    """
+    Immutable lookup from normalized city name to the city and airport entity ids of the flights API.
+
+    It is built once from the countries_airports DataFrame, so building a querystring costs a dict
+    lookup instead of scanning and lowering the whole city column.
+
+    Usage:
+    ------
+        airport_index = AirportIndex.from_dataframe(countries_airports)
+        querystrings_list = airport_index.build_querystring_list_single("madrid", ["barcelona"], "2024-11-08")
+    """
+
+    def __init__(self, cities: Dict[str, CityEntry], preferred_airports: Optional[Dict[str, str]] = None):
+        """
+        Parameters:
+        ----------
+        cities : dict
+            Mapping of normalized city name to its CityEntry.
+        preferred_airports : dict, optional
+            Mapping of city name to the sky id or entity id of the airport to use when the city has more
+            than one. Cities not in it use their first airport.
+        """
+        self._cities = MappingProxyType(dict(cities))
+        self._preferred_airports = MappingProxyType({normalize_city_name(city): str(airport)
+                                                     for city, airport in (preferred_airports or {}).items()})
+
+    @classmethod
+    def from_dataframe(cls, countries_airports_df: pd.DataFrame, preferred_airports: Optional[Dict[str, str]] = None) -> "AirportIndex":
+        """
+        Builds the index from the airports DataFrame, either as extracted (city, city_entityId, airport_entityId...)
+        or as transformed (city_name, city_entityid, airport_entityid...). Rows keep their order, so the
+        first airport of a city is the one listed first.
+        """
+        columns = {column.lower(): column for column in countries_airports_df.columns}
+        city_column = columns.get("city", columns.get("city_name"))
+
+        city_names = countries_airports_df[city_column].astype(str).str.strip().str.lower().to_numpy()
+        city_entity_ids = countries_airports_df[columns["city_entityid"]].to_numpy()
+        airport_entity_ids = countries_airports_df[columns["airport_entityid"]].to_numpy()
+        airport_sky_ids = countries_airports_df[columns["airport_skyid"]].to_numpy()
+        airport_names = countries_airports_df[columns["airport_name"]].to_numpy()
+
+        city_entries = {}
+        for city, city_entity_id, airport_entity_id, airport_sky_id, airport_name in zip(
+                city_names, city_entity_ids, airport_entity_ids, airport_sky_ids, airport_names):
+            city_entity_id_str, airports = city_entries.get(city, (None, []))
+            if city_entity_id_str is None:
+                city_entity_id_str = _entity_id_to_str(city_entity_id)
+
+            airport_entity_id_str = _entity_id_to_str(airport_entity_id)
+            if airport_entity_id_str is not None and airport_entity_id_str not in [airport.airport_entity_id for airport in airports]:
+                airports.append(AirportEntry(airport_entity_id_str, airport_sky_id, airport_name))
+
+            city_entries[city] = (city_entity_id_str, airports)
+
+        cities = {city: CityEntry(city_entity_id, tuple(airports)) for city, (city_entity_id, airports) in city_entries.items()}
+        return cls(cities, preferred_airports=preferred_airports)
+
+    def __contains__(self, city: str) -> bool:
+        return normalize_city_name(city) in self._cities
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    def _get_city(self, city: str) -> CityEntry:
+        try:
+            return self._cities[normalize_city_name(city)]
+        except KeyError:
+            raise KeyError(f"City '{city}' is not in the airports index") from None
+
+    def city_entity_id(self, city: str) -> Optional[str]:
+        return self._get_city(city).city_entity_id
+
+    def airports(self, city: str) -> Tuple[AirportEntry, ...]:
+        return self._get_city(city).airports
+
+    def airport_entity_id(self, city: str, airport: Optional[str] = None) -> Optional[str]:
+        """
+        Returns the entity id of the city's airport. `airport` (sky id or entity id) selects among several
+        airports, falling back to the preferred airport of the city and then to its first airport.
+        """
+        airports = self.airports(city)
+        if not airports:
+            return None
+
+        airport = airport or self._preferred_airports.get(normalize_city_name(city))
+        if airport is not None:
+            for airport_entry in airports:
+                if airport in (airport_entry.airport_entity_id, airport_entry.airport_sky_id):
+                    return airport_entry.airport_entity_id
+
+        return airports[0].airport_entity_id
+
+    def _entity_id(self, city: str, use_airport: bool) -> Optional[str]:
+        return self.airport_entity_id(city) if use_airport else self.city_entity_id(city)
+
+    def build_querystring(self, origin_city: str, destination_city: str, date_departure: str, n_adults: int = 1,
+                          n_children: int = 0, n_infants: int = 0, origin_airport_code=None, destination_airport_code=None,
+                          cabin_class: str = "economy", sort_by: str = "price_high", currency: str = "EUR") -> Dict[str, str]:
+        """
+        Same querystring as data_extraction_support.build_flight_request_querystring, resolved from the index.
+        """
+        use_airport = origin_airport_code is not None
+        return {
+            "originSkyId": origin_city,
+            "destinationSkyId": destination_city,
+            "originEntityId": self._entity_id(origin_city, use_airport),
+            "destinationEntityId": self._entity_id(destination_city, use_airport),
+            "date": date_departure,
+            "adults": str(n_adults),
+            "childrens": str(n_children),
+            "infants": str(n_infants),
+            "sortBy": SORT_BY_DICT.get(sort_by, "price_high"),
+            "currency": currency
+        }
+
+    def build_querystring_list_single(self, origin_city: str, destination_cities_list: List[str], date_query_start: str,
+                                      n_steps: int = 52, step_length: int = 7, days_window: int = 2, n_adults: int = 1,
+                                      n_children: int = 0, n_infants: int = 0, origin_airport_code=None,
+                                      destination_airport_code=None, cabin_class: str = "economy", sort_by: str = "best",
+                                      currency: str = "EUR") -> List[Dict[str, str]]:
+        """
+        Batch version of build_querystring with the output of build_flight_request_querystring_list_single:
+        for every destination and step, the departure querystring followed by the return one.
+
+        Departure and return dates are computed for all steps at once and entity ids are resolved once per city.
+        """
+        use_airport = origin_airport_code is not None
+        origin_id = self._entity_id(origin_city, use_airport)
+        destination_ids = [self._entity_id(destination_city, use_airport) for destination_city in destination_cities_list]
+
+        step_offsets = pd.to_timedelta(np.arange(n_steps) * step_length, unit="D")
+        departure_dates = (pd.Timestamp(date_query_start) + step_offsets).strftime("%Y-%m-%d").tolist()
+        return_dates = (pd.Timestamp(date_query_start) + step_offsets + pd.Timedelta(days=days_window)).strftime("%Y-%m-%d").tolist()
+
+        passengers = {"adults": str(n_adults), "childrens": str(n_children), "infants": str(n_infants),
+                      "sortBy": SORT_BY_DICT.get(sort_by, "price_high"), "currency": currency}
+
+        querystring_list = []
+        for destination_city, destination_id in zip(destination_cities_list, destination_ids):
+            for date_departure, date_return in zip(departure_dates, return_dates):
+                querystring_list.append({"originSkyId": origin_city, "destinationSkyId": destination_city,
+                                         "originEntityId": origin_id, "destinationEntityId": destination_id,
+                                         "date": date_departure, **passengers})
+                querystring_list.append({"originSkyId": destination_city, "destinationSkyId": origin_city,
+                                         "originEntityId": destination_id, "destinationEntityId": origin_id,
+                                         "date": date_return, **passengers})
+
+        return querystring_list
@@ -0,0 +1,149 @@
+# work with asynchronicity
+import asyncio
+import aiohttp
+
+# environment variables
+import dotenv
+import os
+dotenv.load_dotenv()
+AIR_SCRAPPER_API_KEY = os.getenv("AIR_SCRAPPER_KEY", "")
+
+# shared rate limits, retries and response cache
+from .response_cache_support import ResponseCache, cached_get_json
+
+# function typing
+from typing import AsyncIterator, List, Dict, Optional, Tuple, Union
+
+
+FLIGHTS_URL = "https://sky-scrapper.p.rapidapi.com/api/v2/flights/searchFlightsComplete"
+
+
+class FlightApiClient:
+    """
+    Long-lived Sky Scrapper client that owns a single pooled aiohttp session.
+
+    The session keeps connections alive between requests, so a crawl pays the TLS
+    handshake once per pooled connection instead of once per querystring. A semaphore
+    caps the number of requests in flight to avoid bursting the provider.
+
+    Usage:
+    ------
+        async with FlightApiClient(max_concurrency=10) as client:
+            itineraries_dict_list = await client.request_itineraries_multiple(querystrings_list)
+    """
+
+    def __init__(self, url: str = FLIGHTS_URL, max_concurrency: int = 10, limit_per_host: int = 10,
+                 keepalive_timeout: float = 30, timeout: float = 60, headers: Optional[Dict[str, str]] = None,
+                 provider: str = "sky_scrapper", cache: Optional[ResponseCache] = None):
+        """
+        Parameters:
+        ----------
+        url : str
+            Endpoint to query. Defaults to the Sky Scrapper complete flight search.
+        max_concurrency : int
+            Maximum number of requests in flight at the same time.
+        limit_per_host : int
+            Maximum number of pooled connections opened against the same host.
+        keepalive_timeout : float
+            Seconds an idle pooled connection is kept open for reuse.
+        timeout : float
+            Total timeout in seconds for a single request.
+        headers : dict, optional
+            Request headers. Defaults to the RapidAPI authentication headers.
+        provider : str
+            Name of the rate limiter shared with the other callers of the API, see rate_limit_support.
+        cache : ResponseCache, optional
+            Cache answering repeated querystrings. Defaults to response_cache_support.get_default_cache().
+        """
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.headers = headers if headers is not None else {
+            "x-rapidapi-key": AIR_SCRAPPER_API_KEY,
+            "x-rapidapi-host": "sky-scrapper.p.rapidapi.com"
+        }
+
+        self.provider = provider
+        self.cache = cache
+
+        self._session = None
+        self._semaphore = None
+
+    async def open(self) -> "FlightApiClient":
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency,
+                                             limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  headers=self.headers,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self) -> "FlightApiClient":
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def request_itineraries(self, querystring: Dict[str, str]) -> List[dict]:
+        """
+        Requests the itineraries for a single querystring through the pooled session.
+
+        Fresh responses are served from the response cache, throttled and failed responses are
+        retried through the provider's rate limiter. Returns an
+        empty list if the response body does not contain itineraries and raises ValueError on a
+        non 200 status, same as request_flight_itineraries_async.
+        """
+        if self._session is None:
+            await self.open()
+
+        async with self._semaphore:
+            status, itineraries = await cached_get_json(self._session, self.url, provider=self.provider,
+                                                        params=querystring, cache=self.cache)
+
+        if status != 200:
+            print(f"Request failed with status {status} for {querystring}")
+            raise ValueError(f"HTTP Error: {status}")
+
+        try:
+            itineraries = itineraries["data"]["itineraries"]
+        except KeyError as e:
+            print(f"KeyError with querystring {querystring}: {e}")
+            return []
+        except TypeError as e:
+            print(f"TypeError with querystring {querystring}: {e}")
+            return []
+
+        return itineraries
+
+    async def request_itineraries_multiple(self, querystrings_list: List[Dict[str, str]]) -> List[List[dict]]:
+        """
+        Requests the itineraries for every querystring, keeping at most max_concurrency in flight.
+        Results are returned in the same order as querystrings_list.
+        """
+        tasks = [self.request_itineraries(querystring) for querystring in querystrings_list]
+
+        return await asyncio.gather(*tasks)
+
+    async def iterate_itineraries_as_completed(self, querystrings_list: List[Dict[str, str]]) -> AsyncIterator[Tuple[Dict[str, str], Union[List[dict], Exception]]]:
+        """
+        Yields (querystring, itineraries) pairs in the order responses arrive, so they can be processed
+        while the rest are still in flight. A failed request yields its exception in place of the itineraries
+        instead of stopping the iteration.
+        """
+        async def request(querystring):
+            try:
+                return querystring, await self.request_itineraries(querystring)
+            except Exception as e:
+                return querystring, e
+
+        for next_result in asyncio.as_completed([request(querystring) for querystring in querystrings_list]):
+            yield await next_result
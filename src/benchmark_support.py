@@ -0,0 +1,1083 @@
+# data processing
+import pandas as pd
+import numpy as np
+
+# work with asynchronicity
+import asyncio
+import aiohttp
+from aiohttp import web
+
+# work with files
+import tempfile
+
+# work with time
+import time
+import datetime
+
+# html parsing
+from bs4 import BeautifulSoup
+import json
+import re
+
+# function typing
+from typing import Callable, Dict, List, Tuple
+
+# functions under benchmark
+from . import data_extraction_support as des
+from .airport_index_support import AirportIndex
+from .api_client_support import FlightApiClient
+from .flight_flattening_support import flatten_itineraries
+from .rate_limit_support import PROVIDER_LIMITS, configure_provider
+from .response_cache_support import ResponseCache
+from .round_trip_support import pair_round_trips
+from .crawl_sharding_support import crawl_flights_sharded
+from .booking_parser_support import available_booking_parser_backends
+from .html_archive_support import HtmlArchive
+from .data_transformation_support import expand_activity_availabilities
+from .extraction_spec_support import RecordIndex
+from .weather_client_support import OpenMeteoClient
+from .geocoding_cache_support import GeocodingCache, Geocoder
+from .spatial_index_support import SpatialIndex, haversine_km
+from .data_load_support import copy_dataframe
+
+
+### Stub servers and payloads
+def build_stub_itinerary(itinerary_number: int, departure: str = "2024-11-08T07:30:00") -> dict:
+    """
+    Builds a fake Sky Scrapper itinerary with every field read by extract_flight_info.
+    """
+    departure_datetime = datetime.datetime.fromisoformat(departure) + datetime.timedelta(minutes=15 * (itinerary_number % 48))
+    arrival_datetime = departure_datetime + datetime.timedelta(minutes=70 + itinerary_number % 60)
+
+    return {
+        "id": f"13870-2411080730--32132-0-9772-2411080840|{itinerary_number}",
+        "score": 0.5 + (itinerary_number % 50) / 100,
+        "price": {"raw": 40 + itinerary_number % 200, "formatted": f"{1000 + itinerary_number % 200:,} EUR"},
+        "isSelfTransfer": itinerary_number % 7 == 0,
+        "farePolicy": {
+            "isChangeAllowed": False,
+            "isPartiallyChangeable": itinerary_number % 2 == 0,
+            "isCancellationAllowed": False,
+            "isPartiallyRefundable": itinerary_number % 3 == 0
+        },
+        "legs": [{
+            "durationInMinutes": 70 + itinerary_number % 60,
+            "stopCount": itinerary_number % 2,
+            "departure": departure_datetime.isoformat(),
+            "arrival": arrival_datetime.isoformat(),
+            "origin": {"name": "Madrid", "displayCode": "MAD", "entityId": "95565077"},
+            "destination": {"name": "Barcelona", "displayCode": "BCN", "entityId": "95565085"},
+            "carriers": {"marketing": [{"name": "Vueling Airlines"}]}
+        }]
+    }
+
+
+async def start_stub_server(routes: Dict[str, Callable[[web.Request], dict]], latency: float = 0.0,
+                            host: str = "127.0.0.1") -> Tuple[web.AppRunner, str]:
+    """
+    Starts a local aiohttp server answering each route with the JSON built by its handler.
+
+    Parameters:
+    ----------
+    routes : dict
+        Mapping of path to a function that receives the request and returns the JSON payload.
+    latency : float
+        Seconds each response is delayed, to emulate the provider's response time.
+    host : str
+        Interface to bind. A free port is chosen automatically.
+
+    Returns:
+    -------
+    Tuple[web.AppRunner, str]
+        The runner, to be cleaned up with `await runner.cleanup()`, and the server base url.
+    """
+    app = web.Application()
+
+    def make_handler(build_payload):
+        async def handler(request):
+            if latency:
+                await asyncio.sleep(latency)
+            return web.json_response(build_payload(request))
+        return handler
+
+    for path, build_payload in routes.items():
+        app.router.add_get(path, make_handler(build_payload))
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+
+    port = runner.addresses[0][1]
+    return runner, f"http://{host}:{port}"
+
+
+def _print_benchmark(results_df: pd.DataFrame) -> None:
+    for row in results_df.itertuples(index=False):
+        print(f"{row.method}: {row.seconds:.3f} seconds")
+
+
+### Flights - API client
+async def benchmark_flight_client_throughput(n_requests: int = 500, itineraries_per_response: int = 10,
+                                             latency: float = 0.01, max_concurrency: int = 50,
+                                             limit_per_host: int = 50) -> pd.DataFrame:
+    """
+    Compares the per-request-session path (request_flight_itineraries_async_multiple)
+    against the pooled FlightApiClient on a local stub of the flights endpoint.
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per method with the elapsed seconds and requests per second.
+    """
+    payload = {"data": {"itineraries": [build_stub_itinerary(i) for i in range(itineraries_per_response)]}}
+    runner, base_url = await start_stub_server({"/flights": lambda _: payload}, latency=latency)
+    url = f"{base_url}/flights"
+
+    querystrings_list = [{"originSkyId": "madrid", "destinationSkyId": "barcelona", "date": str(i)} for i in range(n_requests)]
+
+    # measure the HTTP path only, not the provider rate limit
+    configure_provider("benchmark", rate=1e9)
+
+    results = []
+    try:
+        start_time = time.perf_counter()
+        await des.request_flight_itineraries_async_multiple(querystrings_list, url=url, provider="benchmark")
+        results.append(("session_per_request", time.perf_counter() - start_time))
+
+        start_time = time.perf_counter()
+        async with FlightApiClient(url=url, max_concurrency=max_concurrency, limit_per_host=limit_per_host,
+                                   provider="benchmark", cache=ResponseCache(":memory:", mode="disabled")) as client:
+            await client.request_itineraries_multiple(querystrings_list)
+        results.append(("pooled_client", time.perf_counter() - start_time))
+    finally:
+        await runner.cleanup()
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds"])
+    results_df["n_requests"] = n_requests
+    results_df["requests_per_second"] = n_requests / results_df["seconds"]
+
+    _print_benchmark(results_df)
+    return results_df
+
+
+### Flights - querystring building
+def build_stub_airports(n_cities: int) -> pd.DataFrame:
+    """
+    Builds a countries_airports DataFrame with `n_cities` cities and one airport each.
+    """
+    return pd.DataFrame({
+        "country": "spain",
+        "city": [f"City{i}" for i in range(n_cities)],
+        "city_entityId": range(27500000, 27500000 + n_cities),
+        "airport_skyId": [f"A{i:05d}" for i in range(n_cities)],
+        "airport_entityId": range(95500000, 95500000 + n_cities),
+        "airport_name": [f"City{i} Airport" for i in range(n_cities)]
+    })
+
+
+def _build_querystring_list_single_by_scan(countries_airports_df, origin_city, destination_cities_list, date_query_start,
+                                           n_steps, step_length, days_window, origin_airport_code):
+    # querystring building before AirportIndex: every querystring scans the airports DataFrame
+    date_query_start_datetime = datetime.datetime.strptime(date_query_start, "%Y-%m-%d")
+
+    querystring_list = []
+    for destination_city in destination_cities_list:
+        for step in range(n_steps):
+            date_departure = (date_query_start_datetime + datetime.timedelta(days=step*step_length)).strftime("%Y-%m-%d")
+            date_return = (date_query_start_datetime + datetime.timedelta(days=step*step_length+days_window)).strftime("%Y-%m-%d")
+
+            querystring_list.append(des.build_flight_request_querystring(countries_airports_df, origin_city, destination_city, date_departure,
+                                                                         origin_airport_code=origin_airport_code, destination_airport_code=origin_airport_code, sort_by="best"))
+            querystring_list.append(des.build_flight_request_querystring(countries_airports_df, destination_city, origin_city, date_return,
+                                                                         origin_airport_code=origin_airport_code, destination_airport_code=origin_airport_code, sort_by="best"))
+    return querystring_list
+
+
+def benchmark_airport_index(n_cities_list: Tuple[int, ...] = (100, 1000, 5000), n_destinations: int = 20, n_steps: int = 52) -> pd.DataFrame:
+    """
+    Compares building the querystrings of get_flights by scanning the airports DataFrame for every
+    querystring against building them from an AirportIndex, for airport tables of growing size.
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per method and number of cities with the elapsed seconds.
+    """
+    results = []
+    for n_cities in n_cities_list:
+        countries_airports = build_stub_airports(n_cities)
+        origin_city = "city0"
+        destination_cities = [f"city{i}" for i in range(1, min(n_destinations, n_cities - 1) + 1)]
+
+        start_time = time.perf_counter()
+        querystrings_scan = _build_querystring_list_single_by_scan(countries_airports, origin_city, destination_cities, "2024-11-08",
+                                                                   n_steps=n_steps, step_length=7, days_window=2, origin_airport_code=True)
+        results.append(("dataframe_scan", n_cities, time.perf_counter() - start_time))
+
+        start_time = time.perf_counter()
+        airport_index = AirportIndex.from_dataframe(countries_airports)
+        querystrings_index = airport_index.build_querystring_list_single(origin_city, destination_cities, "2024-11-08",
+                                                                         n_steps=n_steps, origin_airport_code=True)
+        results.append(("airport_index", n_cities, time.perf_counter() - start_time))
+
+        if querystrings_scan != querystrings_index:
+            print(f"Querystrings differ for {n_cities} cities")
+
+    results_df = pd.DataFrame(results, columns=["method", "n_cities", "seconds"])
+    for row in results_df.itertuples(index=False):
+        print(f"{row.method} with {row.n_cities} cities: {row.seconds:.3f} seconds")
+    return results_df
+
+
+### Flights - itinerary flattening
+def benchmark_itinerary_flattening(n_itineraries: int = 100000) -> pd.DataFrame:
+    """
+    Compares flattening itineraries one by one with extract_flight_info against the columnar
+    flatten_itineraries, and checks both give the same values (query_date aside).
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per method with the elapsed seconds and itineraries per second.
+    """
+    itineraries = [build_stub_itinerary(i) for i in range(n_itineraries)]
+
+    start_time = time.perf_counter()
+    itineraries_by_row = pd.DataFrame([des.extract_flight_info(itinerary) for itinerary in itineraries])
+    results = [("extract_flight_info", time.perf_counter() - start_time)]
+
+    start_time = time.perf_counter()
+    itineraries_by_column = flatten_itineraries(itineraries).to_pandas()
+    results.append(("flatten_itineraries", time.perf_counter() - start_time))
+
+    columns = [column for column in itineraries_by_row.columns if column != "query_date"]
+    if list(itineraries_by_row.columns) != list(itineraries_by_column.columns) or \
+            not itineraries_by_row[columns].astype(str).equals(itineraries_by_column[columns].astype(str)):
+        print("Flattened itineraries differ")
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds"])
+    results_df["n_itineraries"] = n_itineraries
+    results_df["itineraries_per_second"] = n_itineraries / results_df["seconds"]
+
+    _print_benchmark(results_df)
+    return results_df
+
+
+### Flights - round trip pairing
+def build_stub_one_way_itineraries(n_destinations: int = 50, n_weekends: int = 52, itineraries_per_query: int = 50,
+                                   days_window: int = 2, seed: int = 42) -> pd.DataFrame:
+    """
+    Builds flattened outbound (MAD to each destination) and return itineraries, one query per destination
+    and weekend in each direction, as get_flights would return for build_flight_request_querystring_list_single.
+    """
+    rng = np.random.default_rng(seed)
+    n_queries = n_destinations * n_weekends
+    n_rows = n_queries * itineraries_per_query
+
+    destinations = np.repeat(np.array([f"D{i:03d}" for i in range(n_destinations)]), n_weekends * itineraries_per_query)
+    weekends = pd.Timestamp("2024-11-08") + pd.to_timedelta(np.tile(np.repeat(np.arange(n_weekends) * 7, itineraries_per_query), n_destinations), unit="D")
+    durations = rng.integers(60, 600, size=n_rows)
+
+    legs = []
+    for direction, date_offset in (("outbound", 0), ("return", days_window)):
+        departures = weekends + pd.Timedelta(days=date_offset) + pd.to_timedelta(rng.integers(6 * 60, 23 * 60, size=n_rows), unit="min")
+        is_outbound = direction == "outbound"
+        legs.append(pd.DataFrame({
+            "itinerary_id": [f"{direction}-{i}" for i in range(n_rows)],
+            "duration": durations,
+            "price": rng.integers(20, 400, size=n_rows),
+            "departure": departures,
+            "arrival": departures + pd.to_timedelta(durations, unit="min"),
+            "origin_airport_code": "MAD" if is_outbound else destinations,
+            "destination_airport_code": destinations if is_outbound else "MAD"
+        }))
+
+    return pd.concat(legs, ignore_index=True)
+
+
+def _pair_round_trips_by_cross_join(itineraries_df: pd.DataFrame, origin_airport_code: str, days_window: int,
+                                    min_stay_hours: float, top_k: int) -> pd.DataFrame:
+    """
+    Reference pairing: merges every outbound with every return of its destination, filters and ranks.
+    """
+    outbound_df = itineraries_df[itineraries_df["origin_airport_code"] == origin_airport_code].assign(destination=lambda df: df["destination_airport_code"])
+    return_df = itineraries_df[itineraries_df["destination_airport_code"] == origin_airport_code].assign(destination=lambda df: df["origin_airport_code"])
+
+    pairs_df = outbound_df.merge(return_df, on="destination", suffixes=("_outbound", "_return"))
+    pairs_df["outbound_date"] = pairs_df["departure_outbound"].dt.normalize()
+    pairs_df = pairs_df[(pairs_df["departure_return"] >= pairs_df["arrival_outbound"] + pd.Timedelta(hours=min_stay_hours)) &
+                        (pairs_df["departure_return"] < pairs_df["outbound_date"] + pd.Timedelta(days=days_window + 1))]
+    pairs_df = pairs_df.assign(total_price=pairs_df["price_outbound"] + pairs_df["price_return"])
+
+    return pairs_df.sort_values(["destination", "outbound_date", "total_price"], kind="stable").groupby(["destination", "outbound_date"]).head(top_k)
+
+
+def benchmark_round_trip_pairing(n_destinations: int = 50, n_weekends: int = 26, itineraries_per_query: int = 20,
+                                 days_window: int = 2, min_stay_hours: float = 12, top_k: int = 5) -> pd.DataFrame:
+    """
+    Compares pairing outbound and return itineraries with a cross join against pair_round_trips,
+    and checks both keep the same total prices per (destination, outbound date).
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per method with the elapsed seconds and the number of pairs kept.
+    """
+    itineraries_df = build_stub_one_way_itineraries(n_destinations, n_weekends, itineraries_per_query, days_window)
+
+    start_time = time.perf_counter()
+    pairs_cross_join = _pair_round_trips_by_cross_join(itineraries_df, "MAD", days_window, min_stay_hours, top_k)
+    results = [("cross_join", time.perf_counter() - start_time, len(pairs_cross_join))]
+
+    start_time = time.perf_counter()
+    pairs_sweep = pair_round_trips(itineraries_df, "MAD", days_window=days_window, min_stay_hours=min_stay_hours, top_k=top_k)
+    results.append(("pair_round_trips", time.perf_counter() - start_time, len(pairs_sweep)))
+
+    if pairs_cross_join["total_price"].tolist() != pairs_sweep["total_price"].tolist():
+        print("Round trip prices differ")
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds", "n_pairs"])
+    results_df["n_itineraries"] = len(itineraries_df)
+
+    _print_benchmark(results_df)
+    return results_df
+
+
+### Flights - multi-origin sharding
+async def benchmark_sharded_crawl(n_requests: int = 400, itineraries_per_response: int = 200, latency: float = 0.01,
+                                  n_shards_list: Tuple[int, ...] = (1, 2, 4), max_concurrency: int = 20) -> pd.DataFrame:
+    """
+    Crawls the same querystrings from a local stub of the flights endpoint with crawl_flights_sharded
+    and an increasing number of worker processes. Large responses make flattening and writing the
+    bottleneck, which is the part that scales with cores.
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per number of shards with the elapsed seconds, itineraries written and requests per second.
+    """
+    payload = {"data": {"itineraries": [build_stub_itinerary(i) for i in range(itineraries_per_response)]}}
+    runner, base_url = await start_stub_server({"/flights": lambda _: payload}, latency=latency)
+    url = f"{base_url}/flights"
+
+    querystrings_list = [{"originSkyId": f"origin{i % 20}", "destinationSkyId": "barcelona", "date": str(i)} for i in range(n_requests)]
+
+    results = []
+    try:
+        for n_shards in n_shards_list:
+            with tempfile.TemporaryDirectory() as parts_dir:
+                start_time = time.perf_counter()
+                shard_results = await asyncio.to_thread(crawl_flights_sharded, querystrings_list, parts_dir, n_shards=n_shards,
+                                                        global_rate=1e9, provider="benchmark", url=url,
+                                                        max_concurrency=max_concurrency, limit_per_host=max_concurrency,
+                                                        use_cache=False)
+                n_rows = sum(shard_result["n_rows"] for shard_result in shard_results)
+                results.append((f"{n_shards}_shards", time.perf_counter() - start_time, n_rows))
+    finally:
+        await runner.cleanup()
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds", "n_itineraries"])
+    results_df["n_requests"] = n_requests
+    results_df["requests_per_second"] = n_requests / results_df["seconds"]
+
+    _print_benchmark(results_df)
+    return results_df
+
+
+### Accommodations - Booking parsing
+def build_stub_booking_card(card_number: int) -> str:
+    """
+    Builds a Booking accommodation card with the markup read by scrape_accommodations_from_page.
+    Some cards miss optional blocks, so both found and missing fields are exercised.
+    """
+    review_score = "" if card_number % 5 == 0 else (
+        '<div data-testid="review-score"><div><div>8,7</div> 8,{score}</div>'
+        '<div><div>Fabuloso</div> {comments} comentarios</div></div>'
+    ).format(score=card_number % 10, comments=f"{1000 + card_number:,}".replace(",", "."))
+    metro = '<span class="f419a93f12">Metro</span>' if card_number % 3 == 0 else ""
+    sustainability = '<span class="abf093bdfe e6208ee469 f68ecd98ea">Certificado</span>' if card_number % 4 == 0 else ""
+    cancellation = '<div class="abf093bdfe d068504c75">Cancelación gratis</div>' if card_number % 2 == 0 else ""
+
+    return (
+        '<div aria-label="Alojamiento"><div data-testid="title">Hotel {n}</div>'
+        '<a data-testid="title-link" href="https://www.booking.com/hotel/es/{n}.html">Ver</a>'
+        '<span data-testid="price-and-discounted-price">€ {price}</span>'
+        '<span data-testid="distance">A {distance} km del centro</span>'
+        '{review_score}{metro}{sustainability}'
+        '<h4 class="abf093bdfe e8f7c070a7">Habitación Doble</h4>'
+        '<div class="abf093bdfe">1 cama doble grande</div>{cancellation}'
+        '<div class="abf093bdfe d068504c75">Sin pago por adelantado</div>'
+        '<span class="a3332d346a">Ubicación {location}</span></div>'
+    ).format(n=card_number, price=f"{100 + card_number * 7:,}".replace(",", "."), distance=f"{card_number % 9},{card_number % 7}",
+             review_score=review_score, metro=metro, sustainability=sustainability, cancellation=cancellation,
+             location=f"{card_number % 10},{card_number % 3}")
+
+
+def build_stub_booking_pages(n_pages: int = 50, cards_per_page: int = 25) -> Tuple[List[str], List[str]]:
+    """
+    Builds Booking result pages, with filler markup around the cards, and their search urls.
+    """
+    filler = "<div class=\"filter\"><span>Filtro</span><input type=\"checkbox\"/></div>" * 200
+    pages, urls = [], []
+    for page_number in range(n_pages):
+        cards = "".join(build_stub_booking_card(page_number * cards_per_page + i) for i in range(cards_per_page))
+        pages.append(f"<html><head><title>Booking</title></head><body>{filler}<div id=\"results\">{cards}</div>{filler}</body></html>")
+        urls.append(des.build_booking_url_full("madrid", "2024-11-08", "2024-11-10", adults=2, max_price=350))
+    return pages, urls
+
+
+def benchmark_booking_parsers(archive: HtmlArchive = None, n_pages: int = 50, cards_per_page: int = 25) -> pd.DataFrame:
+    """
+    Parses the same Booking pages with every available backend of accommodations_booking_parse_single_page
+    and checks they give the same columns and values (query_date aside).
+
+    Parameters:
+    ----------
+    archive : HtmlArchive, optional
+        Archive with recorded Booking pages. Defaults to n_pages stub pages of cards_per_page cards.
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per backend with the elapsed seconds and pages per second.
+    """
+    if archive is not None:
+        urls, pages = zip(*archive.iter_pages(source="booking"))
+    else:
+        pages, urls = build_stub_booking_pages(n_pages, cards_per_page)
+
+    results, parsed = [], {}
+    for backend in available_booking_parser_backends():
+        start_time = time.perf_counter()
+        page_dfs = [des.accommodations_booking_parse_single_page(page_html, url, backend=backend) for page_html, url in zip(pages, urls)]
+        results.append((backend, time.perf_counter() - start_time))
+        parsed[backend] = pd.concat(page_dfs).reset_index(drop=True)
+
+    reference_df = parsed["bs4"]
+    for backend, parsed_df in parsed.items():
+        columns = [column for column in reference_df.columns if column != "query_date"]
+        if list(parsed_df.columns) != list(reference_df.columns) or not parsed_df[columns].astype(str).equals(reference_df[columns].astype(str)):
+            print(f"{backend} results differ from bs4")
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds"])
+    results_df["n_pages"] = len(pages)
+    results_df["pages_per_second"] = len(pages) / results_df["seconds"]
+
+    _print_benchmark(results_df)
+    return results_df
+
+
+def benchmark_booking_parse_stage(n_pages: int = 200, cards_per_page: int = 25, backend: str = "bs4",
+                                  chunk_size: int = 16) -> pd.DataFrame:
+    """
+    Compares the thread-based Booking parse stage against the process-based one returning Arrow
+    record batches, on the same stub pages, and checks both give the same values (query_date aside).
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per parse stage with the elapsed seconds and pages per second.
+    """
+    pages, urls = build_stub_booking_pages(n_pages, cards_per_page)
+
+    start_time = time.perf_counter()
+    threads_df = des.accommodations_booking_soup_from_all_html_contents_parallel(pages, urls, backend=backend)
+    results = [("threads_dataframes", time.perf_counter() - start_time)]
+
+    start_time = time.perf_counter()
+    processes_df = des.accommodations_booking_soup_from_all_html_contents_multiprocess(pages, urls, backend=backend, chunk_size=chunk_size)
+    results.append(("processes_record_batches", time.perf_counter() - start_time))
+
+    columns = [column for column in threads_df.columns if column != "query_date"]
+    if list(threads_df.columns) != list(processes_df.columns) or not threads_df[columns].astype(str).equals(processes_df[columns].astype(str)):
+        print("Parsed accommodations differ")
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds"])
+    results_df["n_pages"] = n_pages
+    results_df["pages_per_second"] = n_pages / results_df["seconds"]
+
+    _print_benchmark(results_df)
+    return results_df
+
+
+### Activities and accommodations - extraction specs
+def build_stub_civitatis_card(card_number: int) -> str:
+    """
+    Builds a Civitatis activity card with the markup read by scrape_activities_from_page. Some cards
+    miss the duration or have no available days, so missing and empty fields are exercised.
+    """
+    gtm = json.dumps({"ecommerce": {"currencyCode": "EUR", "click": {"products": [{"price": f"{20 + card_number % 50}.00"}]}}})
+    availability = "" if card_number % 6 == 0 else "".join(
+        f'<div class="m-availability__item"><span>vie.</span><br/> {8 + day}<span class="_time">10:00</span><span class="_time">17:30</span></div>'
+        for day in range(3)
+    ) + '<div class="m-availability__item _no-dates"><br/> 12</div>'
+    duration = "" if card_number % 4 == 0 else '<span class="comfort-card__feature _duration has-tip top _processed"> 2 horas </span>'
+
+    return (
+        '<div class="o-search-list__item"><article data-latitude="40.41{n:03d}" data-longitude="-3.70{n:03d}">'
+        '<a class="ga-trackEvent-element _activity-link" title="Actividad {n}" data-gtm-new-model-click=\'{gtm}\'>Actividad {n}</a>'
+        '<a data-eventcategory="Actividades Listado" href="/es/madrid/actividad-{n}/">Ver</a>'
+        '<img src="/f/madrid/{n}.jpg" data-src="/f/madrid/{n}-2.jpg"/>'
+        '<div class="comfort-card__text l-list-card__text"> Visita&nbsp;guiada {n} </div>'
+        '{availability}{duration}'
+        '<span data-tooltip-class="tooltip activity-tooltip city-list__feature-tooltip"> Visitas guiadas </span>'
+        '<span class="comfort-card__feature _lang has-tip top _processed"> Español </span>'
+        '</article></div>'
+    ).format(n=card_number, gtm=gtm, availability=availability, duration=duration)
+
+
+def build_stub_civitatis_pages(n_pages: int = 50, cards_per_page: int = 20, n_windows: int = 1) -> Tuple[List[str], List[str]]:
+    """
+    Builds Civitatis listing pages and their urls. With n_windows, the same pages are listed again for
+    every following 6-day window, as the same activities are listed in every window.
+    """
+    pages, urls = [], []
+    for window in range(n_windows):
+        date_start = datetime.date(2024, 11, 8) + datetime.timedelta(days=6 * window)
+        for page_number in range(n_pages):
+            cards = "".join(build_stub_civitatis_card(page_number * cards_per_page + i) for i in range(cards_per_page))
+            pages.append(f"<html><body><div class=\"o-search-list\">{cards}</div></body></html>")
+            urls.append(f"https://www.civitatis.com/es/madrid/?page={page_number + 1}&fromDate={date_start}&toDate={date_start + datetime.timedelta(days=6)}")
+    return pages, urls
+
+
+def _scrape_activities_from_page_by_lambdas(page_soup, page_url, verbose=False):
+    # scrape_activities_from_page before the extraction spec: the lambdas are rebuilt for every card, each one is
+    # called twice, the url regexes run for every card and the tracking json is parsed for price and currency
+    activity_data_dict = {key: [] for key in des.CIVITATIS_SOUP_SPEC.columns}
+
+    for element in page_soup.findAll("div",{"class","o-search-list__item"}):
+
+        availability_cards = list(set(element.findAll("div", {"class": "m-availability__item"})) -
+                                set(element.findAll("div", {"class": "m-availability__item _no-dates"})))
+
+        activity_scraper_dict = {
+            "query_date": lambda _ : datetime.datetime.now(),
+            "city": lambda _: re.findall(r".com/es/(\w+)/", page_url)[0],
+            "activity_date_range_start": lambda _: re.findall(r"fromDate=(\d{4}-\d{2}-\d{2})", page_url)[0],
+            "activity_date_range_end": lambda _: re.findall(r"toDate=(\d{4}-\d{2}-\d{2})", page_url)[0],
+            "activity_name": lambda element: element.find("a", {"class": "ga-trackEvent-element _activity-link"})["title"],
+            "description": lambda element: element.find("div", {"class": "comfort-card__text l-list-card__text"}).text.strip().replace("\xa0", " "),
+            "url": lambda element: "www.civitatis.com" + element.find("a",{"data-eventcategory":"Actividades Listado"})["href"],
+            "image": lambda element: "www.civitatis.com" + element.find("img")["src"],
+            "image2": lambda element: "www.civitatis.com" + element.find("img")["data-src"],
+            "available_days": lambda _: [el.find('br').next_sibling.strip() for el in availability_cards],
+            "available_times": lambda _: [[time.text for time in el.find_all("span", {"class": "_time"})] for el in availability_cards],
+            "duration": lambda element: element.find("span",{"class":"comfort-card__feature _duration has-tip top _processed"}).text.strip(),
+            "latitude": lambda element: element.find("article", recursive=False)["data-latitude"],
+            "longitude": lambda element: element.find("article", recursive=False)["data-longitude"],
+            "price": lambda element: json.loads(element.find("a", {"class": "ga-trackEvent-element _activity-link"})["data-gtm-new-model-click"])["ecommerce"]["click"]["products"][0]["price"],
+            "currency": lambda element: json.loads(element.find("a", {"class": "ga-trackEvent-element _activity-link"})["data-gtm-new-model-click"])["ecommerce"]["currencyCode"],
+            "category": lambda element: element.find("span",{"data-tooltip-class":"tooltip activity-tooltip city-list__feature-tooltip"}).text.strip(),
+            "spanish": lambda element: element.find("span",{"class":"comfort-card__feature _lang has-tip top _processed"}).text.strip()
+        }
+
+        for key, activity_scraper_function in activity_scraper_dict.items():
+            try:
+                if not activity_scraper_function(element):
+                    activity_data_dict[key].append(np.nan)
+                else:
+                    activity_data_dict[key].append(activity_scraper_function(element))
+            except Exception as e:
+                if verbose == True:
+                    print(f"Error filling {key} due to {e}")
+                activity_data_dict[key].append(np.nan)
+
+    return activity_data_dict
+
+
+def benchmark_extraction_specs(n_pages: int = 50, cards_per_page: int = 20) -> pd.DataFrame:
+    """
+    Measures the per-card cost of the extraction specs on stub pages, parsed beforehand so only the extraction
+    is timed: Civitatis cards with the former per-card lambdas against CIVITATIS_SOUP_SPEC, and Booking cards
+    with BOOKING_SOUP_SPEC and, if lxml is installed, the lxml spec. Checks the Civitatis results are the same
+    (query_date aside, available days compared regardless of order, as the former scraper did not keep it).
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per method with the elapsed seconds, number of cards and microseconds per card.
+    """
+    civitatis_pages, civitatis_urls = build_stub_civitatis_pages(n_pages, cards_per_page)
+    civitatis_soups = [BeautifulSoup(page_html, "html.parser") for page_html in civitatis_pages]
+    booking_pages, booking_urls = build_stub_booking_pages(n_pages, cards_per_page)
+
+    methods = [
+        ("civitatis_lambdas_per_card", _scrape_activities_from_page_by_lambdas, civitatis_soups, civitatis_urls),
+        ("civitatis_spec", des.scrape_activities_from_page, civitatis_soups, civitatis_urls),
+        ("booking_soup_spec", des.scrape_accommodations_from_page,
+         [BeautifulSoup(page_html, "html.parser") for page_html in booking_pages], booking_urls)
+    ]
+    if "lxml" in available_booking_parser_backends():
+        import lxml.html
+        from .booking_parser_support import BOOKING_LXML_SPEC
+        methods.append(("booking_lxml_spec", BOOKING_LXML_SPEC.extract, [lxml.html.fromstring(page_html) for page_html in booking_pages], booking_urls))
+
+    results, parsed = [], {}
+    for method, scrape_page, pages, urls in methods:
+        start_time = time.perf_counter()
+        page_dicts = [scrape_page(page, url) for page, url in zip(pages, urls)]
+        results.append((method, time.perf_counter() - start_time))
+        parsed[method] = pd.concat([pd.DataFrame(page_dict) for page_dict in page_dicts]).reset_index(drop=True)
+
+    def comparable(activities_df):
+        activities_df = activities_df.drop(columns="query_date")
+        activities_df["available_days"] = activities_df["available_days"].map(lambda days: sorted(days) if isinstance(days, list) else days)
+        activities_df["available_times"] = activities_df["available_times"].map(lambda times: sorted(times) if isinstance(times, list) else times)
+        return activities_df.astype(str)
+
+    if not comparable(parsed["civitatis_lambdas_per_card"]).equals(comparable(parsed["civitatis_spec"])):
+        print("civitatis_spec results differ from the per-card lambdas")
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds"])
+    results_df["n_cards"] = n_pages * cards_per_page
+    results_df["microseconds_per_card"] = results_df["seconds"] / results_df["n_cards"] * 1e6
+
+    _print_benchmark(results_df)
+    return results_df
+
+
+def benchmark_activity_deduplication(n_windows: int = 20, n_pages: int = 5, cards_per_page: int = 20) -> pd.DataFrame:
+    """
+    Extracts the same activities listed in n_windows date windows, from pages parsed beforehand, once
+    per card and with a dedup index extracting static fields once per activity. Checks the joined
+    result matches and reports the memory of the extracted frames.
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per method with the elapsed seconds, microseconds per card and megabytes extracted.
+    """
+    pages, urls = build_stub_civitatis_pages(n_pages, cards_per_page, n_windows)
+    soups = [BeautifulSoup(page_html, "html.parser") for page_html in pages]
+
+    start_time = time.perf_counter()
+    per_card_df = pd.concat([pd.DataFrame(des.scrape_activities_from_page(soup, url)) for soup, url in zip(soups, urls)], ignore_index=True)
+    results = [("per_card", time.perf_counter() - start_time, per_card_df.memory_usage(deep=True).sum())]
+
+    start_time = time.perf_counter()
+    index = RecordIndex(des.CIVITATIS_KEY_FIELDS, des.CIVITATIS_STATIC_FIELDS)
+    activity_windows_df = pd.concat([pd.DataFrame(des.scrape_activities_from_page(soup, url, index=index)) for soup, url in zip(soups, urls)],
+                                    ignore_index=True).rename(columns={"record_id": "activity_id"})
+    activities_df = pd.DataFrame(index.records).rename(columns={"record_id": "activity_id"})
+    results.append(("deduplicated", time.perf_counter() - start_time,
+                    activities_df.memory_usage(deep=True).sum() + activity_windows_df.memory_usage(deep=True).sum()))
+
+    joined_df = des.join_activity_windows(activities_df, activity_windows_df)
+    if not joined_df.drop(columns="query_date").astype(str).equals(per_card_df.drop(columns="query_date").astype(str)):
+        print("Deduplicated activities differ")
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds", "bytes"])
+    results_df["n_cards"] = len(per_card_df)
+    results_df["microseconds_per_card"] = results_df["seconds"] / results_df["n_cards"] * 1e6
+    results_df["megabytes"] = results_df.pop("bytes") / 1024 ** 2
+
+    _print_benchmark(results_df)
+    return results_df
+
+
+### Activities - availability expansion
+def build_stub_activities(n_activities: int = 100000, seed: int = 0) -> pd.DataFrame:
+    """
+    Builds scraped activities over a year of 6-day search windows, with the list columns of
+    scrape_activities_from_page. About a third of them have no availability, as in the scraped data.
+    """
+    rng = np.random.default_rng(seed)
+    window_starts = pd.Timestamp("2024-11-01") + pd.to_timedelta(6 * rng.integers(0, 61, n_activities), unit="D")
+    time_choices = np.array(["09:00", "10:00", "10:30", "12:00", "16:30", "17:00", "20:00"])
+
+    available_days, available_times = [], []
+    for window_start, n_days in zip(window_starts, rng.integers(-3, 8, n_activities)):
+        if n_days <= 0:
+            available_days.append(np.nan)
+            available_times.append(np.nan)
+            continue
+        days = window_start + pd.to_timedelta(np.sort(rng.choice(7, n_days, replace=False)), unit="D")
+        available_days.append([f"{day.day:02d}" for day in days])
+        available_times.append([list(time_choices[rng.choice(7, rng.integers(0, 4), replace=False)]) for _ in days])
+
+    return pd.DataFrame({
+        "query_date": pd.Timestamp("2024-11-01 08:00"),
+        "city": rng.choice(["madrid", "sevilla", "valencia", "bilbao", "malaga"], n_activities),
+        "activity_name": [f"Actividad {activity_number}" for activity_number in range(n_activities)],
+        "activity_date_range_start": window_starts.strftime("%Y-%m-%d"),
+        "activity_date_range_end": (window_starts + pd.Timedelta(days=6)).strftime("%Y-%m-%d"),
+        "available_days": available_days,
+        "available_times": available_times
+    })
+
+
+def _expand_activity_availabilities_by_rows(activities_df: pd.DataFrame) -> pd.DataFrame:
+    # the transformation notebook before expand_activity_availabilities: row-wise zip, two explodes,
+    # strptime per time and the month of every date resolved row by row
+    availability_activities = activities_df[["available_days","query_date","available_times","city","activity_name","activity_date_range_start","activity_date_range_end"]].copy()
+    availability_activities["paired"] = availability_activities[["available_days","available_times"]].fillna("-").apply(lambda x: list(zip(x["available_days"], x["available_times"])), axis=1)
+    availability_activities = availability_activities.explode("paired", ignore_index=True)
+    availability_activities[["available_days", "available_times"]] = pd.DataFrame(availability_activities["paired"].tolist(), index=availability_activities.index)
+    availability_activities = availability_activities.drop(columns="paired")
+    availability_activities = availability_activities.explode("available_times")
+
+    availability_activities["activity_date_range_start"] = pd.to_datetime(availability_activities["activity_date_range_start"])
+    availability_activities["activity_date_range_end"] = pd.to_datetime(availability_activities["activity_date_range_end"])
+    availability_activities[["available_days","available_times"]] = availability_activities[["available_days","available_times"]].replace("-",None)
+    availability_activities["available_times"] = availability_activities["available_times"].apply(lambda x: datetime.datetime.strptime(x, "%H:%M").time() if pd.notna(x) else None)
+
+    def calculate_adjusted_date(row):
+        if pd.isna(row["available_days"]):
+            return pd.NaT
+        day = int(row["available_days"])
+        if day > row["activity_date_range_end"].day:
+            return row["activity_date_range_start"].replace(day=day)
+        else:
+            return row["activity_date_range_end"].replace(day=day)
+
+    availability_activities["available_date"] = availability_activities.apply(calculate_adjusted_date, axis=1)
+    availability_activities.drop(columns="available_days",inplace=True)
+    return availability_activities[~availability_activities["available_date"].isna()].reset_index(drop=True)
+
+
+def benchmark_availability_expansion(activities_df: pd.DataFrame = None, n_activities: int = 100000) -> pd.DataFrame:
+    """
+    Compares the row-wise availability expansion of the transformation notebook against
+    expand_activity_availabilities and checks both give the same rows.
+
+    Parameters:
+    ----------
+    activities_df : pd.DataFrame, optional
+        Scraped activities, e.g. read from activities.parquet. Defaults to n_activities stub activities.
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per method with the elapsed seconds and availability rows per second.
+    """
+    activities_df = build_stub_activities(n_activities) if activities_df is None else activities_df
+
+    start_time = time.perf_counter()
+    by_rows_df = _expand_activity_availabilities_by_rows(activities_df)
+    results = [("row_wise_apply", time.perf_counter() - start_time)]
+
+    start_time = time.perf_counter()
+    vectorized_df = expand_activity_availabilities(activities_df)
+    results.append(("vectorized", time.perf_counter() - start_time))
+
+    if not by_rows_df.astype(str).equals(vectorized_df.astype(str)):
+        print("Expanded availabilities differ")
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds"])
+    results_df["n_rows"] = len(vectorized_df)
+    results_df["rows_per_second"] = len(vectorized_df) / results_df["seconds"]
+
+    _print_benchmark(results_df)
+    return results_df
+
+
+### Weather - batched requests
+def _stub_open_meteo_payload(request) -> object:
+    # one result per requested location, a bare object for a single location, as Open-Meteo answers
+    latitudes = request.query["latitude"].split(",")
+    longitudes = request.query["longitude"].split(",")
+    days = pd.date_range(request.query.get("start_date", "2024-01-01"), request.query.get("end_date", "2024-12-31")).strftime("%Y-%m-%d").tolist()
+    locations = [{"latitude": float(latitude), "longitude": float(longitude),
+                  "daily": {"time": days, "temperature_2m_max": [20.5] * len(days), "precipitation_sum": [0.1] * len(days)}}
+                 for latitude, longitude in zip(latitudes, longitudes)]
+    return locations if len(locations) > 1 else locations[0]
+
+
+async def benchmark_weather_client(n_cities: int = 300, locations_per_request: int = 50, latency: float = 0.05) -> pd.DataFrame:
+    """
+    Compares one request and session per city (fetch_weather_data_city) against OpenMeteoClient sending
+    locations_per_request cities per request, on a local stub of the Open-Meteo archive endpoint with a
+    year of daily data per city. Rate limits are lifted, so only the HTTP path is measured, and both
+    frames are checked to hold the same values.
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per method with the elapsed seconds and number of requests sent.
+    """
+    n_requests = {"count": 0}
+
+    def count_and_build(request):
+        n_requests["count"] += 1
+        return _stub_open_meteo_payload(request)
+
+    runner, base_url = await start_stub_server({"/archive": count_and_build}, latency=latency)
+    url = f"{base_url}/archive"
+    cities_dict = {f"city_{city_number}": (round(36 + city_number * 0.01, 4), round(-6 + city_number * 0.01, 4)) for city_number in range(n_cities)}
+    params = {"start_date": "2024-01-01", "end_date": "2024-12-31", "daily": "temperature_2m_max,precipitation_sum"}
+    disabled_cache = ResponseCache(":memory:", mode="disabled")
+
+    # measure the HTTP path only, not the provider rate limit
+    configure_provider("open_meteo", rate=1e9)
+    results = []
+    try:
+        start_time = time.perf_counter()
+        per_city_df = pd.concat(await asyncio.gather(*(des.fetch_weather_data_city(url, city, latitude, longitude, params, cache=disabled_cache)
+                                                       for city, (latitude, longitude) in cities_dict.items())), ignore_index=True)
+        results.append(("request_per_city", time.perf_counter() - start_time, n_requests["count"]))
+
+        n_requests["count"] = 0
+        start_time = time.perf_counter()
+        async with OpenMeteoClient(locations_per_request=locations_per_request, cache=disabled_cache) as client:
+            batched_df = await client.request_daily(url, cities_dict, params)
+        results.append(("batched_client", time.perf_counter() - start_time, n_requests["count"]))
+    finally:
+        configure_provider("open_meteo", **PROVIDER_LIMITS["open_meteo"])
+        await runner.cleanup()
+
+    if not per_city_df.equals(batched_df):
+        print("Weather frames differ")
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds", "n_requests"])
+    results_df["n_cities"] = n_cities
+
+    _print_benchmark(results_df)
+    return results_df
+
+
+### Activities - reverse geocoding
+def build_stub_activity_coordinates(n_activities: int = 5000, n_venues: int = 300, jitter_metres: float = 3, seed: int = 0) -> pd.DataFrame:
+    """
+    Builds activity coordinates (as scraped, strings) around n_venues venues, each activity a few metres
+    away from its venue, as the same meeting points are listed with slightly different coordinates.
+    """
+    rng = np.random.default_rng(seed)
+    venues = np.column_stack([rng.uniform(36.0, 43.0, n_venues), rng.uniform(-9.0, 3.0, n_venues)])
+    activity_venues = rng.integers(0, n_venues, n_activities)
+    jitter_degrees = jitter_metres / 111_000
+    coordinates = venues[activity_venues] + rng.uniform(-jitter_degrees, jitter_degrees, (n_activities, 2))
+    return pd.DataFrame({"latitude": [f"{latitude:.6f}" for latitude in coordinates[:, 0]],
+                         "longitude": [f"{longitude:.6f}" for longitude in coordinates[:, 1]]})
+
+
+async def _get_address_per_coordinate(url: str, coordinates: List[Tuple[str, str]]) -> List[str]:
+    # the transformation notebook before the geocoding cache: one session and request per unique coordinate
+    async def get_address(latitude, longitude):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, params={"latlng": f"{latitude},{longitude}", "key": "benchmark"}) as response:
+                data = await response.json()
+                return data["results"][0]["formatted_address"] if data.get("status") == "OK" else "Address not found"
+
+    return await asyncio.gather(*(get_address(latitude, longitude) for latitude, longitude in coordinates))
+
+
+async def benchmark_geocoding_cache(n_activities: int = 5000, n_venues: int = 300, latency: float = 0.05,
+                                    precision: int = 4) -> pd.DataFrame:
+    """
+    Reverse geocodes the unique coordinates of stub activities against a local stub of the Google geocoding
+    endpoint: one request per unique coordinate pair, then with the geocoding cache on a cold and a warm run.
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per method with the elapsed seconds and the number of requests that reached the provider.
+    """
+    n_requests = {"count": 0}
+
+    def count_and_geocode(request):
+        n_requests["count"] += 1
+        latitude, longitude = request.query["latlng"].split(",")
+        return {"status": "OK", "results": [{"formatted_address": f"Calle {float(latitude):.3f}, {float(longitude):.3f}"}]}
+
+    runner, base_url = await start_stub_server({"/geocode/json": count_and_geocode}, latency=latency)
+    url = f"{base_url}/geocode/json"
+    unique_coordinates = list(build_stub_activity_coordinates(n_activities, n_venues).drop_duplicates().itertuples(index=False, name=None))
+    cache = GeocodingCache(":memory:", precision=precision)
+
+    # measure requests and the HTTP path, not the provider rate limit
+    configure_provider("google_geocoding", rate=1e9)
+    results = []
+    try:
+        start_time = time.perf_counter()
+        await _get_address_per_coordinate(url, unique_coordinates)
+        results.append(("request_per_coordinate", time.perf_counter() - start_time, n_requests["count"]))
+
+        for method in ("cache_cold", "cache_warm"):
+            n_requests["count"] = 0
+            start_time = time.perf_counter()
+            async with Geocoder(cache, reverse_url=url) as geocoder:
+                await geocoder.reverse_many(unique_coordinates)
+            results.append((method, time.perf_counter() - start_time, n_requests["count"]))
+    finally:
+        configure_provider("google_geocoding", **PROVIDER_LIMITS["google_geocoding"])
+        await runner.cleanup()
+        cache.close()
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds", "n_requests"])
+    results_df["n_coordinates"] = len(unique_coordinates)
+
+    _print_benchmark(results_df)
+    return results_df
+
+
+### Trip scoring - spatial index
+def _query_by_pairwise_scan(latitudes: np.ndarray, longitudes: np.ndarray, query_latitudes: np.ndarray,
+                            query_longitudes: np.ndarray, radius_km: float, k: int) -> Tuple[List[np.ndarray], np.ndarray]:
+    # haversine distance from every query point to every activity, one query at a time
+    nearby, nearest = [], []
+    for query_latitude, query_longitude in zip(query_latitudes, query_longitudes):
+        distances_km = haversine_km(query_latitude, query_longitude, latitudes, longitudes)
+        nearby.append(np.flatnonzero(distances_km <= radius_km))
+        nearest.append(np.sort(distances_km)[:k])
+    return nearby, np.array(nearest)
+
+
+def benchmark_spatial_index(activities_df: pd.DataFrame = None, n_activities: int = 20000, n_venues: int = 2000,
+                            n_queries: int = 2000, radius_km: float = 1.5, k: int = 10, seed: int = 0) -> pd.DataFrame:
+    """
+    Compares finding the activities within radius_km and the k nearest activities of query points (e.g.
+    accommodations) with a pairwise haversine scan against a SpatialIndex, and checks both find the same.
+
+    Parameters:
+    ----------
+    activities_df : pd.DataFrame, optional
+        Activities with latitude and longitude columns, e.g. read from the transformed activities.parquet.
+        Defaults to n_activities stub activities around n_venues venues.
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per method with the elapsed seconds (building the index included) and queries per second.
+    """
+    activities_df = build_stub_activity_coordinates(n_activities, n_venues, jitter_metres=200, seed=seed) if activities_df is None else activities_df
+
+    start_time = time.perf_counter()
+    activities_index = SpatialIndex.from_dataframe(activities_df)
+    build_seconds = time.perf_counter() - start_time
+
+    # query points a few hundred metres away from random activities
+    rng = np.random.default_rng(seed)
+    anchors = rng.choice(len(activities_index), n_queries)
+    query_latitudes = activities_index.latitudes[anchors] + rng.normal(0, 0.003, n_queries)
+    query_longitudes = activities_index.longitudes[anchors] + rng.normal(0, 0.003, n_queries)
+
+    start_time = time.perf_counter()
+    nearby_scan, nearest_scan = _query_by_pairwise_scan(activities_index.latitudes, activities_index.longitudes,
+                                                        query_latitudes, query_longitudes, radius_km, k)
+    results = [("pairwise_scan", time.perf_counter() - start_time)]
+
+    start_time = time.perf_counter()
+    nearby_index = activities_index.query_radius(query_latitudes, query_longitudes, radius_km, sort=False)
+    nearest_index, _ = activities_index.query_knn(query_latitudes, query_longitudes, k=k)
+    results.append(("spatial_index", build_seconds + time.perf_counter() - start_time))
+
+    # the scan works on the indexed points, so its matches are mapped to rows of the frame as well
+    if any(set(activities_index.positions[scan]) != set(index) for scan, index in zip(nearby_scan, nearby_index)) or \
+            not np.allclose(nearest_scan, nearest_index):
+        print("Nearby activities differ")
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds"])
+    results_df["n_points"] = len(activities_index)
+    results_df["n_queries"] = n_queries
+    results_df["queries_per_second"] = n_queries / results_df["seconds"]
+
+    _print_benchmark(results_df)
+    return results_df
+
+
+### Database - bulk load
+BENCHMARK_LOAD_TABLE = "benchmark_bulk_load"
+
+
+def build_stub_load_rows(n_rows: int = 100000, seed: int = 0) -> pd.DataFrame:
+    """
+    Builds rows with the column types of the travel_planner tables: timestamps, dates, times, prices with
+    missing values, whole numbers stored as floats, booleans and free text.
+    """
+    rng = np.random.default_rng(seed)
+    query_dates = pd.Timestamp("2024-11-04") + pd.to_timedelta(rng.integers(0, 86400 * 30, n_rows), unit="s")
+    times = [datetime.time(hour, minute) for hour, minute in zip(rng.integers(8, 22, n_rows), rng.choice([0, 15, 30, 45], n_rows))]
+    prices = rng.uniform(10, 300, n_rows).round(2)
+    prices[rng.random(n_rows) < 0.05] = np.nan
+
+    return pd.DataFrame({
+        "query_date": query_dates,
+        "available_date": (query_dates.normalize() + pd.to_timedelta(rng.integers(1, 365, n_rows), unit="D")).date,
+        "available_time": times,
+        "price": prices,
+        "n_rooms": rng.integers(1, 4, n_rows).astype(float),
+        "free_cancellation": rng.random(n_rows) < 0.5,
+        "name": [f"Activity {i}, \"guided\" tour" for i in range(n_rows)]
+    })
+
+
+def _insert_by_executemany(conn, rows_df: pd.DataFrame, table: str) -> None:
+    # the load notebook before COPY, with NaN turned into None so both methods load the same NULLs
+    placeholders = ", ".join(["%s"] * len(rows_df.columns))
+    rows_df = rows_df.astype(object).where(rows_df.notna(), None)
+    with conn.cursor() as cursor:
+        cursor.executemany(f"INSERT INTO {table} ({', '.join(rows_df.columns)}) VALUES ({placeholders})",
+                           list(rows_df.itertuples(index=False, name=None)))
+    conn.commit()
+
+
+def benchmark_bulk_load(conn, n_rows: int = 100000, chunk_size: int = 50000) -> pd.DataFrame:
+    """
+    Compares loading stub rows into a PostgreSQL table with executemany against copy_dataframe, and checks
+    both load the same values. The benchmark table is created and dropped on the given connection.
+
+    Parameters:
+    ----------
+    conn : psycopg2.extensions.connection
+        Connection to a local database, e.g. dcs.get_pool("travel_planner_v2", credentials_dict).getconn().
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per method with the elapsed seconds and rows per second.
+    """
+    rows_df = build_stub_load_rows(n_rows)
+    checksum_query = f"""
+        SELECT count(*), count(price), sum(price), sum(n_rooms), count(*) FILTER (WHERE free_cancellation),
+               min(query_date), max(available_date), max(available_time), sum(length(name))
+        FROM {BENCHMARK_LOAD_TABLE};
+    """
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            DROP TABLE IF EXISTS {BENCHMARK_LOAD_TABLE};
+            CREATE TABLE {BENCHMARK_LOAD_TABLE} (
+                load_id SERIAL PRIMARY KEY,
+                query_date TIMESTAMP NOT NULL,
+                available_date DATE NOT NULL,
+                available_time TIME NOT NULL,
+                price NUMERIC,
+                n_rooms INT NOT NULL,
+                free_cancellation BOOLEAN,
+                name TEXT
+            );
+        """)
+    conn.commit()
+
+    results, checksums = [], []
+    try:
+        for method, load in (("executemany", lambda: _insert_by_executemany(conn, rows_df, BENCHMARK_LOAD_TABLE)),
+                             ("copy", lambda: copy_dataframe(conn, rows_df, BENCHMARK_LOAD_TABLE, chunk_size=chunk_size))):
+            with conn.cursor() as cursor:
+                cursor.execute(f"TRUNCATE {BENCHMARK_LOAD_TABLE};")
+            conn.commit()
+
+            start_time = time.perf_counter()
+            load()
+            results.append((method, time.perf_counter() - start_time))
+
+            with conn.cursor() as cursor:
+                cursor.execute(checksum_query)
+                checksums.append(cursor.fetchone())
+            conn.commit()
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {BENCHMARK_LOAD_TABLE};")
+        conn.commit()
+
+    if checksums[0] != checksums[1]:
+        print(f"Loaded rows differ: {checksums[0]} != {checksums[1]}")
+
+    results_df = pd.DataFrame(results, columns=["method", "seconds"])
+    results_df["n_rows"] = n_rows
+    results_df["rows_per_second"] = n_rows / results_df["seconds"]
+
+    _print_benchmark(results_df)
+    return results_df
@@ -0,0 +1,195 @@
+# data processing
+import numpy as np
+import pyarrow as pa
+
+# fast html parsing, optional: the BeautifulSoup backend is used when lxml is not installed
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+# work with dates and time
+import datetime
+
+# regular expressions
+import re
+
+# function typing
+from typing import Callable, Dict, List
+
+# declarative extraction of page records
+from .extraction_spec_support import CardNodes, ExtractionSpec, url_regex_field
+
+
+# fields read from the search url, the same for every card of a page
+BOOKING_URL_PATTERNS = {
+    "city": re.compile(r"ss=([a-z]+)&"),
+    "checkin": re.compile(r"checkin=(\d{4}-\d{2}-\d{2})"),
+    "checkout": re.compile(r"checkout=(\d{4}-\d{2}-\d{2})"),
+    "n_adults_search": re.compile(r"group_adults=(\d+)"),
+    "n_children_search": re.compile(r"group_children=(\d+)"),
+    "n_rooms_search": re.compile(r"no_rooms=(\d+)")
+}
+
+# columns of scrape_accommodations_from_page, in order
+BOOKING_COLUMNS = ["query_date", *BOOKING_URL_PATTERNS, "name", "url", "price_currency", "total_price_amount",
+                   "distance_city_center_km", "score", "n_comments", "close_to_metro", "sustainability_cert", "room_type",
+                   "double_bed", "single_bed", "free_cancellation", "breakfast_included", "pay_at_hotel", "location_score",
+                   "free_taxi"]
+
+# arrow types of the columns, used to send parsed pages between processes as record batches
+BOOKING_BOOLEAN_COLUMNS = ["close_to_metro", "sustainability_cert", "double_bed", "single_bed", "free_cancellation",
+                           "breakfast_included", "pay_at_hotel", "free_taxi"]
+BOOKING_ARROW_SCHEMA = pa.schema([
+    (column, pa.timestamp("ns") if column == "query_date" else pa.bool_() if column in BOOKING_BOOLEAN_COLUMNS else pa.string())
+    for column in BOOKING_COLUMNS
+])
+
+# page fields of every Booking scraper: the query time and the search read from the url
+BOOKING_PAGE_FIELDS = {
+    "query_date": lambda _: datetime.datetime.now(),
+    **{key: url_regex_field(pattern) for key, pattern in BOOKING_URL_PATTERNS.items()}
+}
+
+
+def _classes(element) -> str:
+    return " ".join((element.get("class") or "").split())
+
+
+def _next_sibling_text(element) -> str:
+    # BeautifulSoup's next_sibling: the text right after the element, else the following element
+    if element.tail:
+        return element.tail
+    sibling = element.getnext()
+    if sibling is None:
+        raise AttributeError("'NoneType' object has no attribute 'text'")
+    return sibling.text_content()
+
+
+def _first_child_div_sibling_text(review_score, position: int) -> str:
+    child_divs = [child for child in review_score if child.tag == "div"]
+    inner_div = next(element for element in child_divs[position].iterdescendants("div"))
+    return _next_sibling_text(inner_div)
+
+
+def _required(element, name: str):
+    if element is None:
+        raise AttributeError(f"'NoneType' object has no attribute '{name}'")
+    return element
+
+
+# field extractors over the elements collected from a card: first matching element or list of matches
+BOOKING_CARD_FIELDS: Dict[str, Callable[[CardNodes], object]] = {
+    "name": lambda found: _required(found["title"], "text").text_content(),
+    "url": lambda found: _required(found["title_link"], "attrs").attrib["href"],
+    "price_currency": lambda found: _required(found["price"], "text").text_content().split()[0],
+    "total_price_amount": lambda found: _required(found["price"], "text").text_content().split()[1].replace(".", "").replace(",", "."),
+    "distance_city_center_km": lambda found: _required(found["distance"], "text").text_content().split()[1].replace(".", "").replace(",", "."),
+    "score": lambda found: _first_child_div_sibling_text(_required(found["review_score"], "find_all"), 0).strip().replace(",", "."),
+    "n_comments": lambda found: _first_child_div_sibling_text(_required(found["review_score"], "find_all"), 1).strip().split()[0].replace(".", ""),
+    "close_to_metro": lambda found: found["metro"] is not None,
+    "sustainability_cert": lambda found: found["sustainability"] is not None,
+    "room_type": lambda found: _required(found["room_type"], "text").text_content(),
+    "double_bed": lambda found: any("doble" in element.text_content() for element in found["bed_divs"]),
+    "single_bed": lambda found: any("individual" in element.text_content() for element in found["bed_divs"]),
+    "free_cancellation": lambda found: any(element.text_content() == "Cancelación gratis" for element in found["policy_divs"]),
+    "breakfast_included": lambda found: any(element.text_content() == "Cancelación gratis" for element in found["policy_divs"]),
+    "pay_at_hotel": lambda found: any("Sin pago por adelantado" in element.text_content() for element in found["policy_divs"]),
+    "location_score": lambda found: _required(found["location_score"], "text").text_content().split()[1].replace(",", "."),
+    "free_taxi": lambda found: any("taxi gratis" in element.text_content().lower() for element in found["taxi_divs"])
+}
+
+
+def _collect_card_elements(card) -> CardNodes:
+    """
+    Walks the card once and keeps every element a field reads, with the matching rules of the
+    BeautifulSoup lambdas (a single class matches any of the element's classes, several classes
+    must match the whole class attribute).
+    """
+    found = CardNodes(card)
+    found.update({"title": None, "title_link": None, "price": None, "distance": None, "review_score": None, "metro": None,
+                  "sustainability": None, "room_type": None, "location_score": None,
+                  "bed_divs": [], "policy_divs": [], "taxi_divs": []})
+
+    def keep_first(key, element):
+        if found[key] is None:
+            found[key] = element
+
+    for element in card.iterdescendants():
+        tag = element.tag
+        if tag == "div":
+            testid = element.get("data-testid")
+            if testid == "title":
+                keep_first("title", element)
+            elif testid == "review-score":
+                keep_first("review_score", element)
+            classes = _classes(element)
+            if "abf093bdfe" in classes.split():
+                found["bed_divs"].append(element)
+            if classes == "abf093bdfe d068504c75":
+                found["policy_divs"].append(element)
+            if element.get("span") == "b30f8eb2d6":
+                found["taxi_divs"].append(element)
+        elif tag == "span":
+            testid = element.get("data-testid")
+            if testid == "price-and-discounted-price":
+                keep_first("price", element)
+            elif testid == "distance":
+                keep_first("distance", element)
+            classes = _classes(element)
+            if "f419a93f12" in classes.split():
+                keep_first("metro", element)
+            if classes == "abf093bdfe e6208ee469 f68ecd98ea":
+                keep_first("sustainability", element)
+            if "a3332d346a" in classes.split():
+                keep_first("location_score", element)
+        elif tag == "a":
+            if element.get("data-testid") == "title-link":
+                keep_first("title_link", element)
+        elif tag == "h4":
+            if _classes(element) == "abf093bdfe e8f7c070a7":
+                keep_first("room_type", element)
+
+    return found
+
+
+if lxml is not None:
+    BOOKING_LXML_SPEC = ExtractionSpec(
+        find_records=etree.XPath('//div[@aria-label="Alojamiento"]'),
+        page_fields=BOOKING_PAGE_FIELDS,
+        card_fields=BOOKING_CARD_FIELDS,
+        collect_nodes=_collect_card_elements
+    )
+
+
+def scrape_accommodations_from_html_lxml(page_html: str, booking_url: str, verbose: bool = False) -> Dict[str, list]:
+    """
+    lxml version of scrape_accommodations_from_page, returning the same columns. The page is parsed
+    by libxml2, url fields are read once per page and every card is walked a single time.
+    """
+    if lxml is None:
+        raise ImportError("The lxml backend needs the lxml package")
+
+    return BOOKING_LXML_SPEC.extract(lxml.html.fromstring(page_html), booking_url, verbose=verbose)
+
+
+def accommodation_data_to_record_batch(accommodation_data_dict: Dict[str, list]) -> pa.RecordBatch:
+    """
+    Converts the output of a Booking scraper into a record batch following BOOKING_ARROW_SCHEMA,
+    with missing values (NaN) as nulls.
+    """
+    arrays = []
+    for field in BOOKING_ARROW_SCHEMA:
+        values = [None if isinstance(value, float) and np.isnan(value) else value for value in accommodation_data_dict[field.name]]
+        if field.type == pa.string():
+            values = [None if value is None else str(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=BOOKING_ARROW_SCHEMA)
+
+
+def available_booking_parser_backends() -> List[str]:
+    return ["bs4"] + (["lxml"] if lxml is not None else [])
+
+
+DEFAULT_BOOKING_PARSER_BACKEND = "lxml" if lxml is not None else "bs4"
@@ -0,0 +1,70 @@
+# work with asynchronicity
+import asyncio
+import aiohttp
+
+# shared rate limits and retries
+from .rate_limit_support import get_text_with_retries
+
+# function typing
+from typing import Dict, List, Optional, Tuple
+
+
+CIVITATIS_PAGE_URL = "https://www.civitatis.com/es/{city_name}/?page={page_number}&fromDate={date_start}&toDate={date_end}"
+
+# markers of a listing page that came back with its activity cards and their availability
+COMPLETE_PAGE_MARKERS = ("o-search-list__item", "m-availability", "data-latitude")
+
+
+def build_civitatis_page_url(city_name: str, page_number: int, date_start: str, date_end: str) -> str:
+    return CIVITATIS_PAGE_URL.format(city_name=city_name, page_number=page_number, date_start=date_start, date_end=date_end)
+
+
+def is_complete_listing_page(page_html: Optional[str]) -> bool:
+    """
+    Cheap check, without parsing, that a listing page holds activity cards with availability and coordinates.
+    Pages answered with a consent wall, a redirect to the home page or a client-side shell fail it.
+    """
+    return bool(page_html) and all(marker in page_html for marker in COMPLETE_PAGE_MARKERS)
+
+
+def http_session_from_driver(driver) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Returns the cookies and headers of the browser session, so plain HTTP requests are answered
+    like the browser's (same consent, language and currency).
+    """
+    cookies = {cookie["name"]: cookie["value"] for cookie in driver.get_cookies()}
+    headers = {
+        "User-Agent": driver.execute_script("return navigator.userAgent"),
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "es-ES,es;q=0.9",
+        "Referer": driver.current_url
+    }
+    return cookies, headers
+
+
+async def fetch_listing_pages_http(pages_urls: List[str], cookies: Dict[str, str], headers: Dict[str, str],
+                                   max_concurrency: int = 10, provider: str = "civitatis",
+                                   timeout: float = 30) -> List[Optional[str]]:
+    """
+    Fetches listing pages concurrently over a single pooled session carrying the browser cookies.
+
+    Returns:
+    -------
+    List[Optional[str]]
+        The html of every url, in order, or None for pages that failed or are not complete
+        (see is_complete_listing_page), to be fetched with the browser instead.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=max_concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, cookies=cookies, headers=headers,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async def fetch_page(page_url):
+            async with semaphore:
+                try:
+                    status, page_html = await get_text_with_retries(session, page_url, provider=provider)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    return None
+            return page_html if status == 200 and is_complete_listing_page(page_html) else None
+
+        return await asyncio.gather(*(fetch_page(page_url) for page_url in pages_urls))
@@ -0,0 +1,152 @@
+# local storage
+import sqlite3
+
+# work with concurrency
+import threading
+
+# work with dates and time
+import time
+import datetime
+
+# work with files
+import os
+
+# normalized querystrings
+from .response_cache_support import normalize_params
+
+# function typing
+from typing import Dict, List, Optional, Tuple
+
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# (max days ahead of today, max age in seconds) pairs, first match wins. None means any horizon.
+DEFAULT_FRESHNESS_RULES = [
+    (14, HOUR),
+    (60, 6 * HOUR),
+    (180, DAY),
+    (None, 7 * DAY)
+]
+
+
+def max_age_for_date(date: str, freshness_rules: List[Tuple[Optional[int], float]] = DEFAULT_FRESHNESS_RULES,
+                     today: Optional[datetime.date] = None) -> Optional[float]:
+    """
+    Seconds a fetched query for the flight `date` (YYYY-MM-DD) stays fresh, or None if the date is already past.
+    """
+    today = today or datetime.date.today()
+    days_ahead = (datetime.date.fromisoformat(date) - today).days
+    if days_ahead < 0:
+        return None
+
+    for max_days_ahead, max_age in freshness_rules:
+        if max_days_ahead is None or days_ahead <= max_days_ahead:
+            return max_age
+    return 0
+
+
+class CrawlLedger:
+    """
+    SQLite record of when every flight query was last fetched successfully, keyed by the normalized querystring.
+    """
+
+    def __init__(self, path: str = "../data/cache/crawl_ledger.sqlite"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS flight_queries (
+                    query_key TEXT PRIMARY KEY,
+                    origin TEXT,
+                    destination TEXT,
+                    date TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+
+    def last_fetched(self, querystrings_list: List[Dict[str, str]]) -> Dict[str, float]:
+        """
+        Returns the last fetch time (epoch seconds) of every querystring that was ever fetched, by query key.
+        """
+        query_keys = list({normalize_params(querystring) for querystring in querystrings_list})
+        fetched_at = {}
+        with self._lock:
+            for chunk_start in range(0, len(query_keys), 500):
+                chunk = query_keys[chunk_start:chunk_start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT query_key, fetched_at FROM flight_queries WHERE query_key IN ({placeholders})", chunk
+                ).fetchall()
+                fetched_at.update(rows)
+        return fetched_at
+
+    def mark_fetched(self, querystrings_list: List[Dict[str, str]], fetched_at: Optional[float] = None) -> None:
+        fetched_at = fetched_at or time.time()
+        rows = [(normalize_params(querystring), querystring.get("originEntityId"), querystring.get("destinationEntityId"),
+                 querystring.get("date"), fetched_at) for querystring in querystrings_list]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO flight_queries (query_key, origin, destination, date, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def plan_flight_crawl(querystrings_list: List[Dict[str, str]], crawl_ledger: CrawlLedger,
+                      freshness_rules: List[Tuple[Optional[int], float]] = DEFAULT_FRESHNESS_RULES,
+                      now: Optional[float] = None) -> List[Dict[str, str]]:
+    """
+    Keeps the querystrings worth requesting: identical querystrings are kept once, past dates are dropped
+    and the rest are kept only if never fetched or older than their horizon's max age.
+
+    Parameters:
+    ----------
+    querystrings_list : list
+        Querystrings as built by build_flight_request_querystring_list_single.
+    crawl_ledger : CrawlLedger
+        Record of when each querystring was last fetched.
+    freshness_rules : list
+        (max days ahead, max age in seconds) pairs, see DEFAULT_FRESHNESS_RULES.
+    now : float, optional
+        Epoch seconds to plan for. Defaults to the current time.
+
+    Returns:
+    -------
+    List[Dict[str, str]]
+        The stale or missing querystrings, in their original order.
+    """
+    now = now or time.time()
+    today = datetime.date.fromtimestamp(now)
+    last_fetched = crawl_ledger.last_fetched(querystrings_list)
+
+    planned_querystrings = []
+    seen_query_keys = set()
+    max_age_by_date = {}
+    for querystring in querystrings_list:
+        query_key = normalize_params(querystring)
+        if query_key in seen_query_keys:
+            continue
+        seen_query_keys.add(query_key)
+
+        date = querystring["date"]
+        if date not in max_age_by_date:
+            max_age_by_date[date] = max_age_for_date(date, freshness_rules, today=today)
+        max_age = max_age_by_date[date]
+
+        if max_age is None:
+            continue
+        if query_key in last_fetched and now - last_fetched[query_key] <= max_age:
+            continue
+
+        planned_querystrings.append(querystring)
+
+    print(f"{len(planned_querystrings)} of {len(querystrings_list)} flight queries are stale or missing")
+    return planned_querystrings
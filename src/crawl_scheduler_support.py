@@ -0,0 +1,109 @@
+# data processing
+import pandas as pd
+
+# work with concurrency
+import threading
+import queue
+import itertools
+
+# work with time
+import time
+
+# function typing
+from typing import Any, Callable, Dict, List, Tuple
+
+
+_STOP = float("inf")
+
+
+def run_task_queue(initial_tasks: List[Dict[str, Any]], run_task: Callable[[Dict[str, Any], Any], Tuple[Any, List[Dict[str, Any]]]],
+                   driver_pool, n_workers: int = 4, max_attempts: int = 2) -> Tuple[List[Tuple[Dict[str, Any], Any]], pd.DataFrame]:
+    """
+    Runs crawl tasks from a shared priority queue with n_workers long-lived worker threads, each one
+    checking a driver out of driver_pool for every task. Workers pull the next task as soon as they are
+    free, so a large city is spread over every worker instead of keeping one busy, and the crawl takes
+    about the total work divided by n_workers.
+
+    Parameters:
+    ----------
+    initial_tasks : list
+        Task dicts. The optional "priority" key orders the queue (lower first, default 0).
+    run_task : callable
+        run_task(task, driver) -> (result, new_tasks). New tasks are queued right away, e.g. the pages
+        discovered while loading the first page of a listing.
+    driver_pool : WebDriverPool
+        Pool the workers check drivers out of.
+    n_workers : int
+        Number of worker threads, and at most the number of drivers in use.
+    max_attempts : int
+        Times a failing task is run before it is given up.
+
+    Returns:
+    -------
+    Tuple[List[Tuple[dict, Any]], pd.DataFrame]
+        The (task, result) of every successful task, in completion order, and a log with one row per
+        attempt: the task fields, the worker, attempt, status, start offset and duration in seconds.
+    """
+    task_queue = queue.PriorityQueue()
+    sequence = itertools.count()
+    results, task_log = [], []
+    lock = threading.Lock()
+    crawl_start = time.perf_counter()
+
+    def put(task: Dict[str, Any], attempt: int = 1) -> None:
+        task_queue.put((task.get("priority", 0), next(sequence), task, attempt))
+
+    def worker(worker_number: int) -> None:
+        while True:
+            priority, _, task, attempt = task_queue.get()
+            if priority == _STOP:
+                task_queue.task_done()
+                return
+
+            task_start = time.perf_counter()
+            status = "done"
+            try:
+                with driver_pool.driver() as driver:
+                    result, new_tasks = run_task(task, driver)
+                for new_task in new_tasks:
+                    put(new_task)
+                with lock:
+                    results.append((task, result))
+            except Exception as e:
+                status = f"failed: {e}".splitlines()[0]
+                if attempt < max_attempts:
+                    put(task, attempt + 1)
+            finally:
+                with lock:
+                    task_log.append({**{key: value for key, value in task.items() if key != "priority"},
+                                     "worker": worker_number, "attempt": attempt, "status": status,
+                                     "started_at": task_start - crawl_start, "seconds": time.perf_counter() - task_start})
+                task_queue.task_done()
+
+    for task in initial_tasks:
+        put(task)
+
+    workers = [threading.Thread(target=worker, args=(worker_number,), daemon=True) for worker_number in range(n_workers)]
+    for worker_thread in workers:
+        worker_thread.start()
+
+    task_queue.join()
+    for _ in workers:
+        task_queue.put((_STOP, next(sequence), None, 0))
+    for worker_thread in workers:
+        worker_thread.join()
+
+    return results, pd.DataFrame(task_log)
+
+
+def summarize_task_log(task_log_df: pd.DataFrame, n_workers: int) -> str:
+    """
+    One line summary of a task log: wall time against the ideal total work / n_workers.
+    """
+    if task_log_df.empty:
+        return "No tasks were run"
+    wall_seconds = (task_log_df["started_at"] + task_log_df["seconds"]).max()
+    work_seconds = task_log_df["seconds"].sum()
+    n_failed = (task_log_df["status"] != "done").sum()
+    return (f"{len(task_log_df)} tasks ({n_failed} failed attempts) in {wall_seconds:.1f} seconds, "
+            f"{work_seconds:.1f} seconds of work over {n_workers} workers (ideal {work_seconds / n_workers:.1f} seconds)")
@@ -0,0 +1,132 @@
+# work with asynchronicity
+import asyncio
+
+# work with processes
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# work with time
+import time
+
+# work with files
+import os
+
+# flights client, rate limits, cache and streaming output
+from .api_client_support import FlightApiClient, FLIGHTS_URL
+from .flight_flattening_support import ITINERARIES_SCHEMA, flatten_itineraries
+from .parquet_stream_support import ParquetPartWriter
+from .rate_limit_support import PROVIDER_LIMITS, configure_provider
+from .response_cache_support import ResponseCache, normalize_params
+
+# function typing
+from typing import Any, Dict, List, Optional
+
+
+def shard_querystrings(querystrings_list: List[Dict[str, str]], n_shards: int) -> List[List[Dict[str, str]]]:
+    """
+    Splits the querystrings into n_shards lists of (almost) the same size. Identical querystrings are kept
+    once and the rest are dealt round-robin, so every shard gets a similar mix of origins, destinations and dates.
+    """
+    unique_querystrings = list({normalize_params(querystring): querystring for querystring in querystrings_list}.values())
+    return [unique_querystrings[shard_number::n_shards] for shard_number in range(n_shards)]
+
+
+async def _crawl_shard_async(shard_number: int, querystrings_list: List[Dict[str, str]], parts_dir: str, rows_per_part: int,
+                             url: str, provider: str, max_concurrency: int, limit_per_host: int,
+                             use_cache: bool) -> Dict[str, Any]:
+    cache = None if use_cache else ResponseCache(":memory:", mode="disabled")
+    fetched_querystrings = []
+    n_failed = 0
+
+    with ParquetPartWriter(parts_dir, ITINERARIES_SCHEMA, rows_per_part=rows_per_part,
+                           prefix=f"{time.strftime('%Y%m%dT%H%M%S')}-shard{shard_number:03d}") as writer:
+        async with FlightApiClient(url=url, max_concurrency=max_concurrency, limit_per_host=limit_per_host,
+                                   provider=provider, cache=cache) as client:
+            async for querystring, itineraries in client.iterate_itineraries_as_completed(querystrings_list):
+                if isinstance(itineraries, Exception):
+                    n_failed += 1
+                    continue
+                fetched_querystrings.append(querystring)
+                if itineraries:
+                    writer.append(flatten_itineraries(itineraries))
+
+    return {"parts": writer.parts, "n_rows": writer.n_rows_written, "fetched": fetched_querystrings, "n_failed": n_failed}
+
+
+def _crawl_shard(shard_number: int, querystrings_list: List[Dict[str, str]], parts_dir: str, rows_per_part: int,
+                 url: str, provider: str, rate: float, capacity: float, max_concurrency: int, limit_per_host: int,
+                 use_cache: bool) -> Dict[str, Any]:
+    """
+    Entry point of a worker process: sets the shard's share of the rate budget and crawls the shard
+    in a fresh event loop with its own pooled client.
+    """
+    start_time = time.perf_counter()
+    configure_provider(provider, rate=rate, capacity=capacity)
+
+    shard_result = asyncio.run(_crawl_shard_async(shard_number, querystrings_list, parts_dir, rows_per_part, url, provider,
+                                                  max_concurrency, limit_per_host, use_cache))
+    shard_result.update({"shard": shard_number, "n_queries": len(querystrings_list), "seconds": time.perf_counter() - start_time})
+    return shard_result
+
+
+def crawl_flights_sharded(querystrings_list: List[Dict[str, str]], parts_dir: str, n_shards: Optional[int] = None,
+                          global_rate: Optional[float] = None, provider: str = "sky_scrapper", url: str = FLIGHTS_URL,
+                          max_concurrency: int = 10, limit_per_host: int = 10, rows_per_part: int = 5000,
+                          use_cache: bool = True) -> List[Dict[str, Any]]:
+    """
+    Crawls the querystrings in n_shards worker processes, each one with its own event loop, pooled
+    FlightApiClient and ParquetPartWriter, so flattening and writing use every core.
+
+    The provider's rate budget is global: every shard gets rate / n_shards requests per second, so all
+    shards together never go over the provider limit. Workers are spawned, not forked, so they do not
+    inherit the parent's event loop, sessions or SQLite connections. The on-disk response cache is shared
+    through SQLite, which supports several processes.
+
+    Parameters:
+    ----------
+    querystrings_list : list
+        Querystrings of every origin, e.g. as built by build_flight_request_querystring_list_single.
+    parts_dir : str
+        Folder where every shard writes its Parquet part files.
+    n_shards : int, optional
+        Number of worker processes. Defaults to the number of cores.
+    global_rate : float, optional
+        Requests per second allowed across all shards. Defaults to the provider rate in PROVIDER_LIMITS.
+    provider : str
+        Name of the rate limiter, see rate_limit_support.
+    url : str
+        Flights endpoint.
+    max_concurrency, limit_per_host : int
+        Requests in flight and pooled connections of each shard's client.
+    rows_per_part : int
+        Itineraries buffered by each shard before a part is written.
+    use_cache : bool
+        Whether shards use the default response cache.
+
+    Returns:
+    -------
+    List[Dict[str, Any]]
+        One summary per shard, ordered by shard, with its "parts", "n_rows", "fetched" querystrings,
+        "n_failed" requests, "n_queries" and "seconds".
+    """
+    n_shards = max(1, min(n_shards or os.cpu_count() or 1, len(querystrings_list) or 1))
+    limits = PROVIDER_LIMITS.get(provider, PROVIDER_LIMITS["default"])
+    global_rate = global_rate or limits["rate"]
+    shard_rate = global_rate / n_shards
+    shard_capacity = max(1, limits["capacity"] * shard_rate / limits["rate"])
+
+    shards = shard_querystrings(querystrings_list, n_shards)
+    os.makedirs(parts_dir, exist_ok=True)
+
+    shard_results = []
+    with ProcessPoolExecutor(max_workers=n_shards, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(_crawl_shard, shard_number, shard, parts_dir, rows_per_part, url, provider, shard_rate,
+                                   shard_capacity, max_concurrency, limit_per_host, use_cache)
+                   for shard_number, shard in enumerate(shards)]
+        for future in as_completed(futures):
+            shard_result = future.result()
+            print(f"Shard {shard_result['shard']}: {shard_result['n_rows']} itineraries from {shard_result['n_queries']} queries, "
+                  f"{shard_result['n_failed']} failed, in {shard_result['seconds']:.1f} seconds")
+            shard_results.append(shard_result)
+
+    return sorted(shard_results, key=lambda shard_result: shard_result["shard"])
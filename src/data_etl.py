@@ -21,7 +21,7 @@ list_of_countries_or_cities = ["spain","bilbao"]
 
 async def create_airports_table():
 
-    countries_airports = des.create_country_airport_code_df(list_of_countries_or_cities)
+    countries_airports = await des.create_country_airport_code_df(list_of_countries_or_cities)
 
     countries_airports[["city","latitude","longitude"]] = await des.get_cities_coordinates(countries_airports["city"].to_list())
 
@@ -1,6 +1,7 @@
 # data processing
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 
 ## Scraping
 # Webdriver automation
@@ -8,11 +9,8 @@ from selenium import webdriver
 from webdriver_manager.chrome import ChromeDriverManager  
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
 # html parsing
-from bs4 import BeautifulSoup
-# make synchronous request
-import requests
+from bs4 import BeautifulSoup, SoupStrainer
 
 # math operations
 import math
@@ -27,6 +25,8 @@ import aiohttp
 
 # work with concurrency
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+import itertools
 
 import json
 
@@ -34,7 +34,7 @@ import json
 import dotenv
 import os
 dotenv.load_dotenv()
-AIR_SCRAPPER_API_KEY = os.getenv("AIR_SCRAPPER_KEY")
+AIR_SCRAPPER_API_KEY = os.getenv("AIR_SCRAPPER_KEY", "")
 GOOGLE_API = os.getenv("GOOGLE_API_KEY")
 BASE_URL_FORECAST = os.getenv("BASE_URL_FORECAST")
 BASE_URL_ARCHIVE = os.getenv("BASE_URL_ARCHIVE")
@@ -46,31 +46,91 @@ sys.path.append("..")
 # function typing
 from typing import List, Optional
 
-# regular expressions
-import re
+# pooled API clients
+from .api_client_support import FlightApiClient, FLIGHTS_URL
+
+# shared rate limits and retries
+from .rate_limit_support import get_json_with_retries
+
+# precomputed city/airport lookups
+from .airport_index_support import AirportIndex, normalize_city_name
+
+# streaming parquet output
+from .parquet_stream_support import ParquetPartWriter, consolidate_parquet_parts, list_parquet_parts
+
+# columnar itinerary flattening
+from .flight_flattening_support import ITINERARIES_SCHEMA, flatten_itineraries
+
+# incremental crawl planning
+from .crawl_planner_support import CrawlLedger, DEFAULT_FRESHNESS_RULES, plan_flight_crawl
+
+# persistent response cache
+from .response_cache_support import ResponseCache, cached_get_json, get_default_cache
+
+# multi-process crawl sharding
+from .crawl_sharding_support import crawl_flights_sharded
+
+# pooled selenium drivers
+from .webdriver_pool_support import WebDriverPool
+
+# event-driven infinite scroll
+from .scroll_loader_support import load_all_results
+
+# raw html capture archive
+from .html_archive_support import HtmlArchive, map_archived_pages
+
+# browser + plain http civitatis fetching
+from .civitatis_hybrid_support import build_civitatis_page_url, fetch_listing_pages_http, http_session_from_driver
+
+# shared queue of crawl tasks
+from .crawl_scheduler_support import run_task_queue, summarize_task_log
+
+# persistent geocoding cache
+from .geocoding_cache_support import Geocoder
+
+# batched multi-location weather requests
+from .weather_client_support import OpenMeteoClient
+
+# fast booking card parsing
+from .booking_parser_support import (DEFAULT_BOOKING_PARSER_BACKEND, BOOKING_ARROW_SCHEMA, BOOKING_PAGE_FIELDS, scrape_accommodations_from_html_lxml,
+                                     accommodation_data_to_record_batch)
+
+# declarative extraction of page records
+from .extraction_spec_support import ExtractionSpec, RecordIndex, url_regex_field
 
 
 
 ### Cities 
-def create_country_airport_code_df(list_of_countries):
+async def create_country_airport_code_df(list_of_countries, cache=None):
     
     list_of_countries_airports = []
 
-    for country in list_of_countries:
-
-        url = "https://sky-scrapper.p.rapidapi.com/api/v1/flights/searchAirport"
-
-        querystring = {"query": country,"locale":"en-US"}
+    url = "https://sky-scrapper.p.rapidapi.com/api/v1/flights/searchAirport"
 
-        headers = {
-            "x-rapidapi-key": AIR_SCRAPPER_API_KEY,
-            "x-rapidapi-host": "sky-scrapper.p.rapidapi.com"
-        }
+    headers = {
+        "x-rapidapi-key": AIR_SCRAPPER_API_KEY,
+        "x-rapidapi-host": "sky-scrapper.p.rapidapi.com"
+    }
 
-        response = requests.get(url, headers=headers, params=querystring)
+    cache = cache or get_default_cache()
 
-        response_data = response.json()["data"]
-        list_of_countries_airports.extend(get_country_airport_codes(response_data,country))
+    async with aiohttp.ClientSession() as session:
+        for country in list_of_countries:
+
+            querystring = {"query": country,"locale":"en-US"}
+
+            # airports barely change, reuse the recorded response if there is one
+            response_json = cache.get(url, querystring)
+            if response_json is None:
+                status, response_json = await get_json_with_retries(session, url, provider="sky_scrapper", params=querystring, headers=headers)
+                if status != 200 or not isinstance(response_json, dict) or "data" not in response_json:
+                    # throttled, quota or error bodies are not recorded, so the next run asks again
+                    print(f"Error {status} searching the airports of {country}")
+                    continue
+                cache.set(url, querystring, response_json)
+
+            response_data = response_json["data"]
+            list_of_countries_airports.extend(get_country_airport_codes(response_data,country))
     
     countries_airports = pd.DataFrame(list_of_countries_airports)
     
@@ -118,23 +178,21 @@ async def get_lat_lon(city, country="Spain"):
         "limit": 1
     }
     async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params) as response:
-            if response.status == 429:
-                print(f"Rate limit hit for {city}. Retrying...")
-                await asyncio.sleep(1)  # Wait for a second before retrying
-                return await get_lat_lon(city)  # Retry the same request
-            elif response.status == 200:
-                data = await response.json()
-                if data:
-                    lat = data[0]["lat"]
-                    lon = data[0]["lon"]
-                    return city, lat, lon
-            return city, None, None
-
-async def get_cities_coordinates(cities_list): 
-
-    tasks = [get_lat_lon(city) for city in cities_list]
-    results = await asyncio.gather(*tasks)
+        # throttling is retried with backoff by the shared nominatim rate limiter
+        status, data = await get_json_with_retries(session, url, provider="nominatim", params=params)
+
+    if status == 200 and data:
+        lat = data[0]["lat"]
+        lon = data[0]["lon"]
+        return city, lat, lon
+    if status != 200:
+        print(f"Request failed with status {status} for {city}")
+    return city, None, None
+
+async def get_cities_coordinates(cities_list, geocoding_cache=None):
+    # cities geocoded in earlier runs are answered by the local cache, see geocoding_cache_support
+    async with Geocoder(geocoding_cache) as geocoder:
+        results = await geocoder.forward_many(cities_list)
 
     return results
 
@@ -157,7 +215,10 @@ async def get_flights(
     origin_airport_code: bool = True,
     destination_airport_code: bool = True,
     sort_by: str = "price_high",
-    currency: str = "EUR"
+    currency: str = "EUR",
+    max_concurrency: int = 10,
+    limit_per_host: int = 10,
+    cache: Optional[ResponseCache] = None
 ) -> pd.DataFrame:
     """
     Asynchronously retrieves flight itineraries based on search criteria,
@@ -178,6 +239,9 @@ async def get_flights(
     - destination_airport_code (bool): Whether to include the destination airport code in the query.
     - sort_by (str): Criterion to sort the results by (e.g., 'price_high').
     - currency (str): Currency code for the results (e.g., 'EUR').
+    - max_concurrency (int): Maximum number of API requests in flight at the same time.
+    - limit_per_host (int): Maximum number of pooled connections to the API host.
+    - cache (ResponseCache, optional): Cache of API responses. Defaults to the shared on-disk cache.
 
     Returns:
     - pd.DataFrame: DataFrame containing the flattened itinerary data, saved to a Parquet file.
@@ -200,7 +264,8 @@ async def get_flights(
         currency=currency
     )
     
-    itineraries_dict_list = await request_flight_itineraries_async_multiple(querystrings_list)
+    async with FlightApiClient(max_concurrency=max_concurrency, limit_per_host=limit_per_host, cache=cache) as client:
+        itineraries_dict_list = await client.request_itineraries_multiple(querystrings_list)
     
     itineraries_dict_list_flat = [itinerary_dict for dict_list in itineraries_dict_list if dict_list for itinerary_dict in dict_list]
     itineraries_df = create_itineraries_dataframe(itineraries_dict_list_flat)
@@ -211,46 +276,211 @@ async def get_flights(
 
 
 
-# for double way - not used at the moment
-def build_flight_request_querystring_double(countries_airports_df,origin_city,destination_cities_list, date_query_start, n_steps=52, step_length=7, days_window=2, n_adults= 1, n_children=0, n_infants=0, origin_airport_code=None, 
-                                   destination_airport_code=None, cabin_class="economy",sort_by="best",currency="EUR"):
-    """This function generates a list of querystrings from the input params, that is used to later generate a list of I/O taks to a flights API.
-    It generates querystrings for go and return flights both on the same day, iterating from the date_query_start to the end of the days window.
-    This allows to map all flights from the selected origin to the possible destinations, for the time window selected (defaulted to 1 year).
+async def get_flights_streaming(
+    countries_airports: Dict[str, str],
+    origin_city: str,
+    destination_cities: List[str],
+    start_date: str = "2024-11-01",
+    n_steps: int = 3,
+    step_length: int = 7,
+    days_window: int = 2,
+    n_adults: int = 1,
+    n_children: int = 0,
+    n_infants: int = 0,
+    origin_airport_code: bool = True,
+    destination_airport_code: bool = True,
+    sort_by: str = "price_high",
+    currency: str = "EUR",
+    max_concurrency: int = 10,
+    limit_per_host: int = 10,
+    cache: Optional[ResponseCache] = None,
+    output_path: str = "../data/flights/itineraries.parquet",
+    parts_dir: str = "../data/flights/itineraries_parts/",
+    rows_per_part: int = 5000,
+    consolidate: bool = True,
+    crawl_ledger: Optional[CrawlLedger] = None,
+    freshness_rules: list = DEFAULT_FRESHNESS_RULES
+) -> str:
+    """
+    Streaming version of get_flights. Each response is flattened as soon as it arrives and buffered
+    rows are written as Parquet part files every `rows_per_part` rows, so memory stays flat however
+    large the crawl is and every written part survives a crash. Failed requests are reported and skipped.
 
-    Args:
-        countries_airports_df (_type_): _description_
-        origin_city (_type_): _description_
-        destination_cities_list (_type_): _description_
-        date_query_start (_type_): _description_
-        date_query_end (_type_): _description_
-        n_adults (int, optional): _description_. Defaults to 1.
-        n_children (int, optional): _description_. Defaults to 0.
-        n_infants (int, optional): _description_. Defaults to 0.
-        origin_airport_code (_type_, optional): _description_. Defaults to None.
-        destination_airport_code (_type_, optional): _description_. Defaults to None.
-        cabin_class (str, optional): _description_. Defaults to "economy".
-        sort_by (str, optional): _description_. Defaults to "best".
-        currency (str, optional): _description_. Defaults to "EUR".
+    Parameters:
+    - countries_airports ... currency, max_concurrency, limit_per_host, cache: Same as get_flights.
+    - output_path (str): Parquet file the parts are consolidated into.
+    - parts_dir (str): Folder where the part files are written while crawling.
+    - rows_per_part (int): Itineraries buffered in memory before a part is written.
+    - consolidate (bool): Whether to merge the parts into output_path (and remove them) at the end.
+    - crawl_ledger (CrawlLedger, optional): If given, only queries never fetched or older than their
+      freshness rule are requested (see crawl_planner_support), and successful ones are recorded once their
+      rows are written to a part. As each run then fetches only a delta, every part in parts_dir (those left
+      by an interrupted run too) is added to an existing output_path instead of replacing it (or they
+      accumulate in parts_dir with consolidate=False).
+    - freshness_rules (list): (max days ahead, max age in seconds) pairs used with crawl_ledger.
+
+    Returns:
+    - str: output_path if consolidated, otherwise parts_dir, readable with pd.read_parquet.
     """
-    date_query_start_datetime = datetime.datetime.strptime(date_query_start, "%Y-%m-%d")
+    querystrings_list = build_flight_request_querystring_list_single(
+        countries_airports,
+        origin_city,
+        destination_cities,
+        start_date,
+        n_steps=n_steps,
+        step_length=step_length,
+        days_window=days_window,
+        n_adults=n_adults,
+        n_children=n_children,
+        n_infants=n_infants,
+        origin_airport_code=origin_airport_code,
+        destination_airport_code=destination_airport_code,
+        sort_by=sort_by,
+        currency=currency
+    )
 
-    querystring_list = []
-    for destination_city in destination_cities_list:
-        for step in range(n_steps):
-            date_departure = (date_query_start_datetime + datetime.timedelta(days=step*step_length)).strftime("%Y-%m-%d")
-            date_return = (date_query_start_datetime + datetime.timedelta(days=step*step_length+days_window)).strftime("%Y-%m-%d")
-            
-            querystring_double = build_flight_request_querystring(countries_airports_df,origin_city=destination_city,destination_city=origin_city, date_departure=date_departure,date_return=date_return, n_adults= n_adults, n_children=n_children, n_infants=n_infants, origin_airport_code=origin_airport_code, 
-                                   destination_airport_code=destination_airport_code, cabin_class=cabin_class,sort_by=sort_by,currency=currency)
-            
-            querystring_list.append([querystring_double])
-    
-    return querystring_list
+    if crawl_ledger is not None:
+        querystrings_list = plan_flight_crawl(querystrings_list, crawl_ledger, freshness_rules=freshness_rules)
 
+    # queries are recorded in the ledger only once their rows are in a written part, so those of an
+    # interrupted run are either on disk or fetched again
+    unwritten_querystrings = []
 
-# for single way - used at the moment
-def build_flight_request_querystring_list_single(countries_airports_df,origin_city,destination_cities_list, date_query_start, n_steps=52, step_length=7, days_window=2, n_adults= 1, n_children=0, n_infants=0, origin_airport_code=None, 
+    def mark_written():
+        if crawl_ledger is not None and unwritten_querystrings:
+            crawl_ledger.mark_fetched(unwritten_querystrings)
+        unwritten_querystrings.clear()
+
+    n_failed = 0
+    writer = ParquetPartWriter(parts_dir, ITINERARIES_SCHEMA, rows_per_part=rows_per_part)
+    try:
+        async with FlightApiClient(max_concurrency=max_concurrency, limit_per_host=limit_per_host, cache=cache) as client:
+            async for querystring, itineraries in client.iterate_itineraries_as_completed(querystrings_list):
+                if isinstance(itineraries, Exception):
+                    print(f"Skipping {querystring} due to {itineraries}")
+                    n_failed += 1
+                    continue
+                n_parts = len(writer.parts)
+                if itineraries:
+                    writer.append(flatten_itineraries(itineraries))
+                unwritten_querystrings.append(querystring)
+                if len(writer.parts) > n_parts:
+                    mark_written()
+    finally:
+        # keep what was already fetched even if the crawl failed
+        writer.close()
+        mark_written()
+
+    print(f"{writer.n_rows_written} itineraries written in {len(writer.parts)} parts, {n_failed} requests failed")
+
+    if not consolidate:
+        return parts_dir
+
+    # with a ledger this run only holds the delta: the queries still fresh are kept from the previous output,
+    # and the parts left in parts_dir by an interrupted run (already recorded as fetched) are added too
+    parts = list_parquet_parts(parts_dir) if crawl_ledger is not None else writer.parts
+    consolidate_parquet_parts(parts, output_path, ITINERARIES_SCHEMA, append=crawl_ledger is not None)
+    return output_path
+
+
+async def get_flights_multi_origin(
+    countries_airports: Dict[str, str],
+    origin_cities: List[str],
+    destination_cities: List[str],
+    start_date: str = "2024-11-01",
+    n_steps: int = 3,
+    step_length: int = 7,
+    days_window: int = 2,
+    n_adults: int = 1,
+    n_children: int = 0,
+    n_infants: int = 0,
+    origin_airport_code: bool = True,
+    destination_airport_code: bool = True,
+    sort_by: str = "price_high",
+    currency: str = "EUR",
+    n_shards: Optional[int] = None,
+    global_rate: Optional[float] = None,
+    max_concurrency: int = 10,
+    limit_per_host: int = 10,
+    url: str = FLIGHTS_URL,
+    provider: str = "sky_scrapper",
+    use_cache: bool = True,
+    output_path: str = "../data/flights/itineraries.parquet",
+    parts_dir: str = "../data/flights/itineraries_parts/",
+    rows_per_part: int = 5000,
+    consolidate: bool = True,
+    crawl_ledger: Optional[CrawlLedger] = None,
+    freshness_rules: list = DEFAULT_FRESHNESS_RULES
+) -> str:
+    """
+    Multi-origin version of get_flights_streaming. The querystrings of every origin are combined into a
+    single plan, split into shards and crawled by one worker process per shard (see crawl_sharding_support),
+    all sharing the provider's global rate budget. The parts written by every shard are merged into one
+    itineraries dataset.
+
+    Parameters:
+    - countries_airports ... currency: Same as get_flights, with origin_cities instead of origin_city.
+      Each origin is paired with every destination but itself, compared as the airport index does (case and
+      surrounding spaces ignored).
+    - n_shards (int, optional): Number of worker processes. Defaults to the number of cores.
+    - global_rate (float, optional): Requests per second across all shards. Defaults to the provider limit.
+    - max_concurrency, limit_per_host (int): Requests in flight and pooled connections of each shard.
+    - url (str), provider (str): Flights endpoint and name of its rate limiter.
+    - use_cache (bool): Whether shards use the default response cache.
+    - output_path, parts_dir, rows_per_part, consolidate, crawl_ledger, freshness_rules: Same as get_flights_streaming.
+
+    Returns:
+    - str: output_path if consolidated, otherwise parts_dir, readable with pd.read_parquet.
+    """
+    airport_index = countries_airports if isinstance(countries_airports, AirportIndex) else AirportIndex.from_dataframe(countries_airports)
+
+    querystrings_list = []
+    for origin_city in origin_cities:
+        querystrings_list.extend(build_flight_request_querystring_list_single(
+            airport_index,
+            origin_city,
+            [destination_city for destination_city in destination_cities
+             if normalize_city_name(destination_city) != normalize_city_name(origin_city)],
+            start_date,
+            n_steps=n_steps,
+            step_length=step_length,
+            days_window=days_window,
+            n_adults=n_adults,
+            n_children=n_children,
+            n_infants=n_infants,
+            origin_airport_code=origin_airport_code,
+            destination_airport_code=destination_airport_code,
+            sort_by=sort_by,
+            currency=currency
+        ))
+
+    if crawl_ledger is not None:
+        querystrings_list = plan_flight_crawl(querystrings_list, crawl_ledger, freshness_rules=freshness_rules)
+
+    # worker processes are waited for in a thread, so the event loop of the caller keeps running
+    shard_results = await asyncio.to_thread(crawl_flights_sharded, querystrings_list, parts_dir, n_shards=n_shards,
+                                            global_rate=global_rate, provider=provider, url=url,
+                                            max_concurrency=max_concurrency, limit_per_host=limit_per_host,
+                                            rows_per_part=rows_per_part, use_cache=use_cache)
+
+    parts = [part for shard_result in shard_results for part in shard_result["parts"]]
+    if crawl_ledger is not None:
+        crawl_ledger.mark_fetched([querystring for shard_result in shard_results for querystring in shard_result["fetched"]])
+
+    n_rows = sum(shard_result["n_rows"] for shard_result in shard_results)
+    n_failed = sum(shard_result["n_failed"] for shard_result in shard_results)
+    print(f"{n_rows} itineraries written in {len(parts)} parts by {len(shard_results)} shards, {n_failed} requests failed")
+
+    if not consolidate:
+        return parts_dir
+
+    # with a ledger this run only holds the delta, the queries still fresh are kept from the previous output
+    consolidate_parquet_parts(parts, output_path, ITINERARIES_SCHEMA, append=crawl_ledger is not None)
+    return output_path
+
+
+# for double way - not used at the moment
+def build_flight_request_querystring_double(countries_airports_df,origin_city,destination_cities_list, date_query_start, n_steps=52, step_length=7, days_window=2, n_adults= 1, n_children=0, n_infants=0, origin_airport_code=None, 
                                    destination_airport_code=None, cabin_class="economy",sort_by="best",currency="EUR"):
     """This function generates a list of querystrings from the input params, that is used to later generate a list of I/O taks to a flights API.
     It generates querystrings for go and return flights both on the same day, iterating from the date_query_start to the end of the days window.
@@ -278,14 +508,11 @@ def build_flight_request_querystring_list_single(countries_airports_df,origin_ci
         for step in range(n_steps):
             date_departure = (date_query_start_datetime + datetime.timedelta(days=step*step_length)).strftime("%Y-%m-%d")
             date_return = (date_query_start_datetime + datetime.timedelta(days=step*step_length+days_window)).strftime("%Y-%m-%d")
-
-            querystring_departure = build_flight_request_querystring(countries_airports_df,origin_city=origin_city,destination_city=destination_city, date_departure=date_departure, n_adults= n_adults, n_children=n_children, n_infants=n_infants, origin_airport_code=origin_airport_code, 
-                                   destination_airport_code=destination_airport_code, cabin_class=cabin_class,sort_by=sort_by,currency=currency)
             
-            querystring_return = build_flight_request_querystring(countries_airports_df,origin_city=destination_city,destination_city=origin_city, date_departure=date_return, n_adults= n_adults, n_children=n_children, n_infants=n_infants, origin_airport_code=origin_airport_code, 
+            querystring_double = build_flight_request_querystring(countries_airports_df,origin_city=destination_city,destination_city=origin_city, date_departure=date_departure,date_return=date_return, n_adults= n_adults, n_children=n_children, n_infants=n_infants, origin_airport_code=origin_airport_code, 
                                    destination_airport_code=destination_airport_code, cabin_class=cabin_class,sort_by=sort_by,currency=currency)
             
-            querystring_list.extend([querystring_departure,querystring_return])
+            querystring_list.append([querystring_double])
     
     return querystring_list
 
@@ -358,6 +585,7 @@ def build_flight_request_querystring(countries_airports_df,origin_city,destinati
     return querystring
 
 
+# for single way - used at the moment
 def build_flight_request_querystring_list_single(countries_airports_df,origin_city,destination_cities_list, date_query_start, n_steps=52, step_length=7, days_window=2, n_adults= 1, n_children=0, n_infants=0, origin_airport_code=None, 
                                    destination_airport_code=None, cabin_class="economy",sort_by="best",currency="EUR"):
     """This function generates a list of querystrings from the input params, that is used to later generate a list of I/O taks to a flights API.
@@ -365,7 +593,7 @@ def build_flight_request_querystring_list_single(countries_airports_df,origin_ci
     This allows to map all flights from the selected origin to the possible destinations, for the time window selected (defaulted to 1 year).
 
     Args:
-        countries_airports_df (_type_): _description_
+        countries_airports_df (pd.DataFrame or AirportIndex): Airports table, or an AirportIndex already built from it.
         origin_city (_type_): _description_
         destination_cities_list (_type_): _description_
         date_query_start (_type_): _description_
@@ -379,23 +607,12 @@ def build_flight_request_querystring_list_single(countries_airports_df,origin_ci
         sort_by (str, optional): _description_. Defaults to "best".
         currency (str, optional): _description_. Defaults to "EUR".
     """
-    date_query_start_datetime = datetime.datetime.strptime(date_query_start, "%Y-%m-%d")
+    airport_index = countries_airports_df if isinstance(countries_airports_df, AirportIndex) else AirportIndex.from_dataframe(countries_airports_df)
 
-    querystring_list = []
-    for destination_city in destination_cities_list:
-        for step in range(n_steps):
-            date_departure = (date_query_start_datetime + datetime.timedelta(days=step*step_length)).strftime("%Y-%m-%d")
-            date_return = (date_query_start_datetime + datetime.timedelta(days=step*step_length+days_window)).strftime("%Y-%m-%d")
-
-            querystring_departure = build_flight_request_querystring(countries_airports_df,origin_city=origin_city,destination_city=destination_city, date_departure=date_departure, n_adults= n_adults, n_children=n_children, n_infants=n_infants, origin_airport_code=origin_airport_code, 
-                                   destination_airport_code=destination_airport_code, cabin_class=cabin_class,sort_by=sort_by,currency=currency)
-            
-            querystring_return = build_flight_request_querystring(countries_airports_df,origin_city=destination_city,destination_city=origin_city, date_departure=date_return, n_adults= n_adults, n_children=n_children, n_infants=n_infants, origin_airport_code=origin_airport_code, 
-                                   destination_airport_code=destination_airport_code, cabin_class=cabin_class,sort_by=sort_by,currency=currency)
-            
-            querystring_list.extend([querystring_departure,querystring_return])
-    
-    return querystring_list
+    return airport_index.build_querystring_list_single(origin_city, destination_cities_list, date_query_start, n_steps=n_steps, step_length=step_length,
+                                   days_window=days_window, n_adults=n_adults, n_children=n_children, n_infants=n_infants,
+                                   origin_airport_code=origin_airport_code, destination_airport_code=destination_airport_code,
+                                   cabin_class=cabin_class, sort_by=sort_by, currency=currency)
 
 
 def build_flight_request_querystring(countries_airports_df,origin_city,destination_city, date_departure, n_adults= 1, n_children=0, n_infants=0, origin_airport_code=None, 
@@ -464,9 +681,7 @@ def build_flight_request_querystring(countries_airports_df,origin_city,destinati
     return querystring
 
 
-async def request_flight_itineraries_async(querystring):
-    
-    url = "https://sky-scrapper.p.rapidapi.com/api/v2/flights/searchFlightsComplete"
+async def request_flight_itineraries_async(querystring, url=FLIGHTS_URL, provider="sky_scrapper"):
 
     headers = {
         "x-rapidapi-key": AIR_SCRAPPER_API_KEY,
@@ -474,29 +689,26 @@ async def request_flight_itineraries_async(querystring):
     }
 
     async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers, params=querystring) as response:
-            if response.status == 200:
-                try:
-                    itineraries = await response.json()
-                    itineraries = itineraries["data"]["itineraries"]
-                except KeyError as e:
-                    print(f"KeyError with querystring {querystring}: {e}")
-                    return []  # returning an empty list for consistency
-                except TypeError as e:
-                    print(f"TypeError with querystring {querystring}: {e}")
-                    return []
-                except Exception as e:
-                    print(f"Unexpected error with querystring {querystring}: {e}")
-                    return []
-            else:
-                print(f"Request failed with status {response.status} for {querystring}")
-                raise ValueError(f"HTTP Error: {response.status}")
+        status, itineraries = await get_json_with_retries(session, url, provider=provider, params=querystring, headers=headers)
+
+    if status != 200:
+        print(f"Request failed with status {status} for {querystring}")
+        raise ValueError(f"HTTP Error: {status}")
+
+    try:
+        itineraries = itineraries["data"]["itineraries"]
+    except KeyError as e:
+        print(f"KeyError with querystring {querystring}: {e}")
+        return []  # returning an empty list for consistency
+    except TypeError as e:
+        print(f"TypeError with querystring {querystring}: {e}")
+        return []
 
     return itineraries
 
 
-async def request_flight_itineraries_async_multiple(querystrings_list):
-    request_itineraries_tasks = [request_flight_itineraries_async(querystring) for querystring in querystrings_list]
+async def request_flight_itineraries_async_multiple(querystrings_list, url=FLIGHTS_URL, provider="sky_scrapper"):
+    request_itineraries_tasks = [request_flight_itineraries_async(querystring, url=url, provider=provider) for querystring in querystrings_list]
 
     itineraries_dict_list = await asyncio.gather(*request_itineraries_tasks)
 
@@ -507,12 +719,8 @@ async def request_flight_itineraries_async_multiple(querystrings_list):
 
 def create_itineraries_dataframe(itineraries_dict_list):
 
-    extracted_itinerary_info_list = list()
-
-    for itinerary in itineraries_dict_list:
-        extracted_itinerary_info_list.append(extract_flight_info(itinerary))
-        
-    return pd.DataFrame(extracted_itinerary_info_list)
+    # flattened column by column, see flight_flattening_support. extract_flight_info is the per itinerary equivalent
+    return flatten_itineraries(itineraries_dict_list).to_pandas()
 
 
 
@@ -557,46 +765,57 @@ def extract_flight_info(flight_dict):
 
 
 ### ACCOMMODATIONS - Booking - Scraping
-def scrape_accommodations_from_page(page_soup, booking_url, verbose=False):
-    accommodation_scraper_dict = {
-        "query_date": lambda _: datetime.datetime.now(),
-        "city": lambda _: re.findall(r"ss=([a-z]+)&", booking_url)[0],
-        "checkin": lambda _: re.findall(r"checkin=(\d{4}-\d{2}-\d{2})", booking_url)[0],
-        "checkout": lambda _: re.findall(r"checkout=(\d{4}-\d{2}-\d{2})", booking_url)[0],
-        "n_adults_search": lambda _: re.findall(r"group_adults=(\d+)", booking_url)[0],
-        "n_children_search":lambda _: re.findall(r"group_children=(\d+)", booking_url)[0],
-        "n_rooms_search": lambda _: re.findall(r"no_rooms=(\d+)", booking_url)[0],
-        "name": lambda card: card.find("div",{"data-testid":"title"}).text,
-        "url": lambda card: card.find("a",{"data-testid":"title-link"})["href"],
-        "price_currency": lambda card: card.find("span",{"data-testid":"price-and-discounted-price"}).text.split()[0],
-        "total_price_amount": lambda card: card.find("span",{"data-testid":"price-and-discounted-price"}).text.split()[1].replace(".","").replace(",","."),
-        "distance_city_center_km": lambda card: card.find("span",{"data-testid":"distance"}).text.split()[1].replace(".","").replace(",","."),
-        "score": lambda card: card.find("div",{"data-testid": "review-score"}).find_all("div",recursive=False)[0].find("div").next_sibling.text.strip().replace(",","."),
-        "n_comments": lambda card: card.find("div",{"data-testid": "review-score"}).find_all("div",recursive=False)[1].find("div").next_sibling.text.strip().split()[0].replace(".",""),
-        "close_to_metro": lambda card: True if card.find("span",{"class":"f419a93f12"}) else False,
-        "sustainability_cert": lambda card: True if card.find("span",{"class":"abf093bdfe e6208ee469 f68ecd98ea"}) else False,
-        "room_type": lambda card: card.find("h4",{"class":"abf093bdfe e8f7c070a7"}).text,
-        "double_bed": lambda card: True if any(["doble" in element.text for element in card.find_all("div",{"class":"abf093bdfe"})]) else False,
-        "single_bed": lambda card: True if any(["individual" in element.text for element in card.find_all("div",{"class":"abf093bdfe"})]) else False,
-        "free_cancellation": lambda card: True if any([element.text == "Cancelación gratis" for element in card.find_all("div",{"class":"abf093bdfe d068504c75"})]) else False,
-        "breakfast_included": lambda card: True if any([element.text == "Cancelación gratis" for element in card.find_all("div",{"class":"abf093bdfe d068504c75"})]) else False,
-        "pay_at_hotel": lambda card: True if any(['Sin pago por adelantado' in element.text for element in card.find_all("div",{"class":"abf093bdfe d068504c75"})]) else False,
-        "location_score": lambda card: card.find("span",{"class":"a3332d346a"}).text.split()[1].replace(",","."),
-        "free_taxi": lambda card: True if any(["taxi gratis" in element.text.lower() for element in card.find_all("div",{"span":"b30f8eb2d6"})]) else False
+# selectors compiled once, read by BOOKING_SOUP_SPEC
+BOOKING_SOUP_SELECTORS = {
+    "card": SoupStrainer("div", {"aria-label": "Alojamiento"}),
+    "title": SoupStrainer("div", {"data-testid": "title"}),
+    "title_link": SoupStrainer("a", {"data-testid": "title-link"}),
+    "price": SoupStrainer("span", {"data-testid": "price-and-discounted-price"}),
+    "distance": SoupStrainer("span", {"data-testid": "distance"}),
+    "review_score": SoupStrainer("div", {"data-testid": "review-score"}),
+    "metro": SoupStrainer("span", {"class": "f419a93f12"}),
+    "sustainability": SoupStrainer("span", {"class": "abf093bdfe e6208ee469 f68ecd98ea"}),
+    "room_type": SoupStrainer("h4", {"class": "abf093bdfe e8f7c070a7"}),
+    "bed_divs": SoupStrainer("div", {"class": "abf093bdfe"}),
+    "policy_divs": SoupStrainer("div", {"class": "abf093bdfe d068504c75"}),
+    "location_score": SoupStrainer("span", {"class": "a3332d346a"}),
+    "taxi_divs": SoupStrainer("div", {"span": "b30f8eb2d6"})
+}
+
+BOOKING_SOUP_SPEC = ExtractionSpec(
+    find_records=lambda page_soup: page_soup.find_all(BOOKING_SOUP_SELECTORS["card"]),
+    page_fields=BOOKING_PAGE_FIELDS,
+    card_nodes={
+        **{key: (lambda selector: lambda nodes: nodes["card"].find(selector))(selector)
+           for key, selector in BOOKING_SOUP_SELECTORS.items() if key != "card" and not key.endswith("_divs")},
+        **{key: (lambda selector: lambda nodes: nodes["card"].find_all(selector))(selector)
+           for key, selector in BOOKING_SOUP_SELECTORS.items() if key.endswith("_divs")},
+        "review_score_divs": lambda nodes: nodes["review_score"].find_all("div", recursive=False)
+    },
+    card_fields={
+        "name": lambda nodes: nodes["title"].text,
+        "url": lambda nodes: nodes["title_link"]["href"],
+        "price_currency": lambda nodes: nodes["price"].text.split()[0],
+        "total_price_amount": lambda nodes: nodes["price"].text.split()[1].replace(".","").replace(",","."),
+        "distance_city_center_km": lambda nodes: nodes["distance"].text.split()[1].replace(".","").replace(",","."),
+        "score": lambda nodes: nodes["review_score_divs"][0].find("div").next_sibling.text.strip().replace(",","."),
+        "n_comments": lambda nodes: nodes["review_score_divs"][1].find("div").next_sibling.text.strip().split()[0].replace(".",""),
+        "close_to_metro": lambda nodes: True if nodes["metro"] else False,
+        "sustainability_cert": lambda nodes: True if nodes["sustainability"] else False,
+        "room_type": lambda nodes: nodes["room_type"].text,
+        "double_bed": lambda nodes: any("doble" in element.text for element in nodes["bed_divs"]),
+        "single_bed": lambda nodes: any("individual" in element.text for element in nodes["bed_divs"]),
+        "free_cancellation": lambda nodes: any(element.text == "Cancelación gratis" for element in nodes["policy_divs"]),
+        "breakfast_included": lambda nodes: any(element.text == "Cancelación gratis" for element in nodes["policy_divs"]),
+        "pay_at_hotel": lambda nodes: any('Sin pago por adelantado' in element.text for element in nodes["policy_divs"]),
+        "location_score": lambda nodes: nodes["location_score"].text.split()[1].replace(",","."),
+        "free_taxi": lambda nodes: any("taxi gratis" in element.text.lower() for element in nodes["taxi_divs"])
     }
+)
 
-    accommodation_data_dict = {key: [] for key in accommodation_scraper_dict}
-
-    for accommodation_card in page_soup.findAll("div", {"aria-label":"Alojamiento"}):
-            for key, accommodation_scraper_function in accommodation_scraper_dict.items():
-                try:
-                    accommodation_data_dict[key].append(accommodation_scraper_function(accommodation_card))
-                except Exception as e:
-                    if verbose == True:
-                        print(f"Error filling {key} due to {e}")
-                    accommodation_data_dict[key].append(np.nan)
 
-    return accommodation_data_dict
+def scrape_accommodations_from_page(page_soup, booking_url, verbose=False):
+    return BOOKING_SOUP_SPEC.extract(page_soup, booking_url, verbose=verbose)
 
 
 # dynamic html loading functions
@@ -747,17 +966,54 @@ def build_booking_url_full(destination: str, checkin: str, checkout: str, adults
     
     return url
 
-def accommodations_booking_selenium_fetch_all_html_contents_concurrent(booking_url_list,max_threads=5,scroll_period=0.2):
-    # Determine optimal max_workers
-    with ThreadPoolExecutor(max_workers=max_threads) as executor:
-        futures = [executor.submit(fetch_booking_html_optimized, booking_url,scroll_period) for booking_url in booking_url_list]
+def accommodations_booking_selenium_fetch_all_html_contents_concurrent(booking_url_list,max_threads=5,scroll_period=0.2, driver_pool=None, max_pages_per_driver=50, headless=True,
+                                                                      load_deadline=120, page_timings=None, archive=None):
+    """
+    Fetches every Booking url with max_threads threads sharing a WebDriverPool, so browsers are reused
+    across urls instead of started for each one. Urls that fail are reported and skipped.
+
+    Parameters:
+    - scroll_period (float): Seconds without DOM changes or network responses after which a page is considered loaded.
+    - driver_pool (WebDriverPool, optional): Pool to check drivers out of. If None, a pool of max_threads
+      drivers is created, recycling each one after max_pages_per_driver pages, and closed at the end.
+    - load_deadline (float): Maximum seconds spent loading the results of a single url.
+    - page_timings (list, optional): If given, the load timings of every page (see load_all_results) are appended to it.
+    - archive (HtmlArchive, optional): If given, every fetched page is also stored in it with source "booking".
+
+    Returns:
+    - Tuple[List[str], List[str]]: The fetched htmls and their urls, in the same order.
+    """
+    own_pool = driver_pool is None
+    if own_pool:
+        driver_pool = WebDriverPool(max_drivers=max_threads, max_pages_per_driver=max_pages_per_driver, headless=headless)
+    page_timings = [] if page_timings is None else page_timings
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_threads) as executor:
+            futures = [executor.submit(fetch_booking_html_optimized, booking_url, scroll_period, driver_pool, load_deadline, page_timings, archive)
+                       for booking_url in booking_url_list]
+
+            # Collect results in the order of the urls
+            html_contents_total = []
+            fetched_urls_list = []
+            for booking_url, future in zip(booking_url_list, futures):
+                try:
+                    html_contents_total.append(future.result())
+                    fetched_urls_list.append(booking_url)
+                except Exception as e:
+                    print(f"Skipping {booking_url} due to {e}")
+    finally:
+        driver_pool.print_report()
+        if own_pool:
+            driver_pool.close()
 
-        # Collect results as they complete
-        html_contents_total = []
-        for future in futures:
-            html_contents_total.append(future.result())
+    if page_timings:
+        timings_df = pd.DataFrame(page_timings)
+        print(f"Pages loaded in {timings_df['seconds_total'].mean():.1f} seconds on average "
+              f"({timings_df['seconds_scrolling'].mean():.1f} scrolling, {timings_df['seconds_clicking'].mean():.1f} clicking load more), "
+              f"{timings_df['hit_deadline'].sum()} hit the deadline")
 
-    return html_contents_total, booking_url_list
+    return html_contents_total, fetched_urls_list
 
 
 def fetch_booking_html(booking_url, scroll_period):
@@ -776,52 +1032,132 @@ def fetch_booking_html(booking_url, scroll_period):
 
     return html_page
 
-def fetch_booking_html_optimized(booking_url, scroll_period):
+def fetch_booking_html_optimized(booking_url, scroll_period, driver_pool=None, load_deadline=120, page_timings=None, archive=None):
 
-    # ADD OPTIMIZATION OPTIONS HERE
-    # add optimization options
-    options = Options()
-    options.add_argument("--no-sandbox")      # Enables no-sandbox mode
-    options.add_argument("--disable-gpu")     # Disables GPU usage
-    # options.add_argument("--headless")        # Runs Chrome in headless mode
+    # reuse a headless driver from the pool, or a single-use one that is quit afterwards
+    own_pool = driver_pool is None
+    if own_pool:
+        driver_pool = WebDriverPool(max_drivers=1)
 
-    # open driver
-    driver = webdriver.Chrome(options=options)
-    driver.maximize_window()
-    driver.get(booking_url)
+    try:
+        with driver_pool.driver() as driver:
+            driver.get(booking_url)
 
-    # scroll and load more until bottom
-    css_selector = "#bodyconstraint-inner > div:nth-child(8) > div > div.af5895d4b2 > div.df7e6ba27d > div.bcbf33c5c3 > div.dcf496a7b9.bb2746aad9 > div.d4924c9e74 > div.c82435a4b8.f581fde0b8 > button"
-    scroll_and_click_cycle(driver, scroll_period)
+            # scroll and load more until no more cards appear, waiting on page signals instead of sleeping
+            load_timings = load_all_results(driver, deadline=load_deadline, settle_time=scroll_period)
 
-    # fetch booking url html
-    html_page = driver.page_source
+            # fetch booking url html
+            html_page = driver.page_source
+
+        if page_timings is not None:
+            page_timings.append({"url": booking_url, **load_timings})
+        if archive is not None:
+            archive.append(html_page, booking_url, source="booking")
+    finally:
+        if own_pool:
+            driver_pool.close()
 
     return html_page
 
-def accommodations_booking_soup_from_all_html_contents_parallel(html_contents_total, booking_urls_list, verbose=False):
+def accommodations_booking_soup_from_all_html_contents_parallel(html_contents_total, booking_urls_list, verbose=False, backend=DEFAULT_BOOKING_PARSER_BACKEND):
     start_time = time.time()
     with ThreadPoolExecutor() as executor:
 
-        page_dfs = list(executor.map(accommodations_booking_parse_single_page_wrapper, html_contents_total, booking_urls_list, [verbose] * len(html_contents_total)))
+        page_dfs = list(executor.map(accommodations_booking_parse_single_page_wrapper, html_contents_total, booking_urls_list,
+                                     [verbose] * len(html_contents_total), [backend] * len(html_contents_total)))
 
     total_activities_df = pd.concat(page_dfs).reset_index(drop=True)
     end_time = time.time()
     print(f"The whole parallel Beautiful Soup process took {end_time-start_time}")
     return total_activities_df
 
-def accommodations_booking_parse_single_page_wrapper(page_html, booking_url, verbose=False):
-    return accommodations_booking_parse_single_page(page_html, booking_url,verbose=verbose)
+def accommodations_booking_soup_from_all_html_contents_multiprocess(html_contents_total, booking_urls_list, verbose=False, backend=DEFAULT_BOOKING_PARSER_BACKEND,
+                                                                   chunk_size=16, max_workers=None):
+    """
+    Process-pool version of accommodations_booking_soup_from_all_html_contents_parallel, which parses
+    in threads and is serialized by the GIL.
+
+    Pages are sent to the workers in chunks of chunk_size, with at most two chunks per worker in flight,
+    so html_contents_total and booking_urls_list can be generators (e.g. over an HtmlArchive) and memory stays
+    flat. Each worker answers with one Arrow record batch per chunk, which is much smaller to transfer than a
+    pickled DataFrame, and the batches are converted to pandas once at the end.
+
+    Returns:
+    - pd.DataFrame: The same columns as accommodations_booking_soup_from_all_html_contents_parallel.
+    """
+    start_time = time.time()
+    max_workers = max_workers or os.cpu_count() or 1
+    pages = zip(html_contents_total, booking_urls_list)
+    chunks = iter(lambda: list(itertools.islice(pages, chunk_size)), [])
+
+    record_batches = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending_futures = deque()
+        for chunk in chunks:
+            pending_futures.append(executor.submit(accommodations_booking_parse_chunk_to_record_batch, chunk, verbose, backend))
+            if len(pending_futures) >= 2 * max_workers:
+                record_batches.append(pending_futures.popleft().result())
+        while pending_futures:
+            record_batches.append(pending_futures.popleft().result())
+
+    total_accommodations_df = pa.Table.from_batches(record_batches, schema=BOOKING_ARROW_SCHEMA).to_pandas()
+
+    # missing values as NaN, like the DataFrames built from the scraper dicts
+    object_columns = total_accommodations_df.select_dtypes("object").columns
+    total_accommodations_df[object_columns] = total_accommodations_df[object_columns].where(total_accommodations_df[object_columns].notna(), np.nan)
+
+    print(f"The whole multiprocess parsing took {time.time()-start_time}")
+    return total_accommodations_df
+
+def accommodations_booking_parse_chunk_to_record_batch(pages_chunk, verbose=False, backend=DEFAULT_BOOKING_PARSER_BACKEND):
+    """
+    Parses a chunk of (page_html, booking_url) pairs into a single record batch. Runs in the worker processes.
+    """
+    chunk_data_dict = {field.name: [] for field in BOOKING_ARROW_SCHEMA}
+    for page_html, booking_url in pages_chunk:
+        if backend == "lxml":
+            page_data_dict = scrape_accommodations_from_html_lxml(page_html, booking_url, verbose=verbose)
+        else:
+            page_data_dict = scrape_accommodations_from_page(BeautifulSoup(page_html, "html.parser"), booking_url, verbose=verbose)
+        for key, values in page_data_dict.items():
+            chunk_data_dict[key].extend(values)
+
+    return accommodation_data_to_record_batch(chunk_data_dict)
+
+def accommodations_booking_soup_from_archive_parallel(archive, since=None, verbose=False, max_workers=None, backend=DEFAULT_BOOKING_PARSER_BACKEND):
+    """
+    Re-parses the latest capture of every Booking url stored in `archive` (an HtmlArchive or its path),
+    optionally only those captured since the epoch time `since`, in a process pool reading straight from the archive.
+    """
+    archive = archive if isinstance(archive, HtmlArchive) else HtmlArchive(archive)
+    start_time = time.time()
+    page_dfs = map_archived_pages(archive, accommodations_booking_parse_single_page, archive.pages(source="booking", since=since),
+                                  max_workers=max_workers, verbose=verbose, backend=backend)
+
+    total_accommodations_df = pd.concat(page_dfs).reset_index(drop=True) if page_dfs else pd.DataFrame()
+    print(f"Parsing {len(page_dfs)} archived pages took {time.time()-start_time}")
+    return total_accommodations_df
+
+def accommodations_booking_parse_single_page_wrapper(page_html, booking_url, verbose=False, backend=DEFAULT_BOOKING_PARSER_BACKEND):
+    return accommodations_booking_parse_single_page(page_html, booking_url,verbose=verbose, backend=backend)
+
 
+def accommodations_booking_parse_single_page(page_html,booking_url, verbose=False, backend=DEFAULT_BOOKING_PARSER_BACKEND):
+    """
+    Parses the accommodation cards of a Booking results page. backend "lxml" (the default when lxml is
+    installed, see booking_parser_support) gives the same columns as "bs4", the BeautifulSoup scraper, several times faster.
+    """
+    if backend == "lxml":
+        return pd.DataFrame(scrape_accommodations_from_html_lxml(page_html, booking_url, verbose=verbose))
 
-def accommodations_booking_parse_single_page(page_html,booking_url, verbose=False):
     page_soup = BeautifulSoup(page_html, "html.parser")
     return pd.DataFrame(scrape_accommodations_from_page(page_soup,booking_url, verbose=verbose))
 
 
 def get_accommodations_booking(destinations_list: List[str], start_date: str, stay_duration: int = 2, step_length: int = 7, n_steps: int = 52, adults: int = 2, children: int = 0,
                            rooms: int = 1, max_price: int = 350, star_ratings: list = None, 
-                           meal_plan: str = None, review_score: list = None, max_distance_meters: int = 5000, max_threads = 5, scroll_period= 0.2,verbose=False):
+                           meal_plan: str = None, review_score: list = None, max_distance_meters: int = 5000, max_threads = 5, scroll_period= 0.2,verbose=False,
+                           driver_pool=None, archive=None, backend=DEFAULT_BOOKING_PARSER_BACKEND):
     
     start_time = time.time()
 
@@ -829,11 +1165,11 @@ def get_accommodations_booking(destinations_list: List[str], start_date: str, st
                            rooms = rooms, max_price = max_price, star_ratings = star_ratings, meal_plan = meal_plan, review_score = review_score, max_distance_meters = max_distance_meters)
     
     print(f"It took {time.time() - start_time} seconds to build the urls")
-    booking_html_contents_total, booking_urls_list = accommodations_booking_selenium_fetch_all_html_contents_concurrent(booking_urls_list, max_threads=max_threads, scroll_period=scroll_period)
+    booking_html_contents_total, booking_urls_list = accommodations_booking_selenium_fetch_all_html_contents_concurrent(booking_urls_list, max_threads=max_threads, scroll_period=scroll_period, driver_pool=driver_pool, archive=archive)
     print(f"It took {time.time() - start_time} seconds for selenium to get the html contents")
 
     print("Now parsing with beautiful soup")
-    total_accommodations_df = accommodations_booking_soup_from_all_html_contents_parallel(booking_html_contents_total, booking_urls_list,verbose=verbose)
+    total_accommodations_df = accommodations_booking_soup_from_all_html_contents_parallel(booking_html_contents_total, booking_urls_list,verbose=verbose, backend=backend)
     return total_accommodations_df
         
         
@@ -1076,6 +1412,21 @@ def activities_civitatis_soup_from_all_html_contents_parallel(html_contents_tota
     return total_activities_df
 
 
+def activities_civitatis_soup_from_archive_parallel(archive, since=None, verbose=False, max_workers=None):
+    """
+    Re-parses the latest capture of every Civitatis page stored in `archive` (an HtmlArchive or its path),
+    optionally only those captured since the epoch time `since`, in a process pool reading straight from the archive.
+    """
+    archive = archive if isinstance(archive, HtmlArchive) else HtmlArchive(archive)
+    start_time = time.time()
+    page_dfs = map_archived_pages(archive, parse_single_page, archive.pages(source="civitatis", since=since),
+                                  max_workers=max_workers, verbose=verbose)
+
+    total_activities_df = pd.concat(page_dfs).reset_index(drop=True) if page_dfs else pd.DataFrame()
+    print(f"Parsing {len(page_dfs)} archived pages took {time.time()-start_time}")
+    return total_activities_df
+
+
 def parse_single_page_wrapper(page_html, page_url, verbose=False):
     return parse_single_page(page_html, page_url, verbose=verbose)
 
@@ -1085,103 +1436,152 @@ def parse_single_page(page_html, page_url, verbose=False):
     return pd.DataFrame(scrape_activities_from_page(page_soup, page_url, verbose=verbose))
 
 
-def scrape_activities_from_page(page_soup, page_url, verbose=False):
-    activity_data_dict = {
-            "query_date": [],
-            "city": [],
-            "activity_date_range_start": [],
-            "activity_date_range_end": [],
-            "activity_name": [],
-            "description": [],
-            "url": [],
-            "image": [],
-            "image2": [],
-            "available_days": [],
-            "available_times": [],
-            "duration": [],
-            "latitude": [],
-            "longitude": [],
-            # "address": [],
-            "price": [],
-            "currency": [],
-            "category": [],
-            "spanish": []
-    }
-
-    for element in page_soup.findAll("div",{"class","o-search-list__item"}):
-
-        availability_cards = list(set(element.findAll("div", {"class": "m-availability__item"})) - 
-                                set(element.findAll("div", {"class": "m-availability__item _no-dates"})))
-        
-        activity_scraper_dict = {
-            "query_date": lambda _ : datetime.datetime.now(),
-
-            "city": lambda _: re.findall(r".com/es/(\w+)/", page_url)[0],
-
-            "activity_date_range_start": lambda _: re.findall(r"fromDate=(\d{4}-\d{2}-\d{2})", page_url)[0],
-
-            "activity_date_range_end": lambda _: re.findall(r"toDate=(\d{4}-\d{2}-\d{2})", page_url)[0],
-
-            "activity_name": lambda element: element.find("a", {"class": "ga-trackEvent-element _activity-link"})["title"],
-
-            "description": lambda element: element.find("div", {"class": "comfort-card__text l-list-card__text"}).text.strip().replace("\xa0", " "),
-
-            "url": lambda element: "www.civitatis.com" + element.find("a",{"data-eventcategory":"Actividades Listado"})["href"],
-
-            # image/gif
-            "image": lambda element: "www.civitatis.com" + element.find("img")["src"],
-
-            # image/gif
-            "image2": lambda element: "www.civitatis.com" + element.find("img")["data-src"],
+# selectors compiled once, read by CIVITATIS_SOUP_SPEC
+CIVITATIS_SOUP_SELECTORS = {
+    "activity_link": SoupStrainer("a", {"class": "ga-trackEvent-element _activity-link"}),
+    "description": SoupStrainer("div", {"class": "comfort-card__text l-list-card__text"}),
+    "listing_link": SoupStrainer("a", {"data-eventcategory": "Actividades Listado"}),
+    "image": SoupStrainer("img"),
+    "availability": SoupStrainer("div", {"class": "m-availability__item"}),
+    "time": SoupStrainer("span", {"class": "_time"}),
+    "duration": SoupStrainer("span", {"class": "comfort-card__feature _duration has-tip top _processed"}),
+    "article": SoupStrainer("article"),
+    "category": SoupStrainer("span", {"data-tooltip-class": "tooltip activity-tooltip city-list__feature-tooltip"}),
+    "spanish": SoupStrainer("span", {"class": "comfort-card__feature _lang has-tip top _processed"})
+}
+
+
+def _civitatis_availability_cards(card):
+    # availability days with dates, in page order, without repeated ones
+    return list(dict.fromkeys(element for element in card.find_all(CIVITATIS_SOUP_SELECTORS["availability"])
+                              if " ".join(element["class"]) != "m-availability__item _no-dates"))
+
+
+CIVITATIS_SOUP_SPEC = ExtractionSpec(
+    find_records=lambda page_soup: page_soup.findAll("div",{"class","o-search-list__item"}),
+    page_fields={
+        "query_date": lambda _ : datetime.datetime.now(),
+        "city": url_regex_field(r".com/es/(\w+)/"),
+        "activity_date_range_start": url_regex_field(r"fromDate=(\d{4}-\d{2}-\d{2})"),
+        "activity_date_range_end": url_regex_field(r"toDate=(\d{4}-\d{2}-\d{2})")
+    },
+    card_nodes={
+        "activity_link": lambda nodes: nodes["card"].find(CIVITATIS_SOUP_SELECTORS["activity_link"]),
+        # price and currency come from the same tracking json
+        "gtm": lambda nodes: json.loads(nodes["activity_link"]["data-gtm-new-model-click"])["ecommerce"],
+        "image": lambda nodes: nodes["card"].find(CIVITATIS_SOUP_SELECTORS["image"]),
+        "article": lambda nodes: nodes["card"].find(CIVITATIS_SOUP_SELECTORS["article"], recursive=False),
+        "availability_cards": lambda nodes: _civitatis_availability_cards(nodes["card"])
+    },
+    card_fields={
+        "activity_name": lambda nodes: nodes["activity_link"]["title"],
+        "description": lambda nodes: nodes["card"].find(CIVITATIS_SOUP_SELECTORS["description"]).text.strip().replace("\xa0", " "),
+        "url": lambda nodes: "www.civitatis.com" + nodes["card"].find(CIVITATIS_SOUP_SELECTORS["listing_link"])["href"],
+        # image/gif
+        "image": lambda nodes: "www.civitatis.com" + nodes["image"]["src"],
+        "image2": lambda nodes: "www.civitatis.com" + nodes["image"]["data-src"],
+        # NOTE_: I'LL HAVE TO HANDLE LAST AND FIRST DAYS OF MONTH CAREFULLY, AS MONTH NOT SPECIFIED
+        "available_days": lambda nodes: [el.find('br').next_sibling.strip() for el in nodes["availability_cards"]],
+        "available_times": lambda nodes: [[time.text for time in el.find_all(CIVITATIS_SOUP_SELECTORS["time"])] for el in nodes["availability_cards"]],
+        "duration": lambda nodes: nodes["card"].find(CIVITATIS_SOUP_SELECTORS["duration"]).text.strip(),
+        # address: use latitude and longitude, then convert with geopy
+        "latitude": lambda nodes: nodes["article"]["data-latitude"],
+        "longitude": lambda nodes: nodes["article"]["data-longitude"],
+        "price": lambda nodes: nodes["gtm"]["click"]["products"][0]["price"],
+        "currency": lambda nodes: nodes["gtm"]["currencyCode"],
+        "category": lambda nodes: nodes["card"].find(CIVITATIS_SOUP_SELECTORS["category"]).text.strip(),
+        "spanish": lambda nodes: nodes["card"].find(CIVITATIS_SOUP_SELECTORS["spanish"]).text.strip()
+    },
+    # empty lists and texts are missing values
+    empty_as_nan=True
+)
+
+
+# an activity is the same across date windows if it has the same url and coordinates, and then only
+# its price and availability have to be read again
+CIVITATIS_KEY_FIELDS = ["url", "latitude", "longitude"]
+CIVITATIS_STATIC_FIELDS = ["activity_name", "description", "image", "image2", "duration", "category", "spanish"]
+
+
+def scrape_activities_from_page(page_soup, page_url, verbose=False, index=None):
+    return CIVITATIS_SOUP_SPEC.extract(page_soup, page_url, verbose=verbose, index=index)
+
+
+def parse_pages_deduplicated(html_contents, pages_urls, verbose=False):
+    """
+    Parses Civitatis pages with a single RecordIndex, so every activity gets its static fields extracted once.
 
-            # NOTE_: I'LL HAVE TO HANDLE LAST AND FIRST DAYS OF MONTH CAREFULLY, AS MONTH NOT SPECIFIED
-            "available_days": lambda _: [el.find('br').next_sibling.strip() for el in availability_cards],
-            
-            "available_times": lambda _: [[time.text for time in el.find_all("span", {"class": "_time"})] for el in availability_cards],
-            
-            "duration": lambda element: element.find("span",{"class":"comfort-card__feature _duration has-tip top _processed"}).text.strip(),
-            
-            # address: use latitude and longitude, then convert with geopy
-            "latitude": lambda element: element.find("article", recursive=False)["data-latitude"],
-            "longitude": lambda element: element.find("article", recursive=False)["data-longitude"],
-
-            # "address": lambda element: geolocator.reverse(
-            #     (element.find("article", recursive=False)["data-latitude"], 
-            #     element.find("article", recursive=False)["data-longitude"])
-            # ).address,
-    
-            "price": lambda element: json.loads(element.find("a", {"class": "ga-trackEvent-element _activity-link"})["data-gtm-new-model-click"])["ecommerce"]["click"]["products"][0]["price"],
-            
-            "currency": lambda element: json.loads(element.find("a", {"class": "ga-trackEvent-element _activity-link"})["data-gtm-new-model-click"])["ecommerce"]["currencyCode"],
-            
-            "category": lambda element: element.find("span",{"data-tooltip-class":"tooltip activity-tooltip city-list__feature-tooltip"}).text.strip(),
+    Returns:
+    - Tuple[dict, dict]: The activities (activity_id, key and static fields) and the activity windows
+      (page fields, price, currency and availability, with the activity_id).
+    """
+    index = RecordIndex(CIVITATIS_KEY_FIELDS, CIVITATIS_STATIC_FIELDS)
+    window_dicts = [scrape_activities_from_page(BeautifulSoup(page_html, "html.parser"), page_url, verbose=verbose, index=index)
+                    for page_html, page_url in zip(html_contents, pages_urls)]
+    activity_windows_dict = {key: [value for window_dict in window_dicts for value in window_dict[key]] for key in window_dicts[0]} if window_dicts else {}
+    return index.records, activity_windows_dict
 
-            "spanish": lambda element: element.find("span",{"class":"comfort-card__feature _lang has-tip top _processed"}).text.strip()
-        }
-        
 
-        for key, activity_scraper_function in activity_scraper_dict.items():
-            try:
-                
-                if not activity_scraper_function(element): # if empty list or other
-                    activity_data_dict[key].append(np.nan)
-                else: 
-                    activity_data_dict[key].append(activity_scraper_function(element))
+def activities_civitatis_soup_from_all_html_contents_deduplicated(html_contents_total, pages_urls, verbose=False, max_workers=None):
+    """
+    Parses the Civitatis pages keeping every activity once instead of once per date window: the pages of
+    each city go to one process with its own dedup index, keyed on the activity url and coordinates.
 
-            except Exception as e:
-                if verbose == True:
-                    print(f"Error filling {key} due to {e}")
-                activity_data_dict[key].append(np.nan)
+    Parameters:
+    - html_contents_total (list): Html of every page.
+    - pages_urls (list): Url of every page, aligned with html_contents_total.
+    - max_workers (int, optional): Worker processes. Defaults to the number of cores.
 
-    return activity_data_dict
+    Returns:
+    - Tuple[pd.DataFrame, pd.DataFrame]: The activities, one row per activity, and the activity windows, one row
+      per activity and page with the fields that change between windows. join_activity_windows combines them into
+      the frame of activities_civitatis_soup_from_all_html_contents_parallel.
+    """
+    start_time = time.time()
+    city_field = CIVITATIS_SOUP_SPEC.page_fields["city"]
+    pages_by_city = {}
+    for page_html, page_url in zip(html_contents_total, pages_urls):
+        try:
+            city = city_field(page_url)
+        except IndexError:
+            city = page_url
+        city_pages = pages_by_city.setdefault(city, ([], []))
+        city_pages[0].append(page_html)
+        city_pages[1].append(page_url)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        city_results = list(executor.map(parse_pages_deduplicated, *zip(*pages_by_city.values()), itertools.repeat(verbose))) if pages_by_city else []
+
+    # activity ids are local to every city, offset them to be unique
+    activities_dfs, activity_windows_dfs, n_activities = [], [], 0
+    for activities_dict, activity_windows_dict in city_results:
+        activities_df = pd.DataFrame(activities_dict).rename(columns={"record_id": "activity_id"})
+        activity_windows_df = pd.DataFrame(activity_windows_dict).rename(columns={"record_id": "activity_id"})
+        activities_df["activity_id"] += n_activities
+        activity_windows_df["activity_id"] += n_activities
+        n_activities += len(activities_df)
+        activities_dfs.append(activities_df)
+        activity_windows_dfs.append(activity_windows_df)
+
+    activities_df = pd.concat(activities_dfs, ignore_index=True) if activities_dfs else pd.DataFrame()
+    activity_windows_df = pd.concat(activity_windows_dfs, ignore_index=True) if activity_windows_dfs else pd.DataFrame()
+    print(f"Parsing {len(html_contents_total)} pages into {len(activities_df)} activities and {len(activity_windows_df)} activity windows took {time.time()-start_time}")
+    return activities_df, activity_windows_df
+
+
+def join_activity_windows(activities_df, activity_windows_df):
+    """
+    Joins the activities with their windows into one row per activity and window, with the columns of scrape_activities_from_page.
+    """
+    return activity_windows_df.merge(activities_df, on="activity_id", how="left")[CIVITATIS_SOUP_SPEC.columns]
 
 
 
 # Top - bottom function definition
 ### Soup parallel/multithread + selenium concurrent
 
-def activities_civitatis_extract_all_activites_parallel_selenium(cities_list, date_start, date_end, verbose):
-    html_contents_total, pages_urls = activities_civitatis_selenium_get_all_html_contents_concurrent(cities_list, date_start, date_end)
+def activities_civitatis_extract_all_activites_parallel_selenium(cities_list, date_start, date_end, verbose, driver_pool=None):
+    html_contents_total, pages_urls = activities_civitatis_selenium_get_all_html_contents_concurrent(cities_list, date_start, date_end, driver_pool=driver_pool)
 
     print("Now parsing with beautiful soup")
     total_activities_df = activities_civitatis_soup_from_all_html_contents_parallel(html_contents_total,pages_urls,verbose=verbose)
@@ -1197,24 +1597,34 @@ def activities_civitatis_extract_all_activites_multithread_selenium(cities_list,
     return total_activities_df
 
 
-def activities_civitatis_selenium_get_all_html_contents_concurrent(cities_list, date_start, date_end):
+def activities_civitatis_selenium_get_all_html_contents_concurrent(cities_list, date_start, date_end, driver_pool=None, max_pages_per_driver=50, headless=True):
     # Determine optimal max_workers, usually best around the number of CPUs for Selenium
     max_workers = min(len(cities_list), os.cpu_count() or 1)
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(fetch_city_htmls, city, date_start, date_end) for city in cities_list]
-        
-        # Collect results as they complete
-        html_contents_total = []
-        pages_urls_total = []
-        for future in futures:
-            html_contents_total.extend(future.result()[0])
-            pages_urls_total.extend(future.result()[1])
+
+    # drivers are shared through a bounded pool instead of one new browser per city
+    own_pool = driver_pool is None
+    if own_pool:
+        driver_pool = WebDriverPool(max_drivers=max_workers, max_pages_per_driver=max_pages_per_driver, headless=headless)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(fetch_city_htmls, city, date_start, date_end, driver_pool) for city in cities_list]
+            
+            # Collect results as they complete
+            html_contents_total = []
+            pages_urls_total = []
+            for future in futures:
+                html_contents_total.extend(future.result()[0])
+                pages_urls_total.extend(future.result()[1])
+    finally:
+        if own_pool:
+            driver_pool.close()
     
     return html_contents_total, pages_urls_total
 
 
 ### Concurrent selenium
-def fetch_city_htmls(city_name, date_start, date_end):
+def fetch_city_htmls(city_name, date_start, date_end, driver_pool=None):
     period = 6
     date_start_datetime = datetime.datetime.strptime(date_start, "%Y-%m-%d")
     date_end_datetime = datetime.datetime.strptime(date_end, "%Y-%m-%d")
@@ -1223,70 +1633,110 @@ def fetch_city_htmls(city_name, date_start, date_end):
     html_contents_total = []
     pages_urls_total = []
     
-    # Open a new WebDriver instance for each thread
-    driver = webdriver.Chrome()
-    driver.maximize_window()
-    
-    for iter in range(1, n_iter + 1):
-        # Calculate iteration end date
-        date_start_iter = (date_start_datetime + datetime.timedelta(days=period*(iter-1))).strftime("%Y-%m-%d")
-        date_end_iter = ((date_start_datetime + datetime.timedelta(days=period*iter))).strftime("%Y-%m-%d")
-        first_link = f"https://www.civitatis.com/es/{city_name}/?fromDate={date_start_iter}&toDate={date_end_iter}"
+    # reuse a driver from the pool, or a single-use one that is quit afterwards
+    own_pool = driver_pool is None
+    if own_pool:
+        driver_pool = WebDriverPool(max_drivers=1)
 
-        # Navigate
-        driver.get(first_link)
+    try:
+        for iter in range(1, n_iter + 1):
+            # Calculate iteration end date
+            date_start_iter = (date_start_datetime + datetime.timedelta(days=period*(iter-1))).strftime("%Y-%m-%d")
+            date_end_iter = ((date_start_datetime + datetime.timedelta(days=period*iter))).strftime("%Y-%m-%d")
+            first_link = f"https://www.civitatis.com/es/{city_name}/?fromDate={date_start_iter}&toDate={date_end_iter}"
 
-        # Wait for elements to load
-        try:
-            driver.execute_script('window.scrollBy(0, 400)')
-            WebDriverWait(driver, 5).until(EC.presence_of_element_located(("css selector", "div.m-availability")))
-            WebDriverWait(driver, 5).until(EC.presence_of_element_located(("css selector", "#activitiesShowing")))
-        except:
-            pass
+            # a driver is checked out per date window, so it can be recycled between windows
+            with driver_pool.driver() as driver:
+                # Navigate
+                driver.get(first_link)
+
+                # Wait for elements to load
+                try:
+                    driver.execute_script('window.scrollBy(0, 400)')
+                    WebDriverWait(driver, 5).until(EC.presence_of_element_located(("css selector", "div.m-availability")))
+                    WebDriverWait(driver, 5).until(EC.presence_of_element_located(("css selector", "#activitiesShowing")))
+                except:
+                    pass
+
+                # Parse page to get last page number
+                html_content1 = driver.page_source
+                soup = BeautifulSoup(html_content1, "html.parser")
+                last_page = math.ceil(int(soup.find("div", {"class", "columns o-pagination__showing"}).find("div", {"class": "left"}).text.split()[0]) / 20)
+                
+                # Get all pagination pages
+                html_contents, page_urls = get_pagination_htmls_by_city_date(city_name, date_start_iter, date_end_iter, 2, last_page - 1, driver)
+
+            html_contents.append(html_content1)
+            html_contents_total.extend(html_contents)
+            pages_urls_total.append(first_link)
+            pages_urls_total.extend(page_urls)
+    finally:
+        if own_pool:
+            driver_pool.close()
 
-        # Parse page to get last page number
-        html_content1 = driver.page_source
-        soup = BeautifulSoup(html_content1, "html.parser")
-        last_page = math.ceil(int(soup.find("div", {"class", "columns o-pagination__showing"}).find("div", {"class": "left"}).text.split()[0]) / 20)
-        
-        # Get all pagination pages
-        html_contents, page_urls = get_pagination_htmls_by_city_date(city_name, date_start_iter, date_end_iter, 2, last_page - 1, driver)
-        html_contents.append(html_content1)
-        html_contents_total.extend(html_contents)
-        pages_urls_total.append(first_link)
-        pages_urls_total.extend(page_urls)
-    
-    driver.quit()
     return html_contents_total, pages_urls_total
 
 ### Soup parallel + selenium concurrent optimized
 
-def activities_civitatis_extract_all_activites_parallel_selenium_optimized(cities_list, date_start, date_end, verbose):
-    html_contents_total, pages_urls = activities_civitatis_selenium_get_all_html_contents_concurrent_optimized(cities_list, date_start, date_end)
+def activities_civitatis_extract_all_activites_parallel_selenium_optimized(cities_list, date_start, date_end, verbose, driver_pool=None, archive=None, hybrid=False,
+                                                                          deduplicate=False):
+    """
+    With deduplicate=True, returns the activities and their windows as two frames (see
+    activities_civitatis_soup_from_all_html_contents_deduplicated) instead of one row per activity and window.
+    """
+    html_contents_total, pages_urls = activities_civitatis_selenium_get_all_html_contents_concurrent_optimized(cities_list, date_start, date_end, driver_pool=driver_pool,
+                                                                                                               archive=archive, hybrid=hybrid)
 
     print("Now parsing with beautiful soup")
+    if deduplicate:
+        return activities_civitatis_soup_from_all_html_contents_deduplicated(html_contents_total, pages_urls, verbose=verbose)
     total_activities_df = activities_civitatis_soup_from_all_html_contents_parallel(html_contents_total,pages_urls,verbose=verbose)
 
     return total_activities_df
 
-def activities_civitatis_selenium_get_all_html_contents_concurrent_optimized(cities_list, date_start, date_end):
+def activities_civitatis_selenium_get_all_html_contents_concurrent_optimized(cities_list, date_start, date_end, driver_pool=None, max_pages_per_driver=50, headless=True, archive=None,
+                                                                           hybrid=False, max_http_concurrency=10):
+    """
+    Fetches the activity pages of every city, one city per thread, with drivers from a WebDriverPool.
+    With hybrid=True, only the first page of each date window is rendered by the browser, and the rest of
+    the pages are fetched over plain HTTP with the browser cookies (see fetch_city_htmls_hybrid).
+    """
     # Determine optimal max_workers, usually best around the number of CPUs for Selenium
     max_workers = min(len(cities_list), os.cpu_count() or 1)
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(fetch_city_htmls_optimized, city, date_start, date_end) for city in cities_list]
-        
-        # Collect results as they complete
-        html_contents_total = []
-        pages_urls_total = []
-        for future in futures:
-            html_contents_total.extend(future.result()[0])
-            pages_urls_total.extend(future.result()[1])
-    
+
+    # drivers are shared through a bounded pool and recycled every max_pages_per_driver pages
+    own_pool = driver_pool is None
+    if own_pool:
+        driver_pool = WebDriverPool(max_drivers=max_workers, max_pages_per_driver=max_pages_per_driver, headless=headless)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            if hybrid:
+                futures = [executor.submit(fetch_city_htmls_hybrid, city, date_start, date_end, driver_pool, archive, max_http_concurrency) for city in cities_list]
+            else:
+                futures = [executor.submit(fetch_city_htmls_optimized, city, date_start, date_end, driver_pool, archive) for city in cities_list]
+
+            # Collect results in the order of the cities
+            html_contents_total = []
+            pages_urls_total = []
+            for city, future in zip(cities_list, futures):
+                try:
+                    html_contents, pages_urls = future.result()
+                except Exception as e:
+                    print(f"Skipping {city} due to {e}")
+                    continue
+                html_contents_total.extend(html_contents)
+                pages_urls_total.extend(pages_urls)
+    finally:
+        driver_pool.print_report()
+        if own_pool:
+            driver_pool.close()
+
     return html_contents_total, pages_urls_total
 
 
 # Concurrent selenium optimized
-def fetch_city_htmls_optimized(city_name, date_start, date_end):
+def fetch_city_htmls_optimized(city_name, date_start, date_end, driver_pool=None, archive=None):
     period = 6
     date_start_datetime = datetime.datetime.strptime(date_start, "%Y-%m-%d")
     date_end_datetime = datetime.datetime.strptime(date_end, "%Y-%m-%d")
@@ -1295,98 +1745,245 @@ def fetch_city_htmls_optimized(city_name, date_start, date_end):
     html_contents_total = []
     pages_urls_total = []
 
-    # add optimization options
-    options = Options()
-    options.add_argument("--no-sandbox")      # Enables no-sandbox mode
-    options.add_argument("--disable-gpu")     # Disables GPU usage
-    # options.add_argument("--headless")        # Runs Chrome in headless mode
-    # Open a new WebDriver instance for each thread
-    driver = webdriver.Chrome(options=options)
-    
-    
-    driver.maximize_window()
-    
-    for iter in range(1, n_iter + 1):
-        # Calculate iteration end date
-        date_start_iter = (date_start_datetime + datetime.timedelta(days=period*(iter-1))).strftime("%Y-%m-%d")
-        date_end_iter = ((date_start_datetime + datetime.timedelta(days=period*iter))).strftime("%Y-%m-%d")
-        first_link = f"https://www.civitatis.com/es/{city_name}/?fromDate={date_start_iter}&toDate={date_end_iter}"
+    # reuse a headless driver from the pool, or a single-use one that is quit afterwards
+    own_pool = driver_pool is None
+    if own_pool:
+        driver_pool = WebDriverPool(max_drivers=1)
 
-        # Navigate
-        driver.get(first_link)
+    try:
+        for iter in range(1, n_iter + 1):
+            # a driver is checked out per date window, so it can be recycled between windows
+            with driver_pool.driver() as driver:
+                html_contents, pages_urls = fetch_city_window_htmls(city_name, date_start_datetime, period, iter, driver)
+
+            # keep the raw pages so they can be parsed again without scraping
+            if archive is not None:
+                for page_html, page_url in zip(html_contents, pages_urls):
+                    archive.append(page_html, page_url, source="civitatis")
+
+            html_contents_total.extend(html_contents)
+            pages_urls_total.extend(pages_urls)
+    finally:
+        if own_pool:
+            driver_pool.close()
 
-        # Wait for elements to load
-        try:
-            driver.execute_script('window.scrollBy(0, 400)')
-            WebDriverWait(driver, 5).until(EC.presence_of_element_located(("css selector", "div.m-availability")))
-            WebDriverWait(driver, 5).until(EC.presence_of_element_located(("css selector", "#activitiesShowing")))
-        except:
-            pass
+    return html_contents_total, pages_urls_total
 
-        # Parse page to get last page number
-        html_content1 = driver.page_source
-        soup = BeautifulSoup(html_content1, "html.parser")
-        last_page = math.ceil(int(soup.find("div", {"class", "columns o-pagination__showing"}).find("div", {"class": "left"}).text.split()[0]) / 20)
-        
-        # Get all pagination pages
-        html_contents, pages_urls = get_pagination_htmls_by_city_date(city_name, date_start_iter, date_end_iter, 2, last_page - 1, driver)
-        html_contents.append(html_content1)
-        html_contents_total.extend(html_contents)
 
-        pages_urls_total.append(first_link)
+def fetch_city_window_htmls(city_name, date_start_datetime, period, iter, driver):
+    # Calculate iteration end date
+    date_start_iter = (date_start_datetime + datetime.timedelta(days=period*(iter-1))).strftime("%Y-%m-%d")
+    date_end_iter = ((date_start_datetime + datetime.timedelta(days=period*iter))).strftime("%Y-%m-%d")
+
+    first_link, html_content1, last_page = fetch_civitatis_first_page(city_name, date_start_iter, date_end_iter, driver)
+
+    # Get all pagination pages, first page first so htmls and urls stay aligned
+    html_contents, pages_urls = get_pagination_htmls_by_city_date(city_name, date_start_iter, date_end_iter, 2, last_page - 1, driver)
+
+    return [html_content1] + html_contents, [first_link] + pages_urls
+
+
+def fetch_civitatis_first_page(city_name, date_start_iter, date_end_iter, driver):
+    """
+    Loads the first listing page of a city and date window in the browser and returns its url, html
+    and the number of the last page.
+    """
+    first_link = f"https://www.civitatis.com/es/{city_name}/?fromDate={date_start_iter}&toDate={date_end_iter}"
+
+    # Navigate
+    driver.get(first_link)
+
+    # Wait for elements to load
+    try:
+        driver.execute_script('window.scrollBy(0, 400)')
+        WebDriverWait(driver, 5).until(EC.presence_of_element_located(("css selector", "div.m-availability")))
+        WebDriverWait(driver, 5).until(EC.presence_of_element_located(("css selector", "#activitiesShowing")))
+    except:
+        pass
+
+    # Parse page to get last page number
+    html_content1 = driver.page_source
+    soup = BeautifulSoup(html_content1, "html.parser")
+    last_page = math.ceil(int(soup.find("div", {"class", "columns o-pagination__showing"}).find("div", {"class": "left"}).text.split()[0]) / 20)
+
+    return first_link, html_content1, last_page
+
+
+def fetch_city_htmls_hybrid(city_name, date_start, date_end, driver_pool=None, archive=None, max_http_concurrency=10):
+    """
+    Hybrid version of fetch_city_htmls_optimized. For every date window the browser renders only the first
+    page, which gives the number of pages and the session cookies, and the remaining pages are fetched
+    concurrently over plain HTTP with those cookies. Pages that come back incomplete are fetched again
+    with the browser one by one.
+
+    Runs its own event loop, so it is meant to be called from worker threads (as the concurrent fetchers do),
+    not from a thread already running one. The threads share the "civitatis" rate limiter, which is thread safe.
+
+    Returns:
+    - Tuple[List[str], List[str]]: The htmls and urls of every page, aligned.
+    """
+    period = 6
+    date_start_datetime = datetime.datetime.strptime(date_start, "%Y-%m-%d")
+    date_end_datetime = datetime.datetime.strptime(date_end, "%Y-%m-%d")
+    n_iter = int((date_end_datetime - date_start_datetime).days / period)
+
+    html_contents_total = []
+    pages_urls_total = []
+    n_browser_fallbacks = 0
+
+    own_pool = driver_pool is None
+    if own_pool:
+        driver_pool = WebDriverPool(max_drivers=1)
+
+    try:
+        for iter in range(1, n_iter + 1):
+            date_start_iter = (date_start_datetime + datetime.timedelta(days=period*(iter-1))).strftime("%Y-%m-%d")
+            date_end_iter = ((date_start_datetime + datetime.timedelta(days=period*iter))).strftime("%Y-%m-%d")
+
+            with driver_pool.driver() as driver:
+                first_link, html_content1, last_page = fetch_civitatis_first_page(city_name, date_start_iter, date_end_iter, driver)
+                cookies, headers = http_session_from_driver(driver)
+
+            page_numbers = list(range(2, last_page + 1))
+            pages_urls = [build_civitatis_page_url(city_name, page_number, date_start_iter, date_end_iter) for page_number in page_numbers]
+            html_contents = asyncio.run(fetch_listing_pages_http(pages_urls, cookies, headers, max_concurrency=max_http_concurrency))
+
+            # fall back to the browser for the pages plain http could not get complete
+            missing_pages = [position for position, page_html in enumerate(html_contents) if page_html is None]
+            if missing_pages:
+                n_browser_fallbacks += len(missing_pages)
+                with driver_pool.driver() as driver:
+                    for position in missing_pages:
+                        browser_htmls, _ = get_pagination_htmls_by_city_date(city_name, date_start_iter, date_end_iter, page_numbers[position], 1, driver)
+                        html_contents[position] = browser_htmls[0] if browser_htmls else None
+
+            window_htmls, window_urls = [html_content1], [first_link]
+            for page_html, page_url in zip(html_contents, pages_urls):
+                if page_html is not None:
+                    window_htmls.append(page_html)
+                    window_urls.append(page_url)
+
+            if archive is not None:
+                for page_html, page_url in zip(window_htmls, window_urls):
+                    archive.append(page_html, page_url, source="civitatis")
+
+            html_contents_total.extend(window_htmls)
+            pages_urls_total.extend(window_urls)
+    finally:
+        if own_pool:
+            driver_pool.close()
+
+    print(f"{city_name}: {len(html_contents_total)} pages fetched, {n_browser_fallbacks} needed the browser")
+    return html_contents_total, pages_urls_total
+
+
+### Scheduled selenium: (city, window, page) tasks
+def activities_civitatis_selenium_get_all_html_contents_scheduled(cities_list, date_start, date_end, n_drivers=4, driver_pool=None, max_pages_per_driver=50,
+                                                                  headless=True, archive=None, task_log=None):
+    """
+    Fetches the activity pages of every city as (city, window) and (city, window, page) tasks in a shared
+    queue, served by n_drivers long-lived drivers (see crawl_scheduler_support). Loading the first page of a
+    window queues its remaining pages, so the pages of a large city are spread over every driver instead of
+    being walked by one. Failed tasks are retried once.
+
+    Parameters:
+    - n_drivers (int): Worker threads, each one using a driver of the pool at a time.
+    - driver_pool, max_pages_per_driver, headless, archive: Same as activities_civitatis_selenium_get_all_html_contents_concurrent_optimized.
+    - task_log (list, optional): If given, the per-task log (city, window, page, worker, status, seconds) is appended to it.
+
+    Returns:
+    - Tuple[List[str], List[str]]: The htmls and urls of every page, ordered by city, window and page.
+    """
+    period = 6
+    date_start_datetime = datetime.datetime.strptime(date_start, "%Y-%m-%d")
+    date_end_datetime = datetime.datetime.strptime(date_end, "%Y-%m-%d")
+    n_iter = int((date_end_datetime - date_start_datetime).days / period)
+
+    # windows first: they discover the pages, which are queued behind them
+    window_tasks = [{"priority": 0, "city": city_name, "city_order": city_order, "window": iter,
+                     "date_start": (date_start_datetime + datetime.timedelta(days=period*(iter-1))).strftime("%Y-%m-%d"),
+                     "date_end": (date_start_datetime + datetime.timedelta(days=period*iter)).strftime("%Y-%m-%d"),
+                     "page": 1}
+                    for city_order, city_name in enumerate(cities_list) for iter in range(1, n_iter + 1)]
+
+    def run_civitatis_task(task, driver):
+        if task["page"] == 1:
+            first_link, html_content1, last_page = fetch_civitatis_first_page(task["city"], task["date_start"], task["date_end"], driver)
+            page_tasks = [{**task, "priority": 1, "page": page_number} for page_number in range(2, last_page + 1)]
+            return ([html_content1], [first_link]), page_tasks
+
+        return get_pagination_htmls_by_city_date(task["city"], task["date_start"], task["date_end"], task["page"], 1, driver), []
+
+    own_pool = driver_pool is None
+    if own_pool:
+        driver_pool = WebDriverPool(max_drivers=n_drivers, max_pages_per_driver=max_pages_per_driver, headless=headless)
+
+    try:
+        results, task_log_df = run_task_queue(window_tasks, run_civitatis_task, driver_pool, n_workers=n_drivers)
+    finally:
+        driver_pool.print_report()
+        if own_pool:
+            driver_pool.close()
+
+    print(summarize_task_log(task_log_df, n_drivers))
+    if task_log is not None:
+        task_log.extend(task_log_df.to_dict("records"))
+
+    html_contents_total = []
+    pages_urls_total = []
+    for task, (html_contents, pages_urls) in sorted(results, key=lambda result: (result[0]["city_order"], result[0]["window"], result[0]["page"])):
+        if archive is not None:
+            for page_html, page_url in zip(html_contents, pages_urls):
+                archive.append(page_html, page_url, source="civitatis")
+        html_contents_total.extend(html_contents)
         pages_urls_total.extend(pages_urls)
-    
-    driver.quit()
+
     return html_contents_total, pages_urls_total
 
 
 ### Weather - forecast
-async def fetch_forecast(city, latitude, longitude,params):
+async def fetch_forecast(city, latitude, longitude,params, cache=None):
     async with aiohttp.ClientSession() as session:
-        async with session.get(BASE_URL_FORECAST, params={**params, "latitude": latitude, "longitude": longitude}) as response:
-            data = await response.json()
-            return {city: data.get("daily", {})}
+        status, data = await cached_get_json(session, BASE_URL_FORECAST, provider="open_meteo", params={**params, "latitude": latitude, "longitude": longitude}, cache=cache)
 
-async def get_forecast(cities,params):
-    tasks = [fetch_forecast(city, lat, lon,params) for city, (lat, lon) in cities.items()]
-    results = await asyncio.gather(*tasks)
-    
-    forecast_data = {city: result[city] for result in results for city in result}
-    all_forecasts = []
-    for city, daily_data in forecast_data.items():
-        city_df = pd.DataFrame(daily_data)
-        city_df["city"] = city
-        all_forecasts.append(city_df)
-    
-    forecast_df = pd.concat(all_forecasts, ignore_index=True)
+    if status != 200 or not data:
+        print(f"Error {status} for {city}")
+        return {city: {}}
+    return {city: data.get("daily", {})}
+
+async def get_forecast(cities,params, cache=None, locations_per_request=50):
+    # many cities per request, over one pooled session, see OpenMeteoClient
+    async with OpenMeteoClient(locations_per_request=locations_per_request, cache=cache) as client:
+        forecast_df = await client.request_daily(BASE_URL_FORECAST, cities, params)
     return forecast_df
 
 ### Weather - history
-async def fetch_weather_data_city(url, city, latitude, longitude, params):
-    params.update({
+async def fetch_weather_data_city(url, city, latitude, longitude, params, cache=None):
+    # copy, as the params dict is shared by every city task waiting on the rate limiter
+    params = {
+        **params,
         "latitude": latitude,
         "longitude": longitude
-    })
+    }
     
     async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params) as response:
-            if response.status == 200:
-                data = await response.json()
-                if "daily" in data:
-                    df = pd.DataFrame(data["daily"])
-                    df["city"] = city  # Add city name to the DataFrame
-                    return df
-                else:
-                    print(f"No daily data for {city}")
-                    return pd.DataFrame()  
-            else:
-                print(f"Error {response.status} for {city}")
-                return pd.DataFrame()  
+        status, data = await cached_get_json(session, url, provider="open_meteo", params=params, cache=cache)
+
+    if status == 200:
+        if data and "daily" in data:
+            df = pd.DataFrame(data["daily"])
+            df["city"] = city  # Add city name to the DataFrame
+            return df
+        else:
+            print(f"No daily data for {city}")
+            return pd.DataFrame()  
+    else:
+        print(f"Error {status} for {city}")
+        return pd.DataFrame()  
 
 
-async def get_weather_history_for_cities(cities_dict,params):
-    tasks = [fetch_weather_data_city(BASE_URL_ARCHIVE, city, lat, lon,params) for city, (lat, lon) in cities_dict.items()]
-    results = await asyncio.gather(*tasks)
-    
-    all_cities_df = pd.concat(results, ignore_index=True)
+async def get_weather_history_for_cities(cities_dict,params, cache=None, locations_per_request=50):
+    # many cities per request, over one pooled session, see OpenMeteoClient
+    async with OpenMeteoClient(locations_per_request=locations_per_request, cache=cache) as client:
+        all_cities_df = await client.request_daily(BASE_URL_ARCHIVE, cities_dict, params)
     return all_cities_df
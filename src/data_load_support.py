@@ -1,6 +1,17 @@
 # python database manager
 import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2.extras import execute_values
+
+# data processing
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+
+# in-memory buffers for COPY
+import io
+
+# connections checked out of a pool
+from contextlib import contextmanager
 
 
 # work with environment variables
@@ -11,51 +22,288 @@ USERNAME = os.getenv("DATABASE_USERNAME")
 PASSWORD = os.getenv("DATABASE_PASSWORD")
 
 # typing
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-from .database_connection_support import connect_to_database
+from .database_connection_support import ConnectionPool, get_pool
 
+Connection = Union[psycopg2.extensions.connection, ConnectionPool]
+
+
+@contextmanager
+def _checked_out(conn: Connection):
+    # helpers take either a connection or a pool to draw one from for the duration of the call
+    if isinstance(conn, ConnectionPool):
+        with conn.connection() as connection:
+            yield connection
+    else:
+        yield conn
 
 
 def create_db(database_name, credentials_dict):
-    # connect to default postgres database
-    conn = connect_to_database("postgres", credentials_dict) 
+    # connect to default postgres database, in autocommit mode to avoid transaction block
+    with get_pool("postgres", credentials_dict).connection(autocommit=True) as conn:
 
-    # Set isolation level to autocommit to avoid transaction block
-    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-    
-    # create cursor and check if database exists
-    cur = conn.cursor()
-    
-    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (database_name,))
-    
-    # store database existance result
-    database_exists = cur.fetchone()
-    
-    # if not exists, create
-    if not database_exists:
-        cur.execute(f"CREATE DATABASE {database_name};")
-        print(f"Database {database_name} created succesfully.")
-    else:
-        print(f"Database already existant.")
-        
-    # Close cursor and connection
-    cur.close()
-    conn.close()
+        # create cursor and check if database exists
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (database_name,))
+
+            # store database existance result
+            database_exists = cur.fetchone()
+
+            # if not exists, create
+            if not database_exists:
+                cur.execute(f"CREATE DATABASE {database_name};")
+                print(f"Database {database_name} created succesfully.")
+            else:
+                print(f"Database already existant.")
 
-def drop_tables(conn: psycopg2.extensions.connection, lista_tablas: List[str]) -> None:
+def drop_tables(conn: Connection, lista_tablas: List[str]) -> None:
     """
     Drops all tables from the database with CASCADE.
 
     Parameters:
     ----------
-        - conn (psycopg2.extensions.connection): Connection to the PostgreSQL database.
+        - conn (psycopg2.extensions.connection or ConnectionPool): Connection to the PostgreSQL database, or pool to draw one from.
         - lista_tablas (List[str]): List of tables to drop.
     """
     
     lista_tablas_string = ", ".join(lista_tablas)
 
-    with conn.cursor() as cursor:
+    with _checked_out(conn) as conn, conn.cursor() as cursor:
         cursor.execute(f"DROP TABLE IF EXISTS {lista_tablas_string} CASCADE;"
         )
-        conn.commit()
\ No newline at end of file
+        conn.commit()
+
+
+_NUMERIC_KEY_TYPES = ("integer", "floating", "mixed-integer-float", "decimal")
+_DATETIME_KEY_TYPES = ("date", "datetime", "datetime64")
+
+
+def _key_columns(keys_df: pd.DataFrame, map_keys_df: pd.DataFrame) -> Tuple[pd.MultiIndex, pd.MultiIndex]:
+    """
+    Makes the keys of a DataFrame comparable with those fetched from a table, coerced as SQL = does: numbers
+    are compared as floats (5 = 5.0, e.g. ids mapped into a column with NaN), and strings are read as numbers
+    or dates for numeric or date columns ('5' = 5). Keys that cannot be compared with the column of the table
+    raise a TypeError or ValueError, as the query would, instead of silently resolving to None.
+
+    Returns:
+    -------
+        - Tuple[pd.MultiIndex, pd.MultiIndex]: The keys of keys_df and of map_keys_df.
+    """
+    keys_df, map_keys_df = keys_df.copy(), map_keys_df.copy()
+    for column, map_column in zip(keys_df.columns, map_keys_df.columns):
+        key_type = pd.api.types.infer_dtype(keys_df[column], skipna=True)
+        map_type = pd.api.types.infer_dtype(map_keys_df[map_column], skipna=True)
+
+        if "empty" in (key_type, map_type):
+            # nothing to match on one side
+            keys_df[column], map_keys_df[map_column] = keys_df[column].astype(object), map_keys_df[map_column].astype(object)
+        elif map_type in _NUMERIC_KEY_TYPES and key_type in (*_NUMERIC_KEY_TYPES, "string"):
+            keys_df[column] = pd.to_numeric(keys_df[column]).astype(float)
+            map_keys_df[map_column] = map_keys_df[map_column].astype(float)
+        elif map_type in _DATETIME_KEY_TYPES and key_type in (*_DATETIME_KEY_TYPES, "string"):
+            keys_df[column] = pd.to_datetime(keys_df[column])
+            map_keys_df[map_column] = pd.to_datetime(map_keys_df[map_column])
+        elif key_type == map_type:
+            keys_df[column], map_keys_df[map_column] = keys_df[column].astype(object), map_keys_df[map_column].astype(object)
+        else:
+            raise TypeError(f"Column {column} holds {key_type} values, which cannot be matched with the {map_type} "
+                            f"values of {map_column}")
+    return pd.MultiIndex.from_frame(keys_df), pd.MultiIndex.from_frame(map_keys_df)
+
+
+def fetch_key_id_map(conn: Connection, target_table: str, target_fields: List[str],
+                     matching_fields: Dict[str, str], df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Fetches the natural key -> ids mapping of a table in a single query.
+
+    Parameters:
+    ----------
+        - conn (psycopg2.extensions.connection or ConnectionPool): Connection to the PostgreSQL database, or pool to draw one from.
+        - target_table (str): Table to read the ids from (e.g. 'booking_places').
+        - target_fields (List[str]): Fields to retrieve (e.g. ['place_id']).
+        - matching_fields (Dict[str, str]): Field of the table -> column of the DataFrame, the natural key.
+        - df (pd.DataFrame, optional): If given, only the keys found in its matching columns are fetched: they are
+          written once to a temporary table and joined with target_table, instead of reading the whole table.
+
+    Returns:
+    -------
+        - pd.DataFrame: The key fields (named as in the table) and the target fields, one row per row of target_table.
+    """
+    key_fields = list(matching_fields)
+    select_clause = ", ".join(f"t.{field}" for field in [*key_fields, *target_fields])
+
+    with _checked_out(conn) as conn, conn.cursor() as cursor:
+        if df is None:
+            cursor.execute(f"SELECT {select_clause} FROM {target_table} t;")
+            rows = cursor.fetchall()
+        else:
+            keys = df[list(matching_fields.values())].dropna().drop_duplicates()
+            key_clause = ", ".join(key_fields)
+            # inside a transaction, an error aborts it and the temporary table can no longer be dropped: it is
+            # undone by rolling back to a savepoint instead, which keeps the transaction usable
+            use_savepoint = not conn.autocommit
+            if use_savepoint:
+                cursor.execute("SAVEPOINT fetch_key_id_map;")
+            try:
+                # same column types as the target table, so the join compares like with like
+                cursor.execute(f"CREATE TEMPORARY TABLE tmp_keys AS SELECT {key_clause} FROM {target_table} WITH NO DATA;")
+                execute_values(cursor, f"INSERT INTO tmp_keys ({key_clause}) VALUES %s",
+                               [tuple(value.item() if isinstance(value, np.generic) else value for value in key)
+                                for key in keys.itertuples(index=False, name=None)],
+                               page_size=10000)
+                cursor.execute(f"SELECT {select_clause} FROM {target_table} t JOIN tmp_keys USING ({key_clause});")
+                rows = cursor.fetchall()
+            except Exception:
+                cursor.execute("ROLLBACK TO SAVEPOINT fetch_key_id_map;" if use_savepoint else "DROP TABLE IF EXISTS tmp_keys;")
+                raise
+            cursor.execute("DROP TABLE tmp_keys;")
+            if use_savepoint:
+                cursor.execute("RELEASE SAVEPOINT fetch_key_id_map;")
+
+    return pd.DataFrame(rows, columns=[*key_fields, *target_fields])
+
+
+def resolve_ids(conn: Connection, df: pd.DataFrame, target_table: str, target_fields: List[str],
+                matching_fields: Dict[str, str], use_temp_table: bool = False) -> pd.DataFrame:
+    """
+    Maps the ids of target_table onto every row of df by its natural key. Bulk replacement of fetching the ids
+    row by row with one SELECT each: the mapping is fetched once (see fetch_key_id_map) and matched in memory.
+
+    As with a SELECT per row, the first match of a key is used, and rows whose key is not found or has a
+    missing value get None. Keys are coerced to the types of the table as SQL would (see _key_columns), and
+    a key column that cannot be compared with the table raises instead of resolving every row to None.
+
+    Parameters:
+    ----------
+        - conn (psycopg2.extensions.connection or ConnectionPool): Connection to the PostgreSQL database, or pool to draw one from.
+        - df (pd.DataFrame): DataFrame containing the fields to match.
+        - target_table (str): Table to read the ids from (e.g. 'activities').
+        - target_fields (List[str]): Fields to retrieve (e.g. ['activity_id']).
+        - matching_fields (Dict[str, str]): Field of the table -> column of the DataFrame (e.g. {'city_entityid': 'city'}).
+        - use_temp_table (bool): Fetch only the keys of df through a temporary table, for tables much bigger than df.
+
+    Returns:
+    -------
+        - pd.DataFrame: The target fields, with the index of df, as python objects (None when not found) ready to insert.
+    """
+    df_keys = df[list(matching_fields.values())]
+    key_id_map = fetch_key_id_map(conn, target_table, target_fields, matching_fields, df=df if use_temp_table else None)
+    key_id_map = key_id_map.dropna(subset=list(matching_fields))
+
+    df_index, map_index = _key_columns(df_keys, key_id_map[list(matching_fields)])
+    is_first = ~map_index.duplicated()
+    positions = map_index[is_first].get_indexer(df_index)
+    # keys with a missing value never match, as with = NULL in SQL
+    positions[df_keys.isna().any(axis=1).to_numpy()] = -1
+
+    resolved = {}
+    for field in target_fields:
+        # position -1 picks the None appended at the end
+        values = np.append(key_id_map[field].to_numpy(dtype=object)[is_first], None)
+        resolved[field] = values[positions]
+    return pd.DataFrame(resolved, index=df.index)
+
+
+# NULL marker of the COPY stream, only read as NULL unquoted: empty strings and the text \N stay text
+COPY_NULL = "\\N"
+
+
+def _copy_ready(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Prepares a chunk to be written as COPY csv: missing values (NaN, NaT, None, pd.NA) are written as NULL,
+    timestamps, dates and times in ISO format and booleans as True/False, all read by PostgreSQL as such.
+    Float columns holding only whole numbers (e.g. ids or counts mapped into a column with NaN) are written
+    without decimals, as COPY does not cast 12.0 into an INT column the way INSERT does.
+    """
+    chunk = chunk.copy(deep=False)
+    for column in chunk.columns:
+        values = chunk[column]
+        if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) not in ("floating", "mixed-integer-float", "integer"):
+            continue
+        if not (pd.api.types.is_float_dtype(values) or values.dtype == object):
+            continue
+
+        numbers = pd.to_numeric(values).astype(float)
+        present = numbers[numbers.notna()].to_numpy()
+        if np.isfinite(present).all() and (present == np.round(present)).all() and (np.abs(present) < 2 ** 53).all():
+            chunk[column] = numbers.astype("Int64")
+    return chunk
+
+
+def _copy_csv(chunk: pd.DataFrame) -> str:
+    """
+    Writes a chunk prepared by _copy_ready as COPY csv. Every present value is quoted and missing ones are
+    written as the bare NULL marker: COPY only reads unquoted fields as NULL, so a text value equal to the
+    marker is loaded as text.
+    """
+    lines = None
+    for column in chunk.columns:
+        values = chunk[column]
+        fields = ('"' + values.astype(str).str.replace('"', '""', regex=False) + '"').where(values.notna(), COPY_NULL)
+        lines = fields if lines is None else lines + "," + fields
+    return "".join(lines + "\n")
+
+
+def _iter_chunks(data: Union[pd.DataFrame, pa.Table, pa.RecordBatch, Iterable], chunk_size: int) -> Iterator[pd.DataFrame]:
+    if isinstance(data, pd.DataFrame):
+        for chunk_start in range(0, len(data), chunk_size):
+            yield data.iloc[chunk_start:chunk_start + chunk_size]
+    elif isinstance(data, (pa.Table, pa.RecordBatch)):
+        batches = data.to_batches(max_chunksize=chunk_size) if isinstance(data, pa.Table) else [data]
+        for batch in batches:
+            # dates and times stay python objects, as the INSERT path receives them
+            yield batch.to_pandas(date_as_object=True)
+    else:
+        # e.g. pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size)
+        for batch in data:
+            yield from _iter_chunks(batch, chunk_size)
+
+
+def copy_dataframe(conn: Connection, data: Union[pd.DataFrame, pa.Table, pa.RecordBatch, Iterable],
+                   table: str, columns: Optional[List[str]] = None, chunk_size: int = 50000) -> int:
+    """
+    Loads rows into a table with COPY FROM STDIN, streaming csv chunks through an in-memory buffer. Replaces
+    cursor.executemany(INSERT ...) over itertuples, which runs one statement per row.
+
+    All chunks are loaded in a single transaction, committed at the end: either every row is loaded or none.
+    Connections in autocommit mode are switched out of it while loading and back afterwards.
+
+    Parameters:
+    ----------
+        - conn (psycopg2.extensions.connection or ConnectionPool): Connection to the PostgreSQL database, or pool to draw one from.
+        - data (pd.DataFrame, pa.Table, pa.RecordBatch or iterable of them): Rows to load, columns in the order of `columns`.
+        - table (str): Table to load the rows into.
+        - columns (List[str], optional): Columns of the table the columns of data are loaded into. Defaults to the
+          column names of data.
+        - chunk_size (int): Rows written to the buffer at once, bounding the memory used.
+
+    Returns:
+    -------
+        - int: Number of rows loaded.
+    """
+    with _checked_out(conn) as conn:
+        autocommit = conn.autocommit
+        if autocommit:
+            conn.autocommit = False
+
+        n_rows = 0
+        try:
+            with conn.cursor() as cursor:
+                for chunk in _iter_chunks(data, chunk_size):
+                    if chunk.empty:
+                        continue
+                    column_clause = ", ".join(columns if columns is not None else chunk.columns)
+                    buffer = io.StringIO(_copy_csv(_copy_ready(chunk)))
+                    cursor.copy_expert(f"COPY {table} ({column_clause}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')", buffer)
+                    n_rows += len(chunk)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if autocommit:
+                conn.autocommit = True
+
+    print(f"{n_rows} rows loaded into {table}.")
+    return n_rows
@@ -0,0 +1,119 @@
+# data processing
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+# columns of the availabilities table, in order
+AVAILABILITY_COLUMNS = ["query_date", "available_times", "city", "activity_name", "activity_date_range_start",
+                        "activity_date_range_end", "available_date"]
+
+
+def _list_offsets(list_array: pa.ListArray) -> np.ndarray:
+    return list_array.offsets.to_numpy()
+
+
+def _parse_times(time_strings: np.ndarray) -> np.ndarray:
+    """
+    Converts "HH:MM" strings (or None) into datetime.time objects, parsing every distinct value once.
+    """
+    parsed_times = np.full(len(time_strings), None, dtype=object)
+    has_time = pd.notna(time_strings)
+    if has_time.any():
+        unique_times, inverse = np.unique(time_strings[has_time].astype(str), return_inverse=True)
+        unique_parsed = np.array(pd.to_datetime(unique_times, format="%H:%M").time, dtype=object)
+        parsed_times[has_time] = unique_parsed[inverse]
+    return parsed_times
+
+
+def resolve_available_dates(available_days: np.ndarray, date_range_start: pd.Series, date_range_end: pd.Series) -> pd.Series:
+    """
+    Completes the day of month shown on an availability card with the month of the search window. A day
+    bigger than the day the window ends on belongs to the month the window starts in, otherwise to the
+    month it ends in. Days that do not exist in that month are NaT.
+
+    Parameters:
+    ----------
+    available_days : np.ndarray
+        Days of month, as numbers or strings.
+    date_range_start, date_range_end : pd.Series
+        Start and end of the search window of every day.
+
+    Returns:
+    -------
+    pd.Series
+        The available dates (datetime64).
+    """
+    days = pd.to_numeric(pd.Series(available_days, dtype=object)).to_numpy()
+    date_range_start = pd.to_datetime(date_range_start).reset_index(drop=True)
+    date_range_end = pd.to_datetime(date_range_end).reset_index(drop=True)
+
+    month_dates = date_range_end.where(~(days > date_range_end.dt.day.to_numpy()), date_range_start)
+    valid_day = (days >= 1) & (days <= month_dates.dt.days_in_month.to_numpy())
+    available_dates = month_dates + pd.to_timedelta(days - month_dates.dt.day.to_numpy(), unit="D")
+    return available_dates.where(valid_day)
+
+
+def expand_activity_availabilities(activities_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Builds the availabilities table of the activities: one row per activity, available day and time,
+    from the list columns available_days and available_times.
+
+    The lists of every activity are flattened once with Arrow, the day and time of each row are picked
+    with index arithmetic, times are parsed once per distinct value and the month of every day is resolved
+    in bulk (see resolve_available_dates). Gives the rows of the row-wise version of the transformation
+    notebook: the i-th day is paired with the i-th list of times, a day without times gives one row with
+    no time, an activity with times missing altogether keeps only its first day, and activities without
+    days are dropped.
+
+    Parameters:
+    ----------
+    activities_df : pd.DataFrame
+        Activities as scraped by scrape_activities_from_page or read from activities.parquet.
+
+    Returns:
+    -------
+    pd.DataFrame
+        AVAILABILITY_COLUMNS, with available_times as datetime.time (or None) and available_date as datetime64.
+    """
+    days_array = pa.array(activities_df["available_days"].to_numpy(dtype=object), type=pa.list_(pa.string()), from_pandas=True)
+    times_array = pa.array(activities_df["available_times"].to_numpy(dtype=object), type=pa.list_(pa.list_(pa.string())), from_pandas=True)
+
+    has_days = days_array.is_valid().to_numpy(zero_copy_only=False)
+    has_times = times_array.is_valid().to_numpy(zero_copy_only=False)
+    n_days = pc.fill_null(pc.list_value_length(days_array), 0).to_numpy()
+    n_time_lists = pc.fill_null(pc.list_value_length(times_array), 0).to_numpy()
+
+    # days are zipped with the lists of times; missing times behave as a single missing list
+    n_pairs = np.where(has_days, np.minimum(n_days, np.where(has_times, n_time_lists, 1)), 0)
+    pair_activity = np.repeat(np.arange(len(activities_df)), n_pairs)
+    pair_position = np.arange(len(pair_activity)) - np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs)
+
+    pair_days = days_array.values.to_numpy(zero_copy_only=False)[_list_offsets(days_array)[pair_activity] + pair_position]
+
+    # every pair gives one row per time, or a single row without time
+    pair_has_times = has_times[pair_activity]
+    times_lists = times_array.values
+    time_list_index = np.where(pair_has_times, _list_offsets(times_array)[pair_activity] + pair_position, 0)
+    # padded so the placeholder index 0 of pairs without times is valid even with no lists at all
+    time_offsets = np.r_[_list_offsets(times_lists), 0]
+    n_times = np.where(pair_has_times, time_offsets[time_list_index + 1] - time_offsets[time_list_index], 0)
+    rows_per_pair = np.maximum(n_times, 1)
+
+    row_pair = np.repeat(np.arange(len(pair_activity)), rows_per_pair)
+    row_position = np.arange(len(row_pair)) - np.repeat(np.cumsum(rows_per_pair) - rows_per_pair, rows_per_pair)
+    row_has_time = row_position < n_times[row_pair]
+    time_values = times_lists.values.to_numpy(zero_copy_only=False)
+    row_time_strings = np.full(len(row_pair), None, dtype=object)
+    row_time_strings[row_has_time] = time_values[time_offsets[time_list_index[row_pair[row_has_time]]] + row_position[row_has_time]]
+
+    row_activity = pair_activity[row_pair]
+    availabilities_df = activities_df[["query_date", "city", "activity_name", "activity_date_range_start", "activity_date_range_end"]].iloc[row_activity].reset_index(drop=True)
+    availabilities_df["activity_date_range_start"] = pd.to_datetime(availabilities_df["activity_date_range_start"])
+    availabilities_df["activity_date_range_end"] = pd.to_datetime(availabilities_df["activity_date_range_end"])
+    availabilities_df["available_times"] = _parse_times(row_time_strings)
+    availabilities_df["available_date"] = resolve_available_dates(pair_days[row_pair], availabilities_df["activity_date_range_start"],
+                                                                  availabilities_df["activity_date_range_end"])
+
+    return availabilities_df.loc[availabilities_df["available_date"].notna(), AVAILABILITY_COLUMNS].reset_index(drop=True)
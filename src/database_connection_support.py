@@ -1,14 +1,54 @@
 # database agent
 import psycopg2
 from psycopg2 import OperationalError, errorcodes
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.pool import PoolError
 
 # data processing
 import pandas as pd
 
+# work with concurrency
+import threading
+from contextlib import contextmanager
+
+# work with time
+import time
+
+# work with environment variables
+import os
+from dotenv import load_dotenv
+load_dotenv()
+DATABASE_HOST = os.getenv("DATABASE_HOST", "localhost")
+DATABASE_PORT = os.getenv("DATABASE_PORT", "5432")
+DATABASE_DSN = os.getenv("DATABASE_DSN")
+
 # functions typing
-from typing import Optional, Tuple, List, Union, Dict
+from typing import Optional, Tuple, List, Union, Dict, Iterator
+
+def _print_connection_error(e: OperationalError) -> None:
+    if e.pgcode == errorcodes.INVALID_PASSWORD:
+        print("Invalid password.")
+    elif e.pgcode == errorcodes.CONNECTION_EXCEPTION:
+        print("Connection error.")
+    else:
+        print(f"Error occurred: {e}", e.pgcode)
+
+def _connect(database: Optional[str], credentials_dict: Optional[Dict[str, str]], host: Optional[str] = None,
+             port: Optional[str] = None, dsn: Optional[str] = DATABASE_DSN) -> psycopg2.extensions.connection:
+    # host and port given explicitly take precedence over the dsn, which takes precedence over the defaults
+    if not dsn:
+        host, port = host or DATABASE_HOST, port or DATABASE_PORT
+    connection_kwargs = {
+        "database": database,
+        "user": (credentials_dict or {}).get("username"),
+        "password": (credentials_dict or {}).get("password"),
+        "host": host,
+        "port": port
+    }
+    return psycopg2.connect(dsn or "", **{key: value for key, value in connection_kwargs.items() if value is not None})
 
-def connect_to_database(database: str, credentials_dict: Dict[str, str], autocommit: bool = False) -> Optional[psycopg2.extensions.connection]:
+def connect_to_database(database: str, credentials_dict: Dict[str, str], autocommit: bool = False, host: Optional[str] = None,
+                        port: Optional[str] = None, dsn: Optional[str] = DATABASE_DSN) -> Optional[psycopg2.extensions.connection]:
     """
     Connects to a PostgreSQL database using provided credentials.
 
@@ -18,6 +58,14 @@ def connect_to_database(database: str, credentials_dict: Dict[str, str], autocom
         Name of the database to connect to.
     credentials_dict : dict
         Dictionary containing 'username' and 'password' for authentication.
+    autocommit : bool
+        Whether every statement is committed on its own.
+    host, port : str, optional
+        Server address. Without a dsn, default to the DATABASE_HOST and DATABASE_PORT environment variables,
+        or localhost:5432.
+    dsn : str, optional
+        Connection string (e.g. "postgresql://user@host:5432/db?sslmode=require") with any other setting.
+        Defaults to the DATABASE_DSN environment variable.
 
     Returns:
     -------
@@ -25,27 +73,198 @@ def connect_to_database(database: str, credentials_dict: Dict[str, str], autocom
         A PostgreSQL database connection if successful, None otherwise.
     """
     try:
-        connection = psycopg2.connect(
-            database=database,
-            user=credentials_dict["username"],
-            password=credentials_dict["password"],
-            host="localhost",
-            port="5432"
-        )
+        connection = _connect(database, credentials_dict, host=host, port=port, dsn=dsn)
         connection.autocommit = autocommit
         return connection
     except OperationalError as e:
-        if e.pgcode == errorcodes.INVALID_PASSWORD:
-            print("Invalid password.")
-        elif e.pgcode == errorcodes.CONNECTION_EXCEPTION:
-            print("Connection error.")
-        else:
-            print(f"Error occurred: {e}", e.pgcode)
+        _print_connection_error(e)
         return None
 
+class ConnectionPool:
+    """
+    Thread-safe pool of connections to a PostgreSQL database, reused between queries instead of opening
+    one per query.
+
+    - min_size connections are opened with the pool and at most max_size are open at once. When all of them
+      are in use, callers wait up to `timeout` seconds for one to be returned, then get a PoolError.
+    - Connections are checked before being handed out: closed ones are replaced, and those idle for more than
+      health_check_interval seconds are tested with SELECT 1.
+    - Returned connections are rolled back if left in a transaction and set back to autocommit off.
+
+    Usage:
+    ------
+        pool = get_pool("travel_planner_v2", credentials_dict)
+        with pool.transaction() as connection:
+            connection.cursor().execute(query)
+    """
+
+    def __init__(self, database: Optional[str] = None, credentials_dict: Optional[Dict[str, str]] = None, min_size: int = 1,
+                 max_size: int = 10, host: Optional[str] = None, port: Optional[str] = None,
+                 dsn: Optional[str] = DATABASE_DSN, timeout: float = 30, health_check_interval: float = 30):
+        """
+        Parameters:
+        ----------
+        database : str, optional
+            Name of the database to connect to, if not in the dsn.
+        credentials_dict : dict, optional
+            Dictionary containing 'username' and 'password' for authentication, if not in the dsn.
+        min_size, max_size : int
+            Connections opened up front, and maximum open at the same time.
+        host, port, dsn : str, optional
+            Server address and connection string, see connect_to_database.
+        timeout : float
+            Seconds to wait for a free connection when max_size are in use.
+        health_check_interval : float
+            Seconds a connection can stay idle before it is tested on checkout.
+        """
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+
+        self.database = database
+        self.credentials_dict = credentials_dict
+        self.min_size = min_size
+        self.max_size = max_size
+        self.host = host
+        self.port = port
+        self.dsn = dsn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        # idle connections with the time they were returned, the most recent last
+        self._idle: List[Tuple[psycopg2.extensions.connection, float]] = []
+        self._closed = False
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self) -> psycopg2.extensions.connection:
+        return _connect(self.database, self.credentials_dict, host=self.host, port=self.port, dsn=self.dsn)
+
+    @staticmethod
+    def _is_healthy(connection: psycopg2.extensions.connection) -> bool:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self, autocommit: bool = False, timeout: Optional[float] = None) -> psycopg2.extensions.connection:
+        """
+        Checks out a healthy connection, to be given back with putconn. Prefer the connection and transaction
+        context managers, which always give it back.
+        """
+        if self._closed:
+            raise PoolError("Connection pool is closed")
+        if not self._slots.acquire(timeout=self.timeout if timeout is None else timeout):
+            raise PoolError(f"No connection available after {self.timeout if timeout is None else timeout} seconds, all {self.max_size} in use")
+
+        try:
+            connection = None
+            while connection is None:
+                with self._lock:
+                    connection, idle_since = self._idle.pop() if self._idle else (None, None)
+                if connection is None:
+                    connection = self._connect()
+                elif connection.closed or (time.monotonic() - idle_since > self.health_check_interval and not self._is_healthy(connection)):
+                    connection.close()
+                    connection = None
+            connection.autocommit = autocommit
+            return connection
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, connection: psycopg2.extensions.connection, close: bool = False) -> None:
+        """
+        Gives back a connection checked out with getconn. Uncommitted work is rolled back.
+        """
+        try:
+            if not close and not connection.closed and connection.info.transaction_status != TRANSACTION_STATUS_UNKNOWN:
+                if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+                connection.autocommit = False
+        except psycopg2.Error:
+            close = True
+
+        try:
+            with self._lock:
+                keep = not (close or connection.closed or self._closed)
+                if keep:
+                    self._idle.append((connection, time.monotonic()))
+            if not keep and not connection.closed:
+                connection.close()
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, autocommit: bool = False) -> Iterator[psycopg2.extensions.connection]:
+        """
+        Checks out a connection for the duration of the block. Work not committed in the block is rolled back.
+        """
+        connection = self.getconn(autocommit=autocommit)
+        try:
+            yield connection
+        finally:
+            self.putconn(connection)
+
+    @contextmanager
+    def transaction(self) -> Iterator[psycopg2.extensions.connection]:
+        """
+        Checks out a connection and runs the block in a transaction: committed if the block ends normally,
+        rolled back if it raises.
+        """
+        with self.connection() as connection:
+            try:
+                yield connection
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+    def closeall(self) -> None:
+        """
+        Closes the idle connections and stops handing out new ones. Connections in use are closed when given back.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            connection.close()
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(database: Optional[str], credentials_dict: Optional[Dict[str, str]] = None, host: Optional[str] = None,
+             port: Optional[str] = None, dsn: Optional[str] = DATABASE_DSN, **pool_kwargs) -> ConnectionPool:
+    """
+    Returns the pool shared by every caller of the same database, user and server, creating it on first use.
+    pool_kwargs (min_size, max_size, timeout, health_check_interval) only apply when the pool is created.
+    """
+    key = (database, (credentials_dict or {}).get("username"), host, port, dsn)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(database, credentials_dict, host=host, port=port, dsn=dsn, **pool_kwargs)
+            _pools[key] = pool
+        return pool
+
+def close_pools() -> None:
+    """
+    Closes every pool created by get_pool.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.closeall()
+
 def connect_and_query(database: str, credentials_dict: Dict[str, str], query: str, columns: Union[str, list] = "query") -> pd.DataFrame:
     """
-    Connects to a database, executes a query, and returns the results as a DataFrame.
+    Executes a query on a pooled connection to a database and returns the results as a DataFrame.
 
     Parameters:
     ----------
@@ -63,29 +282,30 @@ def connect_and_query(database: str, credentials_dict: Dict[str, str], query: st
     pd.DataFrame
         DataFrame containing the query results.
     """
-    connection = connect_to_database(database=database, credentials_dict=credentials_dict)
-    
-    if not connection:
+    # only connection failures are reported, errors of the query itself (cancelled, deadlock...) are raised
+    try:
+        pool = get_pool(database, credentials_dict)
+        connection = pool.getconn()
+    except OperationalError as e:
+        _print_connection_error(e)
         return pd.DataFrame()  # Return an empty DataFrame if connection fails
-    
-    cursor = connection.cursor()
-    cursor.execute(query)
-    
-    if columns == "query":
-        columns = [desc[0] for desc in cursor.description]
-    elif not isinstance(columns, list):
-        columns = None
-    
-    result_df = pd.DataFrame(cursor.fetchall(), columns=columns)
-    
-    cursor.close()
-    connection.close()
-    
-    return result_df
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+
+            if columns == "query":
+                columns = [desc[0] for desc in cursor.description]
+            elif not isinstance(columns, list):
+                columns = None
+
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+    finally:
+        pool.putconn(connection)
 
 def alter_update_query(database: str, credentials_dict: Dict[str, str], alter_update_query: str) -> None:
     """
-    Connects to a database and executes an ALTER or UPDATE query.
+    Executes an ALTER or UPDATE query on a pooled connection to a database, in its own transaction.
 
     Parameters:
     ----------
@@ -96,16 +316,18 @@ def alter_update_query(database: str, credentials_dict: Dict[str, str], alter_up
     alter_update_query : str
         SQL query for ALTER or UPDATE operations.
     """
-    connection = connect_to_database(database=database, credentials_dict=credentials_dict)
-    
-    if not connection:
-        return  # If connection fails, exit function
-    
-    cursor = connection.cursor()
-    
-    with cursor:
-        cursor.execute(alter_update_query)
+    # only connection failures are reported, errors of the query itself (cancelled, deadlock...) are raised
+    try:
+        pool = get_pool(database, credentials_dict)
+        connection = pool.getconn()
+    except OperationalError as e:
+        _print_connection_error(e)
+        return
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(alter_update_query)
         connection.commit()
-    
-    cursor.close()
-    connection.close()
+    finally:
+        # rolls back if the query failed
+        pool.putconn(connection)
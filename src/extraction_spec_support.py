@@ -0,0 +1,194 @@
+# data processing
+import numpy as np
+
+# regular expressions
+import re
+
+# function typing
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class CardNodes(dict):
+    """
+    Nodes of a card, each evaluated once, the first time a field reads it, so nodes only read by
+    skipped fields are never evaluated. Reading a node whose evaluation failed raises the original
+    error, so only the fields that depend on it become NaN.
+    """
+
+    def __init__(self, card, node_functions: Optional[Dict[str, Callable[["CardNodes"], Any]]] = None):
+        super().__init__(card=card)
+        self.node_functions = node_functions or {}
+        self.errors: Dict[str, Exception] = {}
+
+    def __missing__(self, key: str):
+        if key not in self.errors:
+            if key not in self.node_functions:
+                raise KeyError(key)
+            try:
+                node = self.node_functions[key](self)
+            except Exception as e:
+                self.errors[key] = e
+            else:
+                self[key] = node
+                return node
+        raise self.errors[key]
+
+
+class RecordIndex:
+    """
+    Records already seen, by a fingerprint of key fields, with the fields that do not change between
+    pages (static fields) stored once per record. Used by ExtractionSpec.extract so the cards of a record
+    found again, e.g. an activity listed in every date window, only get their other fields extracted.
+
+    Every record gets an integer id, written next to the per-page fields, to join both tables back.
+    A record whose key fields could not all be read is never matched with another one.
+    """
+
+    def __init__(self, key_fields: List[str], static_fields: List[str]):
+        self.key_fields = list(key_fields)
+        self.static_fields = [field for field in static_fields if field not in self.key_fields]
+        self.record_ids: Dict[Hashable, int] = {}
+        self.records: Dict[str, list] = {"record_id": [], **{field: [] for field in [*self.key_fields, *self.static_fields]}}
+
+    def __len__(self) -> int:
+        return len(self.records["record_id"])
+
+    def get(self, key: tuple) -> Optional[int]:
+        if any(isinstance(value, float) and np.isnan(value) for value in key):
+            return None
+        return self.record_ids.get(key)
+
+    def add(self, key: tuple, static_values: Dict[str, Any]) -> int:
+        record_id = len(self)
+        if not any(isinstance(value, float) and np.isnan(value) for value in key):
+            self.record_ids[key] = record_id
+        self.records["record_id"].append(record_id)
+        for field, value in zip(self.key_fields, key):
+            self.records[field].append(value)
+        for field in self.static_fields:
+            self.records[field].append(static_values[field])
+        return record_id
+
+
+def url_regex_field(pattern: str) -> Callable[[str], str]:
+    """
+    Page field reading the first group of `pattern` from the page url. The regex is compiled once.
+    """
+    compiled_pattern = re.compile(pattern)
+    return lambda page_url: compiled_pattern.findall(page_url)[0]
+
+
+class ExtractionSpec:
+    """
+    Declarative description of the records of a scraped page, defined once and applied to every page.
+
+    - Page fields are functions of the page url (e.g. the city or the dates of the search), computed once per page.
+    - Card nodes are the elements or parsed values a card's fields read (e.g. a link and the json in one of
+      its attributes), evaluated at most once per card, when first read. Nodes can build on other nodes.
+    - Card fields are functions of the nodes, each evaluated once per card.
+
+    A field that raises is NaN. With empty_as_nan, falsy values (empty strings or lists) are NaN too.
+
+    Usage:
+    ------
+        spec = ExtractionSpec(
+            find_records=lambda page: page.find_all("div", {"class": "card"}),
+            page_fields={"city": url_regex_field(r"city=(\\w+)")},
+            card_nodes={"link": lambda nodes: nodes["card"].find("a")},
+            card_fields={"name": lambda nodes: nodes["link"]["title"], "url": lambda nodes: nodes["link"]["href"]}
+        )
+        records_dict = spec.extract(page_soup, page_url)
+    """
+
+    def __init__(self, find_records: Callable[[Any], list], card_fields: Dict[str, Callable[[CardNodes], Any]],
+                 page_fields: Optional[Dict[str, Callable[[str], Any]]] = None,
+                 card_nodes: Optional[Dict[str, Callable[[CardNodes], Any]]] = None,
+                 collect_nodes: Optional[Callable[[Any], CardNodes]] = None, empty_as_nan: bool = False):
+        """
+        Parameters:
+        ----------
+        find_records : callable
+            find_records(page) -> list of cards.
+        card_fields : dict
+            Field name -> function of the card nodes.
+        page_fields : dict, optional
+            Field name -> function of the page url.
+        card_nodes : dict, optional
+            Node name -> function of the card nodes. The card itself is the node "card".
+        collect_nodes : callable, optional
+            collect_nodes(card) -> CardNodes, used instead of card_nodes when every node is found in a
+            single walk of the card.
+        empty_as_nan : bool
+            Whether falsy field values are stored as NaN.
+        """
+        self.find_records = find_records
+        self.page_fields = page_fields or {}
+        self.card_nodes = card_nodes or {}
+        self.card_fields = card_fields
+        self.collect_nodes = collect_nodes or self._card_nodes
+        self.empty_as_nan = empty_as_nan
+
+    @property
+    def columns(self) -> List[str]:
+        return [*self.page_fields, *self.card_fields]
+
+    def _card_nodes(self, card) -> CardNodes:
+        return CardNodes(card, self.card_nodes)
+
+    def _evaluate(self, key: str, evaluate_field: Callable, argument, verbose: bool):
+        try:
+            value = evaluate_field(argument)
+        except Exception as e:
+            if verbose == True:
+                print(f"Error filling {key} due to {e}")
+            return np.nan
+        if self.empty_as_nan and not value:
+            return np.nan
+        return value
+
+    def extract(self, page, page_url: str, verbose: bool = False, index: Optional[RecordIndex] = None) -> Dict[str, list]:
+        """
+        Extracts the records of a page.
+
+        Parameters:
+        ----------
+        page : object
+            Parsed page, passed to find_records (a BeautifulSoup object or an lxml tree).
+        page_url : str
+            Url of the page, read by the page fields.
+        verbose : bool
+            Whether to print the fields that could not be filled.
+        index : RecordIndex, optional
+            Records seen so far. Their key and static fields are stored in the index instead of the
+            returned columns, and static fields are only extracted for cards of new records.
+
+        Returns:
+        -------
+        Dict[str, list]
+            One list per column (page fields first, then card fields), with one value per card. With an
+            index, the key and static fields are left out and a "record_id" column refers to the index.
+        """
+        cards = self.find_records(page)
+        index_fields = set(index.key_fields + index.static_fields) if index is not None else set()
+        columns = [key for key in self.columns if key not in index_fields] + (["record_id"] if index is not None else [])
+        records_dict = {key: [] for key in columns}
+        if not cards:
+            return records_dict
+
+        for key, evaluate_field in self.page_fields.items():
+            records_dict[key] = [self._evaluate(key, evaluate_field, page_url, verbose)] * len(cards)
+
+        card_fields = [(key, evaluate_field, records_dict[key]) for key, evaluate_field in self.card_fields.items() if key not in index_fields]
+        for card in cards:
+            nodes = self.collect_nodes(card)
+            for key, evaluate_field, values in card_fields:
+                values.append(self._evaluate(key, evaluate_field, nodes, verbose))
+
+            if index is not None:
+                key = tuple(self._evaluate(field, self.card_fields[field], nodes, verbose) for field in index.key_fields)
+                record_id = index.get(key)
+                if record_id is None:
+                    record_id = index.add(key, {field: self._evaluate(field, self.card_fields[field], nodes, verbose) for field in index.static_fields})
+                records_dict["record_id"].append(record_id)
+
+        return records_dict
@@ -0,0 +1,119 @@
+# data processing
+import pandas as pd
+import pyarrow as pa
+
+# work with dates and time
+import datetime
+
+# function typing
+from typing import List
+
+
+# column types of the flattened itineraries, as written to itineraries.parquet
+ITINERARIES_SCHEMA = pa.schema([
+    ("itinerary_id", pa.string()),
+    ("query_date", pa.timestamp("ns")),
+    ("score", pa.float64()),
+    ("duration", pa.int64()),
+    ("price", pa.int64()),
+    ("price_currency", pa.string()),
+    ("stops", pa.int64()),
+    ("departure", pa.timestamp("ns")),
+    ("arrival", pa.timestamp("ns")),
+    ("company", pa.string()),
+    ("self_transfer", pa.bool_()),
+    ("fare_is_change_allowed", pa.bool_()),
+    ("fare_is_partially_changeable", pa.bool_()),
+    ("fare_is_cancellation_allowed", pa.bool_()),
+    ("fare_is_partially_refundable", pa.bool_()),
+    ("origin_airport", pa.string()),
+    ("destination_airport", pa.string()),
+    ("origin_airport_code", pa.string()),
+    ("destination_airport_code", pa.string()),
+    ("origin_airport_entityid", pa.string()),
+    ("destination_airport_entityid", pa.string())
+])
+
+FARE_POLICY_COLUMNS = {
+    "fare_is_change_allowed": "isChangeAllowed",
+    "fare_is_partially_changeable": "isPartiallyChangeable",
+    "fare_is_cancellation_allowed": "isCancellationAllowed",
+    "fare_is_partially_refundable": "isPartiallyRefundable"
+}
+
+
+def _to_str(value):
+    return None if value is None else str(value)
+
+
+def _to_int64(values: list) -> pa.Array:
+    return pa.array(pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").astype("Int64"), type=pa.int64())
+
+
+def _to_timestamp(values: list) -> pa.Array:
+    return pa.array(pd.to_datetime(pd.Series(values, dtype=object), format="ISO8601", errors="coerce"), type=pa.timestamp("ns"))
+
+
+def flatten_itineraries(itineraries_dict_list: List[dict]) -> pa.Table:
+    """
+    Flattens raw Sky Scrapper itineraries into an Arrow table with the columns of extract_flight_info.
+
+    Nested fields are gathered into one list per column in a single pass over the itineraries, then
+    numbers, prices and datetimes are parsed for the whole column at once. Missing fields become nulls.
+    All rows share the same query_date, the time the batch was flattened.
+
+    Returns:
+    -------
+    pa.Table
+        Table following ITINERARIES_SCHEMA, with one row per itinerary.
+    """
+    columns = {name: [] for name in ITINERARIES_SCHEMA.names if name != "query_date"}
+    prices_formatted = []
+
+    for itinerary in itineraries_dict_list:
+        leg = (itinerary.get("legs") or [{}])[0]
+        origin = leg.get("origin") or {}
+        destination = leg.get("destination") or {}
+        fare_policy = itinerary.get("farePolicy") or {}
+        marketing_carriers = (leg.get("carriers") or {}).get("marketing") or [{}]
+
+        columns["itinerary_id"].append(itinerary.get("id"))
+        columns["score"].append(itinerary.get("score"))
+        columns["duration"].append(leg.get("durationInMinutes"))
+        columns["stops"].append(leg.get("stopCount"))
+        columns["departure"].append(leg.get("departure"))
+        columns["arrival"].append(leg.get("arrival"))
+        columns["company"].append(marketing_carriers[0].get("name"))
+        columns["self_transfer"].append(itinerary.get("isSelfTransfer"))
+        for column, fare_policy_key in FARE_POLICY_COLUMNS.items():
+            columns[column].append(fare_policy.get(fare_policy_key))
+        columns["origin_airport"].append(origin.get("name"))
+        columns["destination_airport"].append(destination.get("name"))
+        columns["origin_airport_code"].append(origin.get("displayCode"))
+        columns["destination_airport_code"].append(destination.get("displayCode"))
+        columns["origin_airport_entityid"].append(_to_str(origin.get("entityId")))
+        columns["destination_airport_entityid"].append(_to_str(destination.get("entityId")))
+        prices_formatted.append((itinerary.get("price") or {}).get("formatted"))
+
+    # formatted prices look like "1,049 €": amount and currency split once for the whole column
+    price_parts = pd.Series(prices_formatted, dtype="string").str.split(expand=True).reindex(columns=[0, 1]).astype("string")
+    columns["price"] = price_parts[0].str.replace(",", "").tolist()
+    columns["price_currency"] = price_parts[1].tolist()
+
+    n_rows = len(itineraries_dict_list)
+    arrays = {
+        "itinerary_id": pa.array(columns["itinerary_id"], type=pa.string()),
+        "query_date": pa.array([datetime.datetime.now()] * n_rows, type=pa.timestamp("ns")),
+        "score": pa.array(pd.to_numeric(pd.Series(columns["score"], dtype=object), errors="coerce"), type=pa.float64()),
+        "duration": _to_int64(columns["duration"]),
+        "price": _to_int64(columns["price"]),
+        "price_currency": pa.array(columns["price_currency"], type=pa.string(), from_pandas=True),
+        "stops": _to_int64(columns["stops"]),
+        "departure": _to_timestamp(columns["departure"]),
+        "arrival": _to_timestamp(columns["arrival"])
+    }
+    for name in ITINERARIES_SCHEMA.names:
+        if name not in arrays:
+            arrays[name] = pa.array(columns[name], type=ITINERARIES_SCHEMA.field(name).type, from_pandas=True)
+
+    return pa.Table.from_arrays([arrays[name] for name in ITINERARIES_SCHEMA.names], schema=ITINERARIES_SCHEMA)
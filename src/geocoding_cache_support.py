@@ -0,0 +1,320 @@
+# local storage
+import sqlite3
+
+# work with asynchronicity
+import asyncio
+import aiohttp
+
+# work with concurrency
+import threading
+
+# work with time
+import time
+
+# environment variables
+import dotenv
+import os
+dotenv.load_dotenv()
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GEOCODING_CACHE_PATH = os.getenv("GEOCODING_CACHE_PATH", "../data/cache/geocoding.sqlite")
+
+# shared rate limits and retries
+from .rate_limit_support import get_json_with_retries
+
+# function typing
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+GOOGLE_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+ADDRESS_NOT_FOUND = "Address not found"
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 8) -> str:
+    """
+    Geohash of a coordinate: nearby points share a prefix, and 8 characters is a cell of about 38 x 19 m.
+    """
+    latitude_range, longitude_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, bits, n_bits, even_bit = [], 0, 0, True
+    while len(geohash) < precision:
+        value_range, value = (longitude_range, longitude) if even_bit else (latitude_range, latitude)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even_bit = not even_bit
+        n_bits += 1
+        if n_bits == 5:
+            geohash.append(_GEOHASH_ALPHABET[bits])
+            bits, n_bits = 0, 0
+    return "".join(geohash)
+
+
+class GeocodingCache:
+    """
+    SQLite store of geocoding results in both directions, kept between runs.
+
+    Forward lookups (city and country to coordinates) are stored by normalized query. Reverse lookups
+    (coordinates to address) are stored by bucket, so activities at the same venue a few metres apart
+    share one lookup: coordinates are either rounded to `precision` decimals (4 decimals is about 11 m)
+    or bucketed by geohash cell. Queries and coordinates with no result are stored too, so they are
+    not asked again.
+    """
+
+    def __init__(self, path: str = GEOCODING_CACHE_PATH, bucketing: str = "round", precision: int = 4,
+                 geohash_precision: int = 8, ttl: Optional[float] = None):
+        """
+        Parameters:
+        ----------
+        path : str
+            SQLite file. Use ":memory:" for a cache living only in this process.
+        bucketing : str
+            "round" or "geohash", how reverse lookups are grouped.
+        precision : int
+            Decimals coordinates are rounded to with "round" bucketing.
+        geohash_precision : int
+            Geohash length with "geohash" bucketing.
+        ttl : float, optional
+            Seconds a result stays valid. By default results never expire.
+        """
+        if bucketing not in ("round", "geohash"):
+            raise ValueError(f"Unknown bucketing '{bucketing}', use 'round' or 'geohash'")
+
+        self.path = path
+        self.bucketing = bucketing
+        self.precision = precision
+        self.geohash_precision = geohash_precision
+        self.ttl = ttl
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS forward (
+                    query TEXT PRIMARY KEY,
+                    latitude TEXT,
+                    longitude TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS reverse (
+                    bucket TEXT PRIMARY KEY,
+                    address TEXT,
+                    latitude REAL NOT NULL,
+                    longitude REAL NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+
+    @staticmethod
+    def forward_key(city: str, country: str) -> str:
+        return f"{city.strip().lower()}|{country.strip().lower()}"
+
+    def reverse_key(self, latitude: float, longitude: float) -> str:
+        if self.bucketing == "geohash":
+            return geohash_encode(float(latitude), float(longitude), self.geohash_precision)
+        return f"{round(float(latitude), self.precision):.{self.precision}f},{round(float(longitude), self.precision):.{self.precision}f}"
+
+    def _is_fresh(self, created_at: float) -> bool:
+        return self.ttl is None or time.time() - created_at <= self.ttl
+
+    def get_forward(self, city: str, country: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """
+        Returns the stored (latitude, longitude) of the city, (None, None) if it is known to have no
+        result, or None if it was never looked up.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT latitude, longitude, created_at FROM forward WHERE query = ?",
+                                           (self.forward_key(city, country),)).fetchone()
+        if row is None or not self._is_fresh(row[2]):
+            return None
+        return row[0], row[1]
+
+    def set_forward(self, city: str, country: str, latitude: Optional[str], longitude: Optional[str]) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO forward (query, latitude, longitude, created_at) VALUES (?, ?, ?, ?)",
+                                     (self.forward_key(city, country), latitude, longitude, time.time()))
+
+    def get_reverse(self, latitude: float, longitude: float) -> Optional[str]:
+        """
+        Returns the stored address of the bucket of the coordinates, or None if it was never looked up.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT address, created_at FROM reverse WHERE bucket = ?",
+                                           (self.reverse_key(latitude, longitude),)).fetchone()
+        if row is None or not self._is_fresh(row[1]):
+            return None
+        return row[0]
+
+    def set_reverse(self, latitude: float, longitude: float, address: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO reverse (bucket, address, latitude, longitude, created_at) VALUES (?, ?, ?, ?, ?)",
+                                     (self.reverse_key(latitude, longitude), address, float(latitude), float(longitude), time.time()))
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class Geocoder:
+    """
+    Forward (Nominatim) and reverse (Google) geocoding through a GeocodingCache, over a single pooled session.
+
+    Lookups answered by the cache make no request. Concurrent lookups of the same query or reverse
+    bucket share a single request in flight, and at most max_concurrency requests run at once, on
+    top of the provider rate limits of rate_limit_support.
+
+    Usage:
+    ------
+        async with Geocoder(GeocodingCache()) as geocoder:
+            addresses = await geocoder.reverse_many(coordinates)
+    """
+
+    def __init__(self, cache: Optional[GeocodingCache] = None, max_concurrency: int = 10, google_api_key: Optional[str] = GOOGLE_API_KEY,
+                 forward_url: str = NOMINATIM_URL, reverse_url: str = GOOGLE_GEOCODE_URL, timeout: float = 30):
+        self.cache = cache or GeocodingCache()
+        self.max_concurrency = max_concurrency
+        self.google_api_key = google_api_key
+        self.forward_url = forward_url
+        self.reverse_url = reverse_url
+        self.timeout = timeout
+
+        self.stats = {"forward_cached": 0, "forward_requests": 0, "reverse_cached": 0, "reverse_requests": 0, "in_flight_shared": 0}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._session = None
+        self._semaphore = None
+
+    async def open(self) -> "Geocoder":
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self) -> "Geocoder":
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def _shared(self, key: str, request):
+        # callers of a key already requested wait for that request instead of sending another
+        if key in self._in_flight:
+            self.stats["in_flight_shared"] += 1
+            # shielded so a waiter being cancelled does not cancel the request for the others
+            return await asyncio.shield(self._in_flight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await request()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # retrieved here so an unawaited future does not log it
+            future.exception()
+            raise
+        finally:
+            # if this task was cancelled the waiters are cancelled too, instead of waiting forever
+            if not future.done():
+                future.cancel()
+            del self._in_flight[key]
+
+    async def forward(self, city: str, country: str = "Spain") -> Tuple[str, Optional[str], Optional[str]]:
+        """
+        Returns (city, latitude, longitude) of the city, with None coordinates if it was not found.
+        """
+        cached = self.cache.get_forward(city, country)
+        if cached is not None:
+            self.stats["forward_cached"] += 1
+            return (city, *cached)
+
+        async def request():
+            if self._session is None:
+                await self.open()
+            params = {"city": city, "country": country, "format": "json", "limit": 1}
+            async with self._semaphore:
+                self.stats["forward_requests"] += 1
+                status, data = await get_json_with_retries(self._session, self.forward_url, provider="nominatim", params=params)
+
+            if status != 200:
+                print(f"Request failed with status {status} for {city}")
+                return None, None
+            latitude, longitude = (data[0]["lat"], data[0]["lon"]) if data else (None, None)
+            self.cache.set_forward(city, country, latitude, longitude)
+            return latitude, longitude
+
+        return (city, *await self._shared(f"forward:{self.cache.forward_key(city, country)}", request))
+
+    async def reverse(self, latitude: float, longitude: float) -> Optional[str]:
+        """
+        Returns the address of the coordinates, ADDRESS_NOT_FOUND if the provider has none, or None if the request failed.
+        """
+        cached = self.cache.get_reverse(latitude, longitude)
+        if cached is not None:
+            self.stats["reverse_cached"] += 1
+            return cached
+
+        async def request():
+            if self._session is None:
+                await self.open()
+            params = {"latlng": f"{latitude},{longitude}"}
+            if self.google_api_key:
+                params["key"] = self.google_api_key
+            async with self._semaphore:
+                self.stats["reverse_requests"] += 1
+                status, data = await get_json_with_retries(self._session, self.reverse_url, provider="google_geocoding", params=params)
+
+            if status != 200 or not data:
+                print(f"Request failed with status {status} for {latitude}, {longitude}")
+                return None
+            if data.get("status") == "OK":
+                address = data["results"][0]["formatted_address"]
+            elif data.get("status") == "ZERO_RESULTS":
+                address = ADDRESS_NOT_FOUND
+            else:
+                # quota or key errors are not stored, so they are asked again
+                print(f"Geocoding status {data.get('status')} for {latitude}, {longitude}")
+                return None
+            self.cache.set_reverse(latitude, longitude, address)
+            return address
+
+        return await self._shared(f"reverse:{self.cache.reverse_key(latitude, longitude)}", request)
+
+    async def forward_many(self, cities: Iterable[str], country: str = "Spain") -> List[Tuple[str, Optional[str], Optional[str]]]:
+        return await asyncio.gather(*(self.forward(city, country) for city in cities))
+
+    async def reverse_many(self, coordinates: Iterable[Tuple[float, float]]) -> List[Optional[str]]:
+        """
+        Returns the address of every (latitude, longitude), in order.
+        """
+        return await asyncio.gather(*(self.reverse(latitude, longitude) for latitude, longitude in coordinates))
+
+
+async def get_addresses(coordinates: Iterable[Tuple[float, float]], cache: Optional[GeocodingCache] = None,
+                        max_concurrency: int = 10) -> List[Optional[str]]:
+    """
+    Reverse geocodes every (latitude, longitude) through the geocoding cache, see Geocoder.reverse_many.
+    """
+    async with Geocoder(cache, max_concurrency=max_concurrency) as geocoder:
+        addresses = await geocoder.reverse_many(coordinates)
+    print(f"Addresses: {geocoder.stats['reverse_cached']} from cache, {geocoder.stats['reverse_requests']} requested, "
+          f"{geocoder.stats['in_flight_shared']} shared with a request in flight")
+    return addresses
@@ -0,0 +1,270 @@
+# local storage
+import sqlite3
+import mmap
+
+# compression
+import gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# content hashing
+import hashlib
+
+# work with concurrency
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# work with dates and time
+import time
+
+# work with files
+import os
+
+# function typing
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+
+class ArchivedPage(NamedTuple):
+    page_id: int
+    source: str
+    url: str
+    captured_at: float
+    content_hash: str
+    segment: int
+    offset: int
+    length: int
+    compression: str
+
+
+def _compress(html_bytes: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(html_bytes)
+    return gzip.compress(html_bytes, compresslevel=6)
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class HtmlArchive:
+    """
+    Append-only archive of raw scraped pages, so parsing can be re-run without scraping again.
+
+    Every page is compressed on its own and appended to the current segment file, which is rolled over
+    once it reaches `segment_max_bytes`. A SQLite index records the source, url, capture time, sha256 of
+    the html and where its bytes are. Pages already archived with the same content are not written again.
+    Reading maps segments into memory, so pages are streamed back without loading whole segments.
+
+    Usage:
+    ------
+        archive = HtmlArchive("../data/html_archive/")
+        archive.append(page_html, booking_url, source="booking")
+        for url, page_html in archive.iter_pages(source="booking"):
+            ...
+    """
+
+    def __init__(self, path: str = "../data/html_archive/", compression: Optional[str] = None,
+                 segment_max_bytes: int = 256 * 1024 ** 2):
+        """
+        Parameters:
+        ----------
+        path : str
+            Folder holding the segment files and index.sqlite. It is created if it does not exist.
+        compression : str, optional
+            "zstd" or "gzip" for the pages appended from now on. Defaults to zstd if the zstandard
+            package is installed, otherwise gzip. Archived pages keep the compression they were written with.
+        segment_max_bytes : int
+            Size after which a new segment file is started.
+        """
+        compression = compression or ("zstd" if zstandard is not None else "gzip")
+        if compression not in ("zstd", "gzip"):
+            raise ValueError(f"Unknown compression '{compression}', use 'zstd' or 'gzip'")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("zstd compression needs the zstandard package")
+
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.compression = compression
+        self.segment_max_bytes = segment_max_bytes
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(path, "index.sqlite"), timeout=30, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    page_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source TEXT,
+                    url TEXT NOT NULL,
+                    captured_at REAL NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    segment INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    compression TEXT NOT NULL
+                )
+            """)
+            self._connection.execute("CREATE INDEX IF NOT EXISTS pages_content_hash ON pages (content_hash)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS pages_source_captured_at ON pages (source, captured_at)")
+            last_segment = self._connection.execute("SELECT MAX(segment) FROM pages").fetchone()[0]
+
+        self._segment = last_segment or 0
+        self._segment_file = None
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, f"segment-{segment:05d}.bin")
+
+    def _open_segment(self):
+        if self._segment_file is None:
+            self._segment_file = open(self.segment_path(self._segment), "ab")
+        if self._segment_file.tell() >= self.segment_max_bytes:
+            self._segment_file.close()
+            self._segment += 1
+            self._segment_file = open(self.segment_path(self._segment), "ab")
+        return self._segment_file
+
+    def append(self, page_html: str, url: str, source: Optional[str] = None, captured_at: Optional[float] = None) -> int:
+        """
+        Archives a page and returns its page id. Thread safe, so concurrent fetchers can share the archive.
+        """
+        html_bytes = page_html.encode("utf-8")
+        content_hash = hashlib.sha256(html_bytes).hexdigest()
+        captured_at = captured_at or time.time()
+
+        with self._lock:
+            location = self._connection.execute(
+                "SELECT segment, offset, length, compression FROM pages WHERE content_hash = ? LIMIT 1", (content_hash,)
+            ).fetchone()
+
+            if location is None:
+                data = _compress(html_bytes, self.compression)
+                segment_file = self._open_segment()
+                offset = segment_file.tell()
+                segment_file.write(data)
+                segment_file.flush()
+                location = (self._segment, offset, len(data), self.compression)
+
+            with self._connection:
+                cursor = self._connection.execute(
+                    "INSERT INTO pages (source, url, captured_at, content_hash, segment, offset, length, compression) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (source, url, captured_at, content_hash, *location)
+                )
+            return cursor.lastrowid
+
+    def pages(self, source: Optional[str] = None, since: Optional[float] = None, url_contains: Optional[str] = None,
+              latest_only: bool = True) -> List[ArchivedPage]:
+        """
+        Returns the index entries of the archived pages, ordered by their position in the segments.
+
+        Parameters:
+        ----------
+        source : str, optional
+            Keep only pages of this source, e.g. "booking" or "civitatis".
+        since : float, optional
+            Keep only pages captured at or after this epoch time.
+        url_contains : str, optional
+            Keep only pages whose url contains this text.
+        latest_only : bool
+            Keep only the latest capture of every url.
+        """
+        conditions, params = [], []
+        if source is not None:
+            conditions.append("source = ?")
+            params.append(source)
+        if since is not None:
+            conditions.append("captured_at >= ?")
+            params.append(since)
+        if url_contains is not None:
+            conditions.append("instr(url, ?) > 0")
+            params.append(url_contains)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        query = f"SELECT * FROM pages {where}"
+        if latest_only:
+            query = f"SELECT * FROM ({query}) AS filtered WHERE page_id IN (SELECT MAX(page_id) FROM ({query}) GROUP BY url)"
+            params = params * 2
+
+        with self._lock:
+            rows = self._connection.execute(f"{query} ORDER BY segment, offset", params).fetchall()
+        return [ArchivedPage(*row) for row in rows]
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._segment_file is not None:
+                self._segment_file.flush()
+
+    def iter_pages(self, source: Optional[str] = None, since: Optional[float] = None, url_contains: Optional[str] = None,
+                   latest_only: bool = True) -> Iterator[Tuple[str, str]]:
+        """
+        Streams (url, html) of the archived pages, in segment order, with the filters of `pages`.
+        """
+        self.flush()
+        yield from read_archived_pages(self.path, self.pages(source, since, url_contains, latest_only))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._segment_file is not None:
+                self._segment_file.close()
+                self._segment_file = None
+            self._connection.close()
+
+    def __enter__(self) -> "HtmlArchive":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def read_archived_pages(archive_path: str, archived_pages: List[ArchivedPage]) -> Iterator[Tuple[str, str]]:
+    """
+    Streams (url, html) of the given index entries, mapping each segment into memory once.
+    Works without an HtmlArchive instance, so worker processes can read pages by themselves.
+    """
+    segment_maps: Dict[int, mmap.mmap] = {}
+    try:
+        for archived_page in archived_pages:
+            if archived_page.segment not in segment_maps:
+                with open(os.path.join(archive_path, f"segment-{archived_page.segment:05d}.bin"), "rb") as segment_file:
+                    segment_maps[archived_page.segment] = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+            data = segment_maps[archived_page.segment][archived_page.offset:archived_page.offset + archived_page.length]
+            yield archived_page.url, _decompress(data, archived_page.compression).decode("utf-8")
+    finally:
+        for segment_map in segment_maps.values():
+            segment_map.close()
+
+
+def _apply_to_archived_batch(archive_path: str, archived_pages: List[ArchivedPage], page_function, kwargs: dict) -> list:
+    return [page_function(page_html, url, **kwargs) for url, page_html in read_archived_pages(archive_path, archived_pages)]
+
+
+def map_archived_pages(archive: HtmlArchive, page_function, archived_pages: Optional[List[ArchivedPage]] = None,
+                       batch_size: int = 16, max_workers: Optional[int] = None, **kwargs) -> list:
+    """
+    Applies page_function(page_html, url, **kwargs) to archived pages in a process pool and returns the
+    results in index order. Workers receive batches of index entries and read the pages from the segments
+    themselves, so html is never pickled between processes.
+
+    Parameters:
+    ----------
+    archive : HtmlArchive
+        Archive to read from.
+    page_function : callable
+        Module-level function (so it can be pickled) taking the html and url of a page.
+    archived_pages : list, optional
+        Index entries to process, e.g. from archive.pages(source="booking"). Defaults to every latest capture.
+    batch_size : int
+        Pages read and processed by a worker per task.
+    max_workers : int, optional
+        Worker processes. Defaults to the number of cores.
+    """
+    archive.flush()
+    archived_pages = archive.pages() if archived_pages is None else archived_pages
+    batches = [archived_pages[batch_start:batch_start + batch_size] for batch_start in range(0, len(archived_pages), batch_size)]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_apply_to_archived_batch, archive.path, batch, page_function, kwargs) for batch in batches]
+        return [result for future in futures for result in future.result()]
@@ -0,0 +1,139 @@
+# data processing
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# work with files
+import os
+import glob
+
+# work with time
+import datetime
+
+# function typing
+from typing import List, Optional, Union
+
+
+class ParquetPartWriter:
+    """
+    Buffers rows and writes them as numbered Parquet part files in `output_dir` every `rows_per_part` rows.
+
+    Each part is written to a temporary file and renamed when complete, so a crash never leaves a
+    half written part behind and every flushed part stays readable, e.g. with pd.read_parquet(output_dir).
+    Every part follows `schema`, so parts can be read together or consolidated into a single file.
+    """
+
+    def __init__(self, output_dir: str, schema: pa.Schema, rows_per_part: int = 5000, prefix: Optional[str] = None):
+        """
+        Parameters:
+        ----------
+        output_dir : str
+            Folder where part files are written. It is created if it does not exist.
+        schema : pa.Schema
+            Schema every part is converted to.
+        rows_per_part : int
+            Rows buffered before a part is written. Bounds the memory used by the buffer.
+        prefix : str, optional
+            Prefix of the part file names. Defaults to the time the writer was created, so parts
+            of different runs do not overwrite each other.
+        """
+        self.output_dir = output_dir
+        self.schema = schema
+        self.rows_per_part = rows_per_part
+        self.prefix = prefix or datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+
+        self.parts: List[str] = []
+        self.n_rows_written = 0
+
+        self._buffer: List[pa.Table] = []
+        self._n_rows_buffered = 0
+
+        os.makedirs(output_dir, exist_ok=True)
+
+    def append(self, data: Union[pd.DataFrame, pa.Table]) -> None:
+        if isinstance(data, pd.DataFrame):
+            data = pa.Table.from_pandas(data, schema=self.schema, preserve_index=False)
+        else:
+            data = data.select(self.schema.names).cast(self.schema)
+
+        if data.num_rows == 0:
+            return
+
+        self._buffer.append(data)
+        self._n_rows_buffered += data.num_rows
+
+        if self._n_rows_buffered >= self.rows_per_part:
+            self.flush()
+
+    def flush(self) -> Optional[str]:
+        if not self._buffer:
+            return None
+
+        table = pa.concat_tables(self._buffer)
+        part_path = os.path.join(self.output_dir, f"part-{self.prefix}-{len(self.parts):05d}.parquet")
+        temporary_path = part_path + ".tmp"
+
+        pq.write_table(table, temporary_path)
+        os.replace(temporary_path, part_path)
+
+        self.parts.append(part_path)
+        self.n_rows_written += table.num_rows
+        self._buffer = []
+        self._n_rows_buffered = 0
+        return part_path
+
+    def close(self) -> List[str]:
+        self.flush()
+        return self.parts
+
+    def __enter__(self) -> "ParquetPartWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # keep what was already fetched even if the crawl failed
+        self.close()
+
+
+def list_parquet_parts(parts_dir: str) -> List[str]:
+    """
+    Returns the complete part files in parts_dir, of every run, ordered by name (and so by run and part number).
+    Parts still being written (.tmp) are left out.
+    """
+    return sorted(glob.glob(os.path.join(parts_dir, "part-*.parquet")))
+
+
+def consolidate_parquet_parts(parts: List[str], output_path: str, schema: pa.Schema, remove_parts: bool = True,
+                              append: bool = False) -> int:
+    """
+    Copies the row groups of every part into a single Parquet file, one row group at a time,
+    so memory does not grow with the number of parts.
+
+    With append, the row groups of an existing output_path are copied first, so the parts are added
+    to it instead of replacing it, e.g. for runs that only fetch a delta.
+
+    Returns:
+    -------
+    int
+        Number of rows written to output_path, the existing ones included.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    temporary_path = output_path + ".tmp"
+
+    sources = ([output_path] if append and os.path.exists(output_path) else []) + list(parts)
+
+    n_rows = 0
+    with pq.ParquetWriter(temporary_path, schema) as writer:
+        for part in sources:
+            part_file = pq.ParquetFile(part)
+            for row_group in range(part_file.num_row_groups):
+                table = part_file.read_row_group(row_group)
+                writer.write_table(table.cast(schema))
+                n_rows += table.num_rows
+
+    os.replace(temporary_path, output_path)
+
+    if remove_parts:
+        for part in parts:
+            os.remove(part)
+
+    return n_rows
@@ -0,0 +1,272 @@
+# work with asynchronicity
+import asyncio
+import aiohttp
+
+# work with threads
+import threading
+
+# work with time
+import time
+import datetime
+from email.utils import parsedate_to_datetime
+
+# random jitter
+import random
+
+# function typing
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+# requests per second and burst size for every provider. Nominatim's usage policy allows 1 request per second.
+PROVIDER_LIMITS = {
+    "sky_scrapper": {"rate": 5, "capacity": 5},
+    "nominatim": {"rate": 1, "capacity": 1},
+    "open_meteo": {"rate": 10, "capacity": 10},
+    "google_geocoding": {"rate": 40, "capacity": 40},
+    "civitatis": {"rate": 5, "capacity": 5},
+    "default": {"rate": 10, "capacity": 10}
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket. Tokens refill continuously at `rate` per second up to `capacity`,
+    and every request takes one token, waiting for it if the bucket is empty.
+
+    The bucket can also be paused, e.g. when the provider answers with a Retry-After header,
+    so that every caller sharing it backs off, not only the one that was throttled.
+
+    The bucket is safe to share across threads, each running its own event loop: tokens are refilled
+    and taken under a lock, so the rate holds across all of them.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, tokens: float = 1) -> None:
+        while True:
+            # the lock is never held while sleeping
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= tokens:
+                        self._tokens -= tokens
+                        return
+                    wait = (tokens - self._tokens) / self.rate
+
+            await asyncio.sleep(wait)
+
+
+class RetryBudget:
+    """
+    Caps retries as a share of the traffic sent to a provider. Every request deposits
+    `retry_ratio` tokens and every retry withdraws one, so a provider that is failing
+    hard cannot turn a crawl into a retry storm. `min_retries` is both the initial
+    balance and the most retries that can be saved up. Safe to share across threads.
+    """
+
+    def __init__(self, retry_ratio: float = 0.2, min_retries: int = 10):
+        self.retry_ratio = retry_ratio
+        self.max_balance = max(min_retries, 1)
+        self._balance = float(min_retries)
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._balance = min(self.max_balance, self._balance + self.retry_ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._balance >= 1:
+                self._balance -= 1
+                return True
+            return False
+
+
+class ProviderRateLimiter:
+    """
+    Rate limit, backoff and retry budget shared by every call made to the same provider, from any thread
+    or event loop.
+    """
+
+    def __init__(self, rate: float, capacity: float, max_retries: int = 5, base_delay: float = 0.5,
+                 max_delay: float = 60, retry_ratio: float = 0.2, min_retries: int = 10):
+        """
+        Parameters:
+        ----------
+        rate : float
+            Requests per second allowed on average.
+        capacity : float
+            Maximum burst of requests.
+        max_retries : int
+            Maximum retries for a single request.
+        base_delay : float
+            Seconds of the first backoff, doubled on every retry.
+        max_delay : float
+            Upper bound in seconds for a single backoff.
+        retry_ratio : float
+            Retries earned per request sent, see RetryBudget.
+        min_retries : int
+            Retries available before any request has been sent.
+        """
+        self.bucket = TokenBucket(rate, capacity)
+        self.budget = RetryBudget(retry_ratio=retry_ratio, min_retries=min_retries)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Seconds to wait before retry number `attempt` (starting at 0). A Retry-After value
+        sent by the provider takes precedence, otherwise full-jitter exponential backoff is used.
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+_provider_limiters: Dict[str, ProviderRateLimiter] = {}
+_provider_limiters_lock = threading.Lock()
+
+
+def get_provider_limiter(provider: str) -> ProviderRateLimiter:
+    """
+    Returns the limiter shared by every caller of `provider`, creating it from PROVIDER_LIMITS on first use.
+    """
+    with _provider_limiters_lock:
+        if provider not in _provider_limiters:
+            limits = PROVIDER_LIMITS.get(provider, PROVIDER_LIMITS["default"])
+            _provider_limiters[provider] = ProviderRateLimiter(**limits)
+        return _provider_limiters[provider]
+
+
+def configure_provider(provider: str, rate: float, capacity: Optional[float] = None, **kwargs) -> ProviderRateLimiter:
+    """
+    Replaces the limiter of `provider`, e.g. to match the quota of a paid plan.
+    Extra keyword arguments are passed to ProviderRateLimiter.
+    """
+    limiter = ProviderRateLimiter(rate=rate, capacity=capacity or rate, **kwargs)
+    with _provider_limiters_lock:
+        _provider_limiters[provider] = limiter
+    return limiter
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date, into seconds.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_datetime = parsedate_to_datetime(value)
+        return max((retry_datetime - datetime.datetime.now(retry_datetime.tzinfo)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _get_with_retries(session: aiohttp.ClientSession, url: str, read_body: Callable[[aiohttp.ClientResponse], Awaitable[Any]],
+                            provider: str = "default", params: Optional[dict] = None,
+                            headers: Optional[dict] = None) -> Tuple[int, Optional[Any]]:
+    limiter = get_provider_limiter(provider)
+    limiter.budget.deposit()
+
+    attempt = 0
+    while True:
+        await limiter.bucket.acquire()
+        retry_after = None
+        try:
+            async with session.get(url, params=params, headers=headers) as response:
+                if response.status == 200:
+                    return response.status, await read_body(response)
+
+                if response.status not in RETRY_STATUSES:
+                    return response.status, None
+
+                status = response.status
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt >= limiter.max_retries or not limiter.budget.withdraw():
+                raise
+            status = None
+
+        else:
+            if attempt >= limiter.max_retries or not limiter.budget.withdraw():
+                return status, None
+
+        delay = limiter.backoff_delay(attempt, retry_after)
+        if status == 429:
+            # stop every caller of the provider, not only this one
+            limiter.bucket.pause(delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def _read_json(response: aiohttp.ClientResponse) -> Optional[Any]:
+    try:
+        return await response.json(content_type=None)
+    except ValueError:
+        return None
+
+
+async def _read_text(response: aiohttp.ClientResponse) -> str:
+    return await response.text()
+
+
+async def get_json_with_retries(session: aiohttp.ClientSession, url: str, provider: str = "default",
+                                params: Optional[dict] = None, headers: Optional[dict] = None) -> Tuple[int, Optional[Any]]:
+    """
+    Sends a GET request through the provider's token bucket and retries throttled (429),
+    server error and connection error responses with backoff while the retry budget allows it.
+
+    Parameters:
+    ----------
+    session : aiohttp.ClientSession
+        Session used to send the request.
+    url : str
+        Url to request.
+    provider : str
+        Name of the provider whose limiter is used, see PROVIDER_LIMITS.
+    params : dict, optional
+        Query parameters.
+    headers : dict, optional
+        Request headers.
+
+    Returns:
+    -------
+    Tuple[int, Optional[Any]]
+        Status of the last response and its decoded JSON body, or None if the status is not 200
+        or the body is not valid JSON.
+        Raises the last connection error if every attempt failed to connect.
+    """
+    return await _get_with_retries(session, url, _read_json, provider=provider, params=params, headers=headers)
+
+
+async def get_text_with_retries(session: aiohttp.ClientSession, url: str, provider: str = "default",
+                                params: Optional[dict] = None, headers: Optional[dict] = None) -> Tuple[int, Optional[str]]:
+    """
+    Same as get_json_with_retries, returning the body as text, e.g. for html pages.
+    """
+    return await _get_with_retries(session, url, _read_text, provider=provider, params=params, headers=headers)
@@ -0,0 +1,241 @@
+# local storage
+import sqlite3
+import zlib
+import json
+import hashlib
+
+# work with concurrency
+import threading
+
+# work with time
+import time
+
+# environment variables
+import dotenv
+import os
+dotenv.load_dotenv()
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "../data/cache/responses.sqlite")
+RESPONSE_CACHE_MODE = os.getenv("RESPONSE_CACHE_MODE", "normal")
+
+# shared rate limits and retries
+from .rate_limit_support import get_json_with_retries
+
+# function typing
+from typing import Any, Dict, Optional, Tuple
+
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# seconds a response stays fresh, by substring of the endpoint url. The first match wins.
+DEFAULT_TTLS = {
+    "searchAirport": 30 * DAY,
+    "searchFlightsComplete": HOUR,
+    "nominatim": 90 * DAY,
+    "maps.googleapis.com/maps/api/geocode": 90 * DAY,
+    "archive": 30 * DAY,
+    "forecast": 6 * HOUR
+}
+
+CACHE_MODES = ["normal", "replay", "refresh", "disabled"]
+
+
+class CacheMissError(LookupError):
+    """
+    Raised in replay mode when no response was recorded for a request.
+    """
+
+
+def normalize_params(params: Optional[Dict[str, Any]]) -> str:
+    """
+    Serializes request params so that equivalent requests give the same string:
+    keys are sorted, None values dropped and scalars converted to strings, as they are sent in the url.
+    """
+    def normalize_value(value):
+        if isinstance(value, (list, tuple)):
+            return [normalize_value(element) for element in value]
+        return str(value)
+
+    params = params or {}
+    return json.dumps({key: normalize_value(value) for key, value in params.items() if value is not None},
+                      sort_keys=True, separators=(",", ":"))
+
+
+def build_cache_key(endpoint: str, params: Optional[Dict[str, Any]]) -> str:
+    return hashlib.sha256(f"{endpoint}?{normalize_params(params)}".encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite store of decoded JSON API responses, addressed by a hash of the endpoint and normalized params.
+
+    Each endpoint has its own time to live and the store is kept under `max_size_bytes` by
+    evicting the least recently used responses. Modes:
+        - normal: serve fresh responses from the cache, request and record the rest.
+        - replay: serve every recorded response regardless of age and never touch the network,
+                  raising CacheMissError for requests that were never recorded.
+        - refresh: always request and record, ignoring what is stored.
+        - disabled: do not read nor write the cache.
+    """
+
+    def __init__(self, path: str = RESPONSE_CACHE_PATH, mode: str = RESPONSE_CACHE_MODE,
+                 ttls: Optional[Dict[str, float]] = None, default_ttl: float = DAY,
+                 max_size_bytes: int = 1024 ** 3):
+        """
+        Parameters:
+        ----------
+        path : str
+            SQLite file where responses are stored. Use ":memory:" for a cache living only in this process.
+        mode : str
+            One of "normal", "replay", "refresh" or "disabled".
+        ttls : dict, optional
+            Seconds a response stays fresh by endpoint url substring. Defaults to DEFAULT_TTLS.
+        default_ttl : float
+            Seconds a response stays fresh when no entry of `ttls` matches the endpoint.
+        max_size_bytes : int
+            Maximum size of the stored (compressed) responses before evicting the least recently used.
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"mode must be one of {CACHE_MODES}, got {mode}")
+
+        self.path = path
+        self.mode = mode
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self.max_size_bytes = max_size_bytes
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_for(self, endpoint: str) -> float:
+        for endpoint_substring, ttl in self.ttls.items():
+            if endpoint_substring in endpoint:
+                return ttl
+        return self.default_ttl
+
+    def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        """
+        Returns the recorded response for the request, or None if there is no fresh one.
+        In replay mode the age is ignored and a missing response raises CacheMissError.
+        """
+        if self.mode in ("disabled", "refresh"):
+            return None
+
+        key = build_cache_key(endpoint, params)
+        with self._lock:
+            row = self._connection.execute("SELECT body, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+
+            is_fresh = row is not None and (self.mode == "replay" or time.time() - row[1] <= self.ttl_for(endpoint))
+            if is_fresh:
+                with self._connection:
+                    self._connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+
+        if not is_fresh:
+            self.misses += 1
+            if self.mode == "replay":
+                raise CacheMissError(f"No recorded response for {endpoint} with params {normalize_params(params)}")
+            return None
+
+        self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, endpoint: str, params: Optional[Dict[str, Any]], data: Any) -> None:
+        """
+        Records the decoded JSON response of a request, evicting the least recently used responses if needed.
+        """
+        if self.mode in ("disabled", "replay"):
+            return
+
+        normalized_params = normalize_params(params)
+        key = build_cache_key(endpoint, params)
+        body = zlib.compress(json.dumps(data, separators=(",", ":")).encode())
+        now = time.time()
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, params, body, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, normalized_params, body, len(body), now, now)
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total_size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+
+        rows = self._connection.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        keys_to_delete = []
+        for key, size in rows:
+            if total_size <= self.max_size_bytes:
+                break
+            keys_to_delete.append((key,))
+            total_size -= size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", keys_to_delete)
+
+    def purge_expired(self) -> int:
+        """
+        Deletes every response older than its endpoint's time to live. Returns the number of responses deleted.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            rows = self._connection.execute("SELECT key, endpoint, created_at FROM responses").fetchall()
+            expired_keys = [(key,) for key, endpoint, created_at in rows if now - created_at > self.ttl_for(endpoint)]
+            self._connection.executemany("DELETE FROM responses WHERE key = ?", expired_keys)
+        return len(expired_keys)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+_default_cache: Optional[ResponseCache] = None
+
+
+def get_default_cache() -> ResponseCache:
+    """
+    Returns the cache used by the extraction functions when none is passed, stored at RESPONSE_CACHE_PATH
+    and working in RESPONSE_CACHE_MODE (both read from the environment).
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
+
+
+async def cached_get_json(session, url: str, provider: str = "default", params: Optional[dict] = None,
+                          headers: Optional[dict] = None, cache: Optional[ResponseCache] = None) -> Tuple[Optional[int], Optional[Any]]:
+    """
+    Same as rate_limit_support.get_json_with_retries, but answers from `cache` when it holds a fresh
+    response and records successful responses in it. Headers are not part of the cache key.
+    """
+    cache = cache or get_default_cache()
+
+    data = cache.get(url, params)
+    if data is not None:
+        return 200, data
+
+    status, data = await get_json_with_retries(session, url, provider=provider, params=params, headers=headers)
+    if status == 200 and data is not None:
+        cache.set(url, params, data)
+
+    return status, data
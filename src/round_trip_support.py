@@ -0,0 +1,159 @@
+# data processing
+import pandas as pd
+import numpy as np
+
+# bounded selection of the best pairs
+import heapq
+
+# function typing
+from typing import List, Union
+
+
+RANK_BY_COLUMNS = {
+    "cheapest": "price",
+    "fastest": "duration"
+}
+
+
+def _best_pairs_in_group(outbound_thresholds: np.ndarray, outbound_metrics: np.ndarray,
+                         return_departures: np.ndarray, return_metrics: np.ndarray, top_k: int) -> List[tuple]:
+    """
+    Finds the top_k (metric sum, outbound position, return position) pairs where the return departs at or
+    after the outbound's threshold, with a sweep instead of comparing every outbound with every return.
+
+    Outbounds are visited from the latest threshold to the earliest while returns are added from the
+    latest departure backwards, so the valid returns of each outbound are exactly those added so far and
+    a heap keeps the top_k cheapest of them.
+    """
+    return_heap = []  # max-heap (negated metric) of the top_k valid returns seen so far
+    best_pairs = []   # max-heap (negated sum) of the top_k pairs of the group
+
+    return_position = len(return_departures) - 1
+    for outbound_position in np.argsort(outbound_thresholds, kind="stable")[::-1]:
+        threshold = outbound_thresholds[outbound_position]
+        while return_position >= 0 and return_departures[return_position] >= threshold:
+            entry = (-return_metrics[return_position], return_position)
+            if len(return_heap) < top_k:
+                heapq.heappush(return_heap, entry)
+            elif entry > return_heap[0]:
+                heapq.heapreplace(return_heap, entry)
+            return_position -= 1
+
+        for negative_return_metric, valid_return_position in return_heap:
+            pair = (-(outbound_metrics[outbound_position] - negative_return_metric), outbound_position, valid_return_position)
+            if len(best_pairs) < top_k:
+                heapq.heappush(best_pairs, pair)
+            elif pair > best_pairs[0]:
+                heapq.heapreplace(best_pairs, pair)
+
+    return sorted((-negative_sum, outbound_position, return_position) for negative_sum, outbound_position, return_position in best_pairs)
+
+
+def pair_round_trips(itineraries_df: pd.DataFrame, origin_airport_codes: Union[str, List[str]], days_window: int = 2,
+                     min_stay_hours: float = 12, top_k: int = 5, rank_by: str = "cheapest") -> pd.DataFrame:
+    """
+    Pairs the one-way outbound and return itineraries of a crawl into round trips and keeps the
+    top_k per (destination, outbound date).
+
+    Outbound itineraries leave from one of origin_airport_codes, returns arrive to one of them. A pair is
+    valid when the return leaves the destination at least min_stay_hours after the outbound lands and no
+    later than days_window days after the outbound date. Returns are located per group with a binary search
+    over the returns sorted by departure, and the best pairs with a sweep, so the full cross product of
+    outbounds and returns is never built.
+
+    Parameters:
+    ----------
+    itineraries_df : pd.DataFrame
+        Flattened itineraries, as returned by get_flights.
+    origin_airport_codes : str or list
+        Airport display code(s) of the trip origin, e.g. "MAD".
+    days_window : int
+        Maximum days between the outbound date and the return date, as used to build the querystrings.
+    min_stay_hours : float
+        Minimum hours between the outbound arrival and the return departure.
+    top_k : int
+        Number of pairs kept per (destination, outbound date).
+    rank_by : str
+        "cheapest" to rank by total price or "fastest" to rank by total flight duration.
+
+    Returns:
+    -------
+    pd.DataFrame
+        One row per kept pair with the destination, outbound date, rank, both itinerary ids, departures,
+        arrivals, prices and durations, the total price, total duration and stay in hours.
+    """
+    if isinstance(origin_airport_codes, str):
+        origin_airport_codes = [origin_airport_codes]
+    metric_column = RANK_BY_COLUMNS[rank_by]
+
+    itineraries_df = itineraries_df.dropna(subset=["departure", "arrival", metric_column])
+    outbound_df = itineraries_df[itineraries_df["origin_airport_code"].isin(origin_airport_codes)]
+    return_df = itineraries_df[itineraries_df["destination_airport_code"].isin(origin_airport_codes)]
+
+    # destinations as shared integer codes, so both legs can be sorted and grouped with NumPy
+    destination_codes, destinations = pd.factorize(pd.concat([outbound_df["destination_airport_code"], return_df["origin_airport_code"]]))
+    outbound_destinations, return_destinations = destination_codes[:len(outbound_df)], destination_codes[len(outbound_df):]
+
+    outbound_departures = outbound_df["departure"].to_numpy()
+    outbound_dates = outbound_df["departure"].dt.normalize().to_numpy()
+    outbound_order = np.lexsort((outbound_departures, outbound_dates, outbound_destinations))
+    outbound_destinations, outbound_dates = outbound_destinations[outbound_order], outbound_dates[outbound_order]
+    outbound_thresholds = (outbound_df["arrival"] + pd.Timedelta(hours=min_stay_hours)).to_numpy()[outbound_order]
+    outbound_metrics = outbound_df[metric_column].to_numpy(dtype=float)[outbound_order]
+
+    return_departures = return_df["departure"].to_numpy()
+    return_order = np.lexsort((return_departures, return_destinations))
+    return_destinations, return_departures = return_destinations[return_order], return_departures[return_order]
+    return_metrics = return_df[metric_column].to_numpy(dtype=float)[return_order]
+    destination_bounds = np.searchsorted(return_destinations, np.arange(len(destinations) + 1))
+
+    # group boundaries of (destination, outbound date) in the sorted outbounds
+    group_starts = np.flatnonzero(np.r_[len(outbound_order) > 0, (outbound_destinations[1:] != outbound_destinations[:-1]) | (outbound_dates[1:] != outbound_dates[:-1])])
+    group_ends = np.r_[group_starts[1:], len(outbound_order)]
+    window_length = np.timedelta64(days_window + 1, "D")
+
+    pair_outbounds, pair_returns, pair_ranks = [], [], []
+    for group_start, group_end in zip(group_starts, group_ends):
+        destination_code, outbound_date = outbound_destinations[group_start], outbound_dates[group_start]
+
+        # returns of the group: from the outbound date until the end of the last day of the window
+        destination_start, destination_end = destination_bounds[destination_code], destination_bounds[destination_code + 1]
+        destination_departures = return_departures[destination_start:destination_end]
+        window_start = destination_start + np.searchsorted(destination_departures, outbound_date, side="left")
+        window_end = destination_start + np.searchsorted(destination_departures, outbound_date + window_length, side="left")
+        if window_start == window_end:
+            continue
+
+        best_pairs = _best_pairs_in_group(
+            outbound_thresholds=outbound_thresholds[group_start:group_end],
+            outbound_metrics=outbound_metrics[group_start:group_end],
+            return_departures=return_departures[window_start:window_end],
+            return_metrics=return_metrics[window_start:window_end],
+            top_k=top_k
+        )
+        for rank, (_, outbound_position, return_position) in enumerate(best_pairs, start=1):
+            pair_outbounds.append(outbound_order[group_start + outbound_position])
+            pair_returns.append(return_order[window_start + return_position])
+            pair_ranks.append(rank)
+
+    outbound_legs = outbound_df.iloc[pair_outbounds].reset_index(drop=True)
+    return_legs = return_df.iloc[pair_returns].reset_index(drop=True)
+
+    return pd.DataFrame({
+        "destination": outbound_legs["destination_airport_code"],
+        "outbound_date": outbound_legs["departure"].dt.normalize(),
+        "rank": pd.Series(pair_ranks, dtype="int64"),
+        "outbound_itinerary_id": outbound_legs["itinerary_id"],
+        "return_itinerary_id": return_legs["itinerary_id"],
+        "outbound_departure": outbound_legs["departure"],
+        "outbound_arrival": outbound_legs["arrival"],
+        "return_departure": return_legs["departure"],
+        "return_arrival": return_legs["arrival"],
+        "outbound_price": outbound_legs["price"],
+        "return_price": return_legs["price"],
+        "outbound_duration": outbound_legs["duration"],
+        "return_duration": return_legs["duration"],
+        "total_price": outbound_legs["price"] + return_legs["price"],
+        "total_duration": outbound_legs["duration"] + return_legs["duration"],
+        "stay_hours": (return_legs["departure"] - outbound_legs["arrival"]) / pd.Timedelta(hours=1)
+    })
@@ -0,0 +1,152 @@
+# web scraping
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+# work with time
+import time
+
+# function typing
+from typing import Dict, List, Optional, Tuple
+
+
+BOOKING_CARD_SELECTOR = 'div[aria-label="Alojamiento"]'
+
+# the absolute XPath used so far first, then the button found by its text, which survives layout changes
+BOOKING_LOAD_MORE_LOCATORS = [
+    ("xpath", '//*[@id="bodyconstraint-inner"]/div[2]/div/div[2]/div[3]/div[2]/div[2]/div[3]/div[*]/button'),
+    ("xpath", '//button[contains(., "Cargar más resultados")]')
+]
+
+# installs a mutation observer once per document and enlarges the resource timing buffer,
+# so network activity is still visible after hundreds of images were loaded
+INSTALL_OBSERVER_JS = """
+if (!window.__scrollLoader) {
+    const state = {lastMutation: performance.now()};
+    new MutationObserver(() => { state.lastMutation = performance.now(); })
+        .observe(document.body, {childList: true, subtree: true});
+    performance.setResourceTimingBufferSize(100000);
+    window.__scrollLoader = state;
+}
+"""
+
+# number of cards, ms since the last DOM mutation and ms since the last network response finished
+READ_SIGNALS_JS = """
+const now = performance.now();
+let lastResponse = 0;
+for (const entry of performance.getEntriesByType("resource")) {
+    lastResponse = Math.max(lastResponse, entry.responseEnd);
+}
+return [document.querySelectorAll(arguments[0]).length,
+        now - window.__scrollLoader.lastMutation,
+        now - lastResponse];
+"""
+
+
+def read_page_signals(driver, card_selector: str) -> Tuple[int, float, float]:
+    driver.execute_script(INSTALL_OBSERVER_JS)
+    n_cards, ms_since_mutation, ms_since_response = driver.execute_script(READ_SIGNALS_JS, card_selector)
+    return int(n_cards), ms_since_mutation / 1000, ms_since_response / 1000
+
+
+def wait_for_more_cards(driver, card_selector: str, n_cards: int, timeout: float, settle_time: float = 0.5,
+                        poll_interval: float = 0.05) -> int:
+    """
+    Waits until the page shows more than n_cards cards, or until the DOM and the network have both been
+    quiet for settle_time seconds (nothing more is coming), or timeout seconds. Returns the card count.
+    """
+    def more_cards_or_idle(driver):
+        current_cards, seconds_since_mutation, seconds_since_response = read_page_signals(driver, card_selector)
+        if current_cards > n_cards or (seconds_since_mutation >= settle_time and seconds_since_response >= settle_time):
+            return current_cards
+        return False
+
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=poll_interval).until(more_cards_or_idle)
+    except TimeoutException:
+        return read_page_signals(driver, card_selector)[0]
+
+
+def click_load_more_if_present(driver, load_more_locators: List[Tuple[str, str]]) -> bool:
+    """
+    Clicks the first visible load more button. Looks it up without waiting: by the time the page is idle
+    the button is either rendered or there is nothing more to load.
+    """
+    for by, value in load_more_locators:
+        for button in driver.find_elements(by, value):
+            try:
+                if button.is_displayed() and button.is_enabled():
+                    driver.execute_script("arguments[0].click();", button)
+                    return True
+            except WebDriverException:
+                continue
+    return False
+
+
+def load_all_results(driver, card_selector: str = BOOKING_CARD_SELECTOR,
+                     load_more_locators: Optional[List[Tuple[str, str]]] = None, deadline: float = 120,
+                     step_timeout: float = 10, settle_time: float = 0.5, poll_interval: float = 0.05) -> Dict[str, float]:
+    """
+    Loads every result of an infinite-scroll list, waiting on page signals instead of fixed sleeps.
+
+    Each step scrolls to the bottom and waits until more cards appear or the page goes idle (no DOM
+    mutation and no network response for settle_time seconds). If nothing new appeared, the load more
+    button is clicked if present and the step is repeated; otherwise the list is complete. The whole
+    load never takes longer than `deadline` seconds.
+
+    Parameters:
+    ----------
+    driver : WebDriver
+        Driver with the results page already open.
+    card_selector : str
+        CSS selector of a result card.
+    load_more_locators : list, optional
+        (by, value) locators of the load more button. Defaults to BOOKING_LOAD_MORE_LOCATORS.
+    deadline : float
+        Maximum seconds spent loading the page.
+    step_timeout : float
+        Maximum seconds waited for new cards after each scroll or click.
+    settle_time : float
+        Seconds without DOM mutations and network responses after which the page is considered idle.
+    poll_interval : float
+        Seconds between reads of the page signals.
+
+    Returns:
+    -------
+    Dict[str, float]
+        Timings of the page: "n_cards", "n_scrolls", "n_clicks", "seconds_scrolling", "seconds_clicking",
+        "seconds_total" and "hit_deadline" (1 if the deadline stopped the load, else 0).
+    """
+    load_more_locators = BOOKING_LOAD_MORE_LOCATORS if load_more_locators is None else load_more_locators
+    start_time = time.monotonic()
+    timings = {"n_cards": 0, "n_scrolls": 0, "n_clicks": 0, "seconds_scrolling": 0.0, "seconds_clicking": 0.0}
+
+    n_cards = read_page_signals(driver, card_selector)[0]
+    while True:
+        remaining = deadline - (time.monotonic() - start_time)
+        if remaining <= 0:
+            break
+
+        step_start = time.monotonic()
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        new_n_cards = wait_for_more_cards(driver, card_selector, n_cards, min(step_timeout, remaining), settle_time, poll_interval)
+        timings["n_scrolls"] += 1
+        timings["seconds_scrolling"] += time.monotonic() - step_start
+        if new_n_cards > n_cards:
+            n_cards = new_n_cards
+            continue
+
+        step_start = time.monotonic()
+        clicked = click_load_more_if_present(driver, load_more_locators)
+        if clicked:
+            remaining = deadline - (time.monotonic() - start_time)
+            new_n_cards = wait_for_more_cards(driver, card_selector, n_cards, max(0, min(step_timeout, remaining)), settle_time, poll_interval)
+            timings["n_clicks"] += 1
+        timings["seconds_clicking"] += time.monotonic() - step_start
+
+        if not clicked or new_n_cards <= n_cards:
+            break
+        n_cards = new_n_cards
+
+    seconds_total = time.monotonic() - start_time
+    timings.update({"n_cards": n_cards, "seconds_total": seconds_total, "hit_deadline": int(seconds_total >= deadline)})
+    return timings
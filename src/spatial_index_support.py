@@ -0,0 +1,216 @@
+# data processing
+import pandas as pd
+import numpy as np
+
+# nearest neighbour search
+from scipy.spatial import cKDTree
+
+# persist the built index
+import pickle
+
+# function typing
+from typing import Optional, Tuple
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def coordinates_to_unit_vectors(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Maps latitudes and longitudes (degrees) to points on the unit sphere, where the straight line
+    (chord) distance grows with the great circle distance, so a KD-tree answers haversine queries.
+    """
+    latitudes = np.radians(np.asarray(latitudes, dtype=float))
+    longitudes = np.radians(np.asarray(longitudes, dtype=float))
+    cos_latitudes = np.cos(latitudes)
+    return np.column_stack([cos_latitudes * np.cos(longitudes), cos_latitudes * np.sin(longitudes), np.sin(latitudes)])
+
+
+def km_to_chord(distance_km: float) -> float:
+    # straight line distance between two points of the unit sphere distance_km apart
+    return 2 * np.sin(np.minimum(np.asarray(distance_km, dtype=float) / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord, dtype=float) / 2, 0, 1))
+
+
+def haversine_km(latitudes_a, longitudes_a, latitudes_b, longitudes_b) -> np.ndarray:
+    """
+    Great circle distance in km between points a and b, element-wise with numpy broadcasting.
+    """
+    latitudes_a, longitudes_a, latitudes_b, longitudes_b = map(np.radians, (latitudes_a, longitudes_a, latitudes_b, longitudes_b))
+    a = np.sin((latitudes_b - latitudes_a) / 2) ** 2 + np.cos(latitudes_a) * np.cos(latitudes_b) * np.sin((longitudes_b - longitudes_a) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def valid_coordinates(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Mask of usable coordinates: numbers within range, and not (0, 0), which the scraped data uses for missing ones.
+    """
+    latitudes = pd.to_numeric(pd.Series(latitudes), errors="coerce").to_numpy(dtype=float)
+    longitudes = pd.to_numeric(pd.Series(longitudes), errors="coerce").to_numpy(dtype=float)
+    with np.errstate(invalid="ignore"):
+        return ((np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180)
+                & ~((latitudes == 0) & (longitudes == 0)))
+
+
+class SpatialIndex:
+    """
+    KD-tree over points on the unit sphere, answering batched radius and k nearest neighbour queries by
+    great circle distance without a pairwise scan.
+
+    Points are the rows of a frame (e.g. activities), and query results are positions of those rows in
+    the frame the index was built from. Rows without usable coordinates are left out of the index.
+
+    Usage:
+    ------
+        activities_index = SpatialIndex.from_parquet("../data/activities/transformed/activities.parquet")
+        nearby = activities_index.query_radius(hotels_df["latitude"], hotels_df["longitude"], radius_km=1.5)
+        distances_km, positions = activities_index.query_knn(hotels_df["latitude"], hotels_df["longitude"], k=10)
+        activities_index.save("../data/spatial/activities.index")
+    """
+
+    def __init__(self, latitudes, longitudes, leafsize: int = 16):
+        """
+        Parameters:
+        ----------
+        latitudes, longitudes : array-like
+            Coordinates in degrees of every row, as numbers or strings.
+        leafsize : int
+            Points per leaf of the KD-tree.
+        """
+        latitudes = pd.to_numeric(pd.Series(latitudes), errors="coerce").to_numpy(dtype=float)
+        longitudes = pd.to_numeric(pd.Series(longitudes), errors="coerce").to_numpy(dtype=float)
+        is_valid = valid_coordinates(latitudes, longitudes)
+
+        self.n_rows = len(latitudes)
+        self.positions = np.flatnonzero(is_valid)
+        self.latitudes = latitudes[is_valid]
+        self.longitudes = longitudes[is_valid]
+        self.tree = cKDTree(coordinates_to_unit_vectors(self.latitudes, self.longitudes), leafsize=leafsize)
+
+    @classmethod
+    def from_dataframe(cls, points_df: pd.DataFrame, latitude_column: str = "latitude", longitude_column: str = "longitude",
+                       **kwargs) -> "SpatialIndex":
+        return cls(points_df[latitude_column].to_numpy(), points_df[longitude_column].to_numpy(), **kwargs)
+
+    @classmethod
+    def from_parquet(cls, path: str, latitude_column: str = "latitude", longitude_column: str = "longitude",
+                     **kwargs) -> "SpatialIndex":
+        """
+        Builds the index from the coordinate columns of a parquet file, e.g. the transformed activities.
+        Only those columns are read.
+        """
+        points_df = pd.read_parquet(path, columns=[latitude_column, longitude_column])
+        return cls.from_dataframe(points_df, latitude_column, longitude_column, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @staticmethod
+    def _query_vectors(latitudes, longitudes) -> Tuple[np.ndarray, np.ndarray]:
+        latitudes = pd.to_numeric(pd.Series(np.atleast_1d(latitudes)), errors="coerce").to_numpy(dtype=float)
+        longitudes = pd.to_numeric(pd.Series(np.atleast_1d(longitudes)), errors="coerce").to_numpy(dtype=float)
+        is_valid = valid_coordinates(latitudes, longitudes)
+        return coordinates_to_unit_vectors(np.where(is_valid, latitudes, 0), np.where(is_valid, longitudes, 0)), is_valid
+
+    def query_radius(self, latitudes, longitudes, radius_km: float, return_distances: bool = False, sort: bool = True):
+        """
+        Finds the points within radius_km of every query point.
+
+        Parameters:
+        ----------
+        latitudes, longitudes : array-like
+            Query coordinates in degrees.
+        radius_km : float
+            Great circle radius in km.
+        return_distances : bool
+            Whether to return the distances in km too.
+        sort : bool
+            Whether to sort every result by distance.
+
+        Returns:
+        -------
+        List[np.ndarray] or Tuple[List[np.ndarray], List[np.ndarray]]
+            For every query point, the row positions of the points within the radius (empty for invalid
+            query coordinates), and their distances if return_distances.
+        """
+        query_vectors, is_valid = self._query_vectors(latitudes, longitudes)
+        neighbours = self.tree.query_ball_point(query_vectors[is_valid], r=km_to_chord(radius_km), return_sorted=False)
+
+        # distances of every (query, point) pair at once, instead of per query point
+        n_found = np.zeros(len(query_vectors), dtype=int)
+        n_found[is_valid] = [len(neighbour_indices) for neighbour_indices in neighbours]
+        pair_query = np.repeat(np.arange(len(query_vectors)), n_found)
+        pair_point = np.fromiter((index for neighbour_indices in neighbours for index in neighbour_indices), dtype=int, count=n_found.sum())
+        pair_distances = chord_to_km(np.linalg.norm(self.tree.data[pair_point] - query_vectors[pair_query], axis=1))
+        if sort:
+            order = np.lexsort((pair_distances, pair_query))
+            pair_point, pair_distances = pair_point[order], pair_distances[order]
+
+        splits = np.cumsum(n_found)[:-1]
+        positions_list = np.split(self.positions[pair_point], splits) if len(query_vectors) else []
+        distances_list = np.split(pair_distances, splits) if len(query_vectors) else []
+        return (positions_list, distances_list) if return_distances else positions_list
+
+    def query_radius_frame(self, latitudes, longitudes, radius_km: float) -> pd.DataFrame:
+        """
+        Same as query_radius, as one long frame with a row per (query, point) pair: query (position of the
+        query point), position (row of the indexed frame) and distance_km, ordered by query and distance.
+        """
+        positions_list, distances_list = self.query_radius(latitudes, longitudes, radius_km, return_distances=True)
+        n_found = np.array([len(positions) for positions in positions_list], dtype=int)
+        return pd.DataFrame({
+            "query": np.repeat(np.arange(len(positions_list)), n_found),
+            "position": np.concatenate(positions_list) if positions_list else np.array([], dtype=int),
+            "distance_km": np.concatenate(distances_list) if distances_list else np.array([], dtype=float)
+        })
+
+    def query_knn(self, latitudes, longitudes, k: int = 10, max_distance_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the k nearest points of every query point.
+
+        Parameters:
+        ----------
+        latitudes, longitudes : array-like
+            Query coordinates in degrees.
+        k : int
+            Number of neighbours.
+        max_distance_km : float, optional
+            Ignore points further than this.
+
+        Returns:
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            Distances in km and row positions, both (n_queries, k), nearest first. Missing neighbours
+            (fewer points, further than max_distance_km or invalid query coordinates) are inf and -1.
+        """
+        query_vectors, is_valid = self._query_vectors(latitudes, longitudes)
+        distance_upper_bound = km_to_chord(max_distance_km) if max_distance_km is not None else np.inf
+        chords, neighbour_indices = self.tree.query(query_vectors, k=k, distance_upper_bound=distance_upper_bound)
+        chords, neighbour_indices = chords.reshape(len(query_vectors), k), neighbour_indices.reshape(len(query_vectors), k)
+
+        found = np.isfinite(chords) & is_valid[:, None]
+        distances_km = np.where(found, chord_to_km(np.where(found, chords, 0)), np.inf)
+        # the tree answers missing neighbours with index len(self), mapped to -1
+        positions = np.where(found, np.r_[self.positions, -1][neighbour_indices], -1)
+        return distances_km, positions
+
+    def save(self, path: str) -> None:
+        """
+        Writes the built index to disk, so it is loaded without rebuilding the tree.
+        """
+        with open(path, "wb") as index_file:
+            pickle.dump(self, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str) -> "SpatialIndex":
+        """
+        Loads an index written by save. Only load files written by this project, as they are pickles.
+        """
+        with open(path, "rb") as index_file:
+            spatial_index = pickle.load(index_file)
+        if not isinstance(spatial_index, SpatialIndex):
+            raise TypeError(f"{path} does not hold a SpatialIndex")
+        return spatial_index
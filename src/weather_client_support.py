@@ -0,0 +1,169 @@
+# data processing
+import pandas as pd
+import numpy as np
+
+# work with asynchronicity
+import asyncio
+import aiohttp
+
+# shared rate limits, retries and response cache
+from .response_cache_support import ResponseCache, cached_get_json
+
+# function typing
+from typing import Dict, List, Optional, Tuple
+
+
+class OpenMeteoClient:
+    """
+    Open-Meteo client that asks for many locations per request, over a single pooled aiohttp session.
+
+    Open-Meteo accepts comma-separated latitudes and longitudes and answers with one result per location,
+    so hundreds of cities take a handful of requests. Caller params are never modified: every request
+    gets its own copy with the coordinates of its batch.
+
+    Usage:
+    ------
+        async with OpenMeteoClient() as client:
+            forecast_df = await client.request_daily(BASE_URL_FORECAST, cities_dict, params)
+    """
+
+    def __init__(self, locations_per_request: int = 50, max_concurrency: int = 5, limit_per_host: int = 5,
+                 keepalive_timeout: float = 30, timeout: float = 60, provider: str = "open_meteo",
+                 cache: Optional[ResponseCache] = None):
+        """
+        Parameters:
+        ----------
+        locations_per_request : int
+            Cities sent in a single request. Open-Meteo counts every location as a call towards its
+            limits and long lists make long urls, so very large batches are not worth it.
+        max_concurrency : int
+            Maximum number of requests in flight at the same time.
+        limit_per_host : int
+            Maximum number of pooled connections opened against the same host.
+        keepalive_timeout : float
+            Seconds an idle pooled connection is kept open for reuse.
+        timeout : float
+            Total timeout in seconds for a single request.
+        provider : str
+            Name of the rate limiter shared with the other callers of the API, see rate_limit_support.
+        cache : ResponseCache, optional
+            Cache answering repeated requests. Defaults to response_cache_support.get_default_cache().
+        """
+        self.locations_per_request = locations_per_request
+        self.max_concurrency = max_concurrency
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.provider = provider
+        self.cache = cache
+
+        self._session = None
+        self._semaphore = None
+
+    async def open(self) -> "OpenMeteoClient":
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency,
+                                             limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self) -> "OpenMeteoClient":
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def request_batch(self, url: str, cities: List[str], coordinates: List[Tuple[float, float]],
+                            params: dict) -> List[Optional[dict]]:
+        """
+        Requests the data of several locations in one call. Returns the result of every city, in order,
+        or None for every city of the batch if the request failed.
+        """
+        if self._session is None:
+            await self.open()
+
+        batch_params = {
+            **params,
+            "latitude": ",".join(str(latitude) for latitude, _ in coordinates),
+            "longitude": ",".join(str(longitude) for _, longitude in coordinates)
+        }
+        async with self._semaphore:
+            status, data = await cached_get_json(self._session, url, provider=self.provider, params=batch_params, cache=self.cache)
+
+        if status != 200 or not data:
+            print(f"Error {status} for {', '.join(cities)}")
+            return [None] * len(cities)
+
+        # a single location is answered with an object, several with a list
+        locations_data = data if isinstance(data, list) else [data]
+        if len(locations_data) != len(cities):
+            print(f"Expected {len(cities)} locations, got {len(locations_data)} for {', '.join(cities)}")
+            return [None] * len(cities)
+        return locations_data
+
+    async def request_daily(self, url: str, cities_dict: Dict[str, Tuple[float, float]], params: dict) -> pd.DataFrame:
+        """
+        Requests the daily data of every city, locations_per_request cities per request.
+
+        Parameters:
+        ----------
+        url : str
+            Forecast or archive endpoint.
+        cities_dict : dict
+            City name -> (latitude, longitude).
+        params : dict
+            Query params shared by every city, e.g. the daily variables and dates. Not modified.
+
+        Returns:
+        -------
+        pd.DataFrame
+            The daily variables of every city, one row per city and day, with a "city" column. Cities
+            whose request failed or that got no daily data are left out.
+        """
+        cities = list(cities_dict)
+        batches = [cities[batch_start:batch_start + self.locations_per_request]
+                   for batch_start in range(0, len(cities), self.locations_per_request)]
+        results = await asyncio.gather(*(self.request_batch(url, batch, [cities_dict[city] for city in batch], params)
+                                         for batch in batches))
+
+        daily_dicts, daily_cities = [], []
+        for batch, locations_data in zip(batches, results):
+            for city, location_data in zip(batch, locations_data):
+                if location_data is None:
+                    continue
+                if not location_data.get("daily"):
+                    print(f"No daily data for {city}")
+                    continue
+                daily_dicts.append(location_data["daily"])
+                daily_cities.append(city)
+
+        return daily_dicts_to_frame(daily_dicts, daily_cities)
+
+
+def daily_dicts_to_frame(daily_dicts: List[Dict[str, list]], cities: List[str]) -> pd.DataFrame:
+    """
+    Builds one frame out of the "daily" blocks of several locations, concatenating every variable
+    once instead of building a frame per city. Variables missing for a city are NaN.
+    """
+    if not daily_dicts:
+        return pd.DataFrame()
+
+    n_days = np.array([len(next(iter(daily_dict.values()), [])) for daily_dict in daily_dicts])
+    columns = list(dict.fromkeys(column for daily_dict in daily_dicts for column in daily_dict))
+
+    daily_columns = {}
+    for column in columns:
+        daily_columns[column] = np.concatenate([np.asarray(daily_dict[column], dtype=object) if column in daily_dict else np.full(n, np.nan, dtype=object)
+                                                for daily_dict, n in zip(daily_dicts, n_days)])
+    daily_columns["city"] = np.repeat(np.array(cities, dtype=object), n_days)
+
+    # back to the dtypes pd.DataFrame(daily_dict) gives, e.g. float for temperatures
+    return pd.DataFrame(daily_columns).infer_objects()
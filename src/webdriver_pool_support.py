@@ -0,0 +1,225 @@
+# data processing
+import pandas as pd
+
+# web scraping
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import WebDriverException
+
+# work with concurrency
+import threading
+from contextlib import contextmanager
+
+# work with time
+import time
+
+# function typing
+from typing import Callable, Iterator, List, Optional, Tuple
+
+
+def build_chrome_options(headless: bool = True, window_size: Tuple[int, int] = (1920, 1080),
+                         extra_arguments: Optional[List[str]] = None) -> Options:
+    """
+    Chrome options used by the scrapers. A fixed window size replaces maximize_window, which does
+    nothing in headless mode, so pages lay out the same with and without a display.
+    """
+    options = Options()
+    options.add_argument("--no-sandbox")      # Enables no-sandbox mode
+    options.add_argument("--disable-gpu")     # Disables GPU usage
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument(f"--window-size={window_size[0]},{window_size[1]}")
+    if headless:
+        options.add_argument("--headless=new")
+    for argument in extra_arguments or []:
+        options.add_argument(argument)
+    return options
+
+
+class PooledDriver:
+    """
+    WebDriver checked out of a WebDriverPool. Every attribute is delegated to the underlying driver,
+    so it can be passed to the existing scraping functions; `get` also counts the pages loaded.
+    """
+
+    def __init__(self, driver, driver_id: int, startup_seconds: float):
+        self.driver = driver
+        self.driver_id = driver_id
+        self.startup_seconds = startup_seconds
+        self.n_pages = 0
+        self.created_at = time.monotonic()
+
+    def get(self, url: str) -> None:
+        self.n_pages += 1
+        self.driver.get(url)
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+
+class WebDriverPool:
+    """
+    Bounded, thread-safe pool of Chrome drivers shared by the Selenium fetchers.
+
+    At most `max_drivers` browsers are alive at any time. Drivers are started lazily when a thread checks
+    one out and none is idle, reused across pages, and quit after `max_pages_per_driver` pages (to bound
+    the memory Chrome accumulates) or as soon as a WebDriverException is raised while checked out,
+    in which case the next checkout starts a fresh browser. Closing the pool quits every driver.
+
+    Usage:
+    ------
+        with WebDriverPool(max_drivers=5) as driver_pool:
+            with driver_pool.driver() as driver:
+                driver.get(url)
+                html_page = driver.page_source
+            print(driver_pool.report())
+    """
+
+    def __init__(self, max_drivers: int = 5, max_pages_per_driver: int = 50, headless: bool = True,
+                 page_load_timeout: float = 60, driver_factory: Optional[Callable[[], object]] = None):
+        """
+        Parameters:
+        ----------
+        max_drivers : int
+            Maximum number of browsers alive at the same time.
+        max_pages_per_driver : int
+            Pages a driver loads before it is quit and replaced.
+        headless : bool
+            Whether Chrome runs without a window.
+        page_load_timeout : float
+            Seconds driver.get waits for a page before raising a TimeoutException.
+        driver_factory : callable, optional
+            Function returning a new driver. Defaults to Chrome with build_chrome_options(headless).
+        """
+        self.max_drivers = max_drivers
+        self.max_pages_per_driver = max_pages_per_driver
+        self.headless = headless
+        self.page_load_timeout = page_load_timeout
+        self.driver_factory = driver_factory or (lambda: webdriver.Chrome(options=build_chrome_options(headless=headless)))
+
+        self._condition = threading.Condition()
+        self._idle: List[PooledDriver] = []
+        self._n_alive = 0
+        self._n_started = 0
+        self._closed = False
+        self._driver_stats = []
+
+    def _start_driver(self) -> PooledDriver:
+        start_time = time.perf_counter()
+        driver = self.driver_factory()
+        try:
+            driver.set_page_load_timeout(self.page_load_timeout)
+        except (AttributeError, WebDriverException):
+            pass
+        startup_seconds = time.perf_counter() - start_time
+
+        with self._condition:
+            self._n_started += 1
+            driver_id = self._n_started
+        return PooledDriver(driver, driver_id, startup_seconds)
+
+    def _retire(self, pooled_driver: PooledDriver, reason: str) -> None:
+        try:
+            pooled_driver.driver.quit()
+        except Exception:
+            pass
+
+        with self._condition:
+            self._n_alive -= 1
+            self._driver_stats.append({
+                "driver_id": pooled_driver.driver_id,
+                "n_pages": pooled_driver.n_pages,
+                "startup_seconds": pooled_driver.startup_seconds,
+                "alive_seconds": time.monotonic() - pooled_driver.created_at,
+                "retired_because": reason
+            })
+            self._condition.notify()
+
+    def _checkout(self, timeout: Optional[float] = None) -> PooledDriver:
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._closed or self._idle or self._n_alive < self.max_drivers, timeout=timeout):
+                raise TimeoutError(f"No driver available after {timeout} seconds")
+            if self._closed:
+                raise RuntimeError("The WebDriver pool is closed")
+            if self._idle:
+                return self._idle.pop()
+            self._n_alive += 1
+
+        try:
+            return self._start_driver()
+        except Exception:
+            with self._condition:
+                self._n_alive -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, pooled_driver: PooledDriver) -> None:
+        if pooled_driver.n_pages >= self.max_pages_per_driver:
+            self._retire(pooled_driver, "page_limit")
+            return
+
+        with self._condition:
+            if not self._closed:
+                self._idle.append(pooled_driver)
+                self._condition.notify()
+                return
+        self._retire(pooled_driver, "pool_closed")
+
+    @contextmanager
+    def driver(self, timeout: Optional[float] = None) -> Iterator[PooledDriver]:
+        """
+        Checks a driver out of the pool for the duration of the block, waiting up to `timeout` seconds
+        (forever if None) when all drivers are busy. A driver that raised a WebDriverException is quit
+        instead of being returned to the pool.
+        """
+        pooled_driver = self._checkout(timeout=timeout)
+        try:
+            yield pooled_driver
+        except WebDriverException:
+            self._retire(pooled_driver, "crashed")
+            raise
+        except BaseException:
+            self._release(pooled_driver)
+            raise
+        else:
+            self._release(pooled_driver)
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            idle_drivers, self._idle = self._idle, []
+            self._condition.notify_all()
+
+        for pooled_driver in idle_drivers:
+            self._retire(pooled_driver, "pool_closed")
+
+    def report(self) -> pd.DataFrame:
+        """
+        Returns one row per driver started by the pool, with the pages it loaded, its startup seconds,
+        how long it was alive and why it was retired ("alive" if it still is).
+        """
+        with self._condition:
+            driver_stats = list(self._driver_stats)
+            idle_drivers = list(self._idle)
+
+        for pooled_driver in idle_drivers:
+            driver_stats.append({
+                "driver_id": pooled_driver.driver_id,
+                "n_pages": pooled_driver.n_pages,
+                "startup_seconds": pooled_driver.startup_seconds,
+                "alive_seconds": time.monotonic() - pooled_driver.created_at,
+                "retired_because": "alive"
+            })
+
+        columns = ["driver_id", "n_pages", "startup_seconds", "alive_seconds", "retired_because"]
+        return pd.DataFrame(driver_stats, columns=columns).sort_values("driver_id").reset_index(drop=True)
+
+    def print_report(self) -> None:
+        report_df = self.report()
+        print(f"{len(report_df)} drivers started, {report_df['n_pages'].sum()} pages loaded, "
+              f"{report_df['startup_seconds'].sum():.1f} seconds spent starting browsers")
+
+    def __enter__(self) -> "WebDriverPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()